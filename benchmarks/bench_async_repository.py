@@ -0,0 +1,114 @@
+"""
+Throughput of the credits data layer under concurrent load, blocking vs non-blocking.
+
+Compares two ways a handler can call the credit store:
+  - blocking : straight from the coroutine (what the routers used to do), the baseline
+  - threadpool : offloaded with run_in_threadpool (what the routers do now)
+
+Besides throughput it reports the worst event loop lag seen by a heartbeat task, which is what every other
+in-flight request on the worker experiences while a query is running.
+
+Both modes time the Mongo store's single credit read, not CreditModel: the read-through cache in front of it would
+serve the second mode from memory. The credits are seeded in a separate `<db>_bench_async_repository` database,
+dropped afterwards.
+
+Needs a running MongoDB at MONGO_DB_CONN_STRING, run from the repo root:
+    python -m benchmarks.bench_async_repository --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from mongoengine import connect, get_db
+from mongoengine.context_managers import switch_db
+
+from clients.mongo_client import connect_mongo_db, mongodb_uri
+from data.models.credit_model import Credit
+from data.storage.mongo_store import MongoCreditStore
+
+BENCH_ALIAS = "bench_async_repository"
+BENCH_CIN_PREFIX = "BENCH"
+
+
+def seed(documents):
+    collection = Credit._get_collection()
+    collection.drop()
+    Credit.ensure_indexes()
+    template = {
+        "company_name": "Bench Corp",
+        "address": "1 Bench Street",
+        "registration_date": Credit.registration_date.to_mongo("2020-01-01"),
+        "number_of_employees": 100,
+        "raised_capital": 1000000.0,
+        "turnover": 5000000.0,
+        "net_profit": 500000.0,
+        "contact_number": "000-000-0000",
+        "contact_email": "bench@example.com",
+        "company_website": "https://example.com/",
+        "loan_amount": 250000.0,
+        "loan_interest_percentage": 7.5,
+        "account_status": "Active",
+    }
+    collection.insert_many([{"CIN": f"{BENCH_CIN_PREFIX}{i}", **template} for i in range(documents)])
+
+
+async def heartbeat(interval, lags, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run(mode, store, total_requests, concurrency, documents):
+    async def blocking(cin):
+        return store.get(cin)
+
+    async def threadpool(cin):
+        return await run_in_threadpool(store.get, cin)
+
+    call = {"blocking": blocking, "threadpool": threadpool}[mode]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await call(f"{BENCH_CIN_PREFIX}{i % documents}")
+
+    lags, stop = [], asyncio.Event()
+    beat = asyncio.create_task(heartbeat(0.005, lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total_requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+    return total_requests / elapsed, max(lags, default=0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--documents", type=int, default=1000)
+    args = parser.parse_args()
+
+    if not connect_mongo_db():
+        raise SystemExit(1)
+    database = f"{get_db().name}_bench_async_repository"
+    connect(alias=BENCH_ALIAS, host=mongodb_uri, db=database)
+    store = MongoCreditStore()
+
+    with switch_db(Credit, BENCH_ALIAS):
+        try:
+            seed(args.documents)
+            print(f"{'mode':<12}{'req/s':>12}{'max loop lag (ms)':>22}")
+            for mode in ("blocking", "threadpool"):
+                throughput, lag = asyncio.run(run(mode, store, args.requests, args.concurrency, args.documents))
+                print(f"{mode:<12}{throughput:>12.0f}{lag * 1000:>22.1f}")
+        finally:
+            Credit._get_collection().database.client.drop_database(database)
+
+
+if __name__ == "__main__":
+    main()
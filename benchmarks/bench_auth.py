@@ -0,0 +1,79 @@
+"""
+Per-request overhead of the JWT auth dependency.
+
+Times `verify_token` on the same token, first with the verified-token cache cleared before every call
+(full signature check, what every request used to pay) then with the cache warm (one digest and a dict lookup).
+Pass --endpoint to also time a full authenticated request through the app, the credits data layer is stubbed
+so only routing, auth and serialization are measured.
+
+No MongoDB needed, run from the repo root:
+    python -m benchmarks.bench_auth --iterations 20000
+"""
+
+import argparse
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from routers.authentication.authenticate import create_access_token, verified_tokens, verify_token
+
+
+def time_per_call(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_verify(token, iterations):
+    def cold():
+        verified_tokens.clear()
+        verify_token(token)
+
+    results = {"verify (no cache)": time_per_call(cold, iterations)}
+    verified_tokens.clear()
+    verify_token(token)
+    results["verify (cached)"] = time_per_call(lambda: verify_token(token), iterations)
+    return results
+
+
+def bench_endpoint(token, iterations):
+    from fastapi.testclient import TestClient
+
+    from clients.rate_limiting_client import limiter
+    from main import app
+
+    limiter.enabled = False
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {token}"}
+    stub = [{"CIN": "BENCH0000001", "company_name": "Bench Corp"}]
+    with patch("data.models.credit_model.CreditModel.get_all_credits", return_value=stub):
+        results = {}
+        for label, warm in (("GET /credits/ (no cache)", False), ("GET /credits/ (cached)", True)):
+
+            def call():
+                if not warm:
+                    verified_tokens.clear()
+                client.get("/credits/", headers=headers)
+
+            results[label] = time_per_call(call, iterations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--endpoint", action="store_true", help="Also time a full request through the app")
+    args = parser.parse_args()
+
+    token = create_access_token({"sub": "bench"}, timedelta(minutes=60))
+    results = bench_verify(token, args.iterations)
+    if args.endpoint:
+        results.update(bench_endpoint(token, max(args.iterations // 20, 100)))
+
+    for label, micros in results.items():
+        print(f"{label:<28} {micros:>10.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Load test of every credits endpoint at several collection sizes, results saved as JSON to compare runs.
+
+For each size in --sizes a separate `<db>_bench_endpoints` database is seeded with generated credits, then every
+endpoint is driven with --concurrency requests in flight (--requests per endpoint, --heavy-requests for the full
+listing and the export) through the whole app: JWT auth, admission control, serialization, threadpool.
+Rate limiting is switched off for the run, admission control isn't: answers it sheds (503) are counted as
+errors, raise ADMISSION_ROUTE_LIMITS to measure past them. Reported per endpoint: throughput, p50/p95/p99/max latency and the
+count of non-2xx answers. Reads run first, then the writes (inserts, updates, deletes of the inserted credits).
+
+By default requests go through the app in this process (httpx ASGI transport, the client shares the event loop
+so absolute numbers include its overhead). To measure a real server, start it with RATE_LIMIT_ENABLED=false and
+MONGO_DB_CONN_STRING pointing at the bench database, and pass its --url. --mongomock swaps Mongo for the
+in-process mongomock stand-in (pip install mongomock): handy to profile the app itself, meaningless for query
+costs, search and the change feed are skipped as mongomock has no text index and no pipeline updates. --memory
+runs the app on the in-memory credit store (CREDIT_STORE=memory) instead, no database involved, to measure the app
+and the store on their own.
+
+--compare takes the JSON of a previous run and exits with 1 when an endpoint's p95 grew or its throughput
+dropped by more than --threshold percent.
+
+Needs a running MongoDB at MONGO_DB_CONN_STRING (unless --mongomock or --memory), run from the repo root:
+    python -m benchmarks.bench_endpoints --sizes 10000,100000,1000000 --concurrency 32
+    python -m benchmarks.bench_endpoints --sizes 10000 --compare benchmarks/results/<previous run>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+
+import httpx
+from mongoengine import connect, get_db
+from mongoengine.context_managers import switch_db
+
+from clients.cache_client import credit_cache
+from clients.mongo_client import connect_mongo_db, mongodb_uri
+from clients.rate_limiting_client import limiter
+from data.models.credit_changes import ChangeFeed, CreditChangeSequence, CreditCollectionVersion, CreditTombstone
+from data.models.credit_model import Credit, CreditModel, normalize_name, use_credit_store
+from data.models.credit_summary import CreditSummary
+from data.risk_scoring import risk_engine
+from data.storage.memory_store import MemoryCreditStore
+
+BENCH_ALIAS = "bench_endpoints"
+SEED_BATCH_SIZE = 10000
+WRITE_BATCH_SIZE = 100
+STATUSES = ["Active", "Inactive", "Pending", "Closed"]
+SYLLABLES = ["ac", "me", "glo", "bex", "ini", "tech", "um", "bre", "lla", "vo", "tra", "nix", "so", "lar", "qua", "dra"]
+SUFFIXES = ["Industries", "Holdings", "Logistics", "Foods", "Textiles", "Pharma", "Steel", "Power", "Finance"]
+DOCUMENTS = (Credit, CreditSummary, CreditChangeSequence, CreditCollectionVersion, CreditTombstone)
+# No text index for search, no pipeline updates for the change feed's reservations.
+MONGOMOCK_UNSUPPORTED = ("GET /credits/search", "GET /credits/changes")
+
+
+def company_word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def seeded_cin(i):
+    return f"LOAD{i:08d}"
+
+
+def generate_credit(cin, rng, words):
+    """
+    A credit as the API takes it (POST body).
+    """
+    name = f"{rng.choice(words)} {rng.choice(words)} {rng.choice(SUFFIXES)}"
+    turnover = float(rng.randint(100000, 60000000))
+    return {
+        "CIN": cin,
+        "company_name": name,
+        "address": f"{rng.randint(1, 999)} {rng.choice(words)} Road",
+        "registration_date": f"{rng.randint(1990, 2023)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "number_of_employees": rng.randint(1, 5000),
+        "raised_capital": float(rng.randint(100000, 20000000)),
+        "turnover": turnover,
+        "net_profit": round(turnover * rng.uniform(0, 0.3), 2),
+        "contact_number": f"{rng.randint(100, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        "contact_email": f"contact{rng.randint(1, 10**6)}@example.com",
+        "company_website": "https://example.com/",
+        "loan_amount": float(rng.randint(10000, 10000000)),
+        "loan_interest_percentage": round(rng.uniform(3, 18), 2),
+        "account_status": rng.choice(STATUSES),
+    }
+
+
+def seeded_document(i, rng, words):
+    """
+    A seeded credit as it is stored, without its change feed stamps.
+    """
+    credit = generate_credit(seeded_cin(i), rng, words)
+    credit["registration_date"] = datetime.strptime(credit["registration_date"], "%Y-%m-%d")
+    credit.update(company_name_lower=normalize_name(credit["company_name"]), version=1)
+    return credit
+
+
+def seed_memory(documents, rng, words):
+    use_credit_store(MemoryCreditStore(seeded_document(i, rng, words) for i in range(documents)))
+
+
+def seed(documents, rng, words, mongomock=False):
+    for document in DOCUMENTS:
+        document.drop_collection()
+    if mongomock:
+        # No text index support, the unique CIN index is the one the write paths rely on.
+        Credit._get_collection().create_index("CIN", unique=True)
+    else:
+        CreditModel.ensure_indexes()
+    first, updated_at = ChangeFeed.reserve(documents)
+    collection = Credit._get_collection()
+    for start in range(0, documents, SEED_BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + SEED_BATCH_SIZE, documents)):
+            credit = seeded_document(i, rng, words)
+            credit.update(created_seq=first + i, **ChangeFeed.stamp(first + i, updated_at))
+            batch.append(credit)
+        collection.insert_many(batch, ordered=False)
+    ChangeFeed.release(first)
+    CreditModel.rebuild_portfolio_stats()
+
+
+def percentiles(timings):
+    if len(timings) < 2:
+        return timings * 3
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+
+def cases(documents, rng, words, heavy_requests):
+    """
+    (endpoint, method, request count or None for --requests, request builder) in run order.
+    A builder takes the request index and returns (path, params, json body).
+    """
+
+    def existing(i):
+        return seeded_cin(rng.randrange(documents))
+
+    def inserted(i):
+        return f"LOADNEW{documents}X{i:08d}"
+
+    def batch_inserted(i):
+        return [f"LOADBATCH{documents}X{i:06d}X{j:03d}" for j in range(WRITE_BATCH_SIZE)]
+
+    return [
+        ("GET /credits/", "GET", heavy_requests, lambda i: ("/credits/", None, None)),
+        ("GET /credits/?limit=100", "GET", None, lambda i: ("/credits/", {"limit": 100}, None)),
+        (
+            "GET /credits/?account_status&sort",
+            "GET",
+            None,
+            lambda i: (
+                "/credits/",
+                {"account_status": rng.choice(STATUSES), "sort": "-loan_amount", "limit": 100},
+                None,
+            ),
+        ),
+        ("GET /credits/{id}", "GET", None, lambda i: (f"/credits/{existing(i)}", None, None)),
+        (
+            "GET /credits/{id}?fields",
+            "GET",
+            None,
+            lambda i: (f"/credits/{existing(i)}", {"fields": "loan_amount"}, None),
+        ),
+        ("GET /credits/stats", "GET", None, lambda i: ("/credits/stats", None, None)),
+        ("GET /credits/stats?live=true", "GET", heavy_requests, lambda i: ("/credits/stats", {"live": "true"}, None)),
+        (
+            "GET /credits/changes",
+            "GET",
+            None,
+            lambda i: ("/credits/changes", {"since": rng.randrange(documents), "limit": 100}, None),
+        ),
+        ("GET /credits/search", "GET", None, lambda i: ("/credits/search", {"q": rng.choice(words)}, None)),
+        (
+            "GET /credits/autocomplete",
+            "GET",
+            None,
+            lambda i: ("/credits/autocomplete", {"prefix": rng.choice(words)[:3]}, None),
+        ),
+        ("GET /credits/risk", "GET", None, lambda i: ("/credits/risk", {"top": 10}, None)),
+        ("GET /credits/{id}/score", "GET", None, lambda i: (f"/credits/{existing(i)}/score", None, None)),
+        ("GET /credits/export", "GET", heavy_requests, lambda i: ("/credits/export", {"format": "ndjson"}, None)),
+        ("POST /credits/", "POST", None, lambda i: ("/credits/", None, generate_credit(inserted(i), rng, words))),
+        (
+            "POST /credits/batch",
+            "POST",
+            heavy_requests,
+            lambda i: ("/credits/batch", None, [generate_credit(cin, rng, words) for cin in batch_inserted(i)]),
+        ),
+        (
+            "PUT /credits/{id}",
+            "PUT",
+            None,
+            lambda i: (f"/credits/{existing(i)}", None, {"loan_amount": float(rng.randint(10000, 10000000))}),
+        ),
+        (
+            "PUT /credits/batch",
+            "PUT",
+            heavy_requests,
+            lambda i: (
+                "/credits/batch",
+                None,
+                [
+                    {"CIN": existing(i), "loan_interest_percentage": round(rng.uniform(3, 18), 2)}
+                    for _ in range(WRITE_BATCH_SIZE)
+                ],
+            ),
+        ),
+        ("DELETE /credits/{id}", "DELETE", None, lambda i: (f"/credits/{inserted(i)}", None, None)),
+    ]
+
+
+async def drive(client, headers, method, build, requests, concurrency):
+    timings, statuses, next_index = [], Counter(), iter(range(requests))
+
+    async def worker():
+        for i in next_index:
+            path, params, body = build(i)
+            started = time.perf_counter()
+            response = await client.request(method, path, params=params, json=body, headers=headers)
+            timings.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = percentiles(timings)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": requests / elapsed,
+        "p50_ms": p50 * 1000,
+        "p95_ms": p95 * 1000,
+        "p99_ms": p99 * 1000,
+        "max_ms": max(timings) * 1000,
+        "errors": {str(code): count for code, count in sorted(statuses.items()) if not 200 <= code < 300},
+    }
+
+
+async def run_size(documents, args, rng, words):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from main import app
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+            base_url="http://bench",
+            timeout=args.timeout,
+        )
+    async with client:
+        token = await client.post(
+            "/authentication/token",
+            data={"username": os.environ.get("JWT_USERNAME"), "password": os.environ.get("JWT_PASSWORD")},
+        )
+        token.raise_for_status()
+        headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+        results = []
+        for endpoint, method, requests, build in cases(documents, rng, words, args.heavy_requests):
+            if args.endpoints and endpoint not in args.endpoints:
+                continue
+            if args.mongomock and endpoint in MONGOMOCK_UNSUPPORTED:
+                continue
+            result = await drive(client, headers, method, build, requests or args.requests, args.concurrency)
+            results.append({"documents": documents, "endpoint": endpoint, **result})
+            print(
+                f"{documents:>9}  {endpoint:<36}{result['throughput_rps']:>10.0f}{result['p50_ms']:>10.1f}"
+                f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}  {result['errors'] or ''}"
+            )
+        return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print the change of every endpoint against a previous run, returns the regressions.
+    """
+    with open(baseline_path) as f:
+        baseline = {(result["documents"], result["endpoint"]): result for result in json.load(f)["results"]}
+    regressions = []
+    print(f"\n{'documents':>9}  {'endpoint':<36}{'req/s':>10}{'p95':>10}")
+    for result in results:
+        before = baseline.get((result["documents"], result["endpoint"]))
+        if before is None:
+            continue
+        throughput = (result["throughput_rps"] / before["throughput_rps"] - 1) * 100
+        p95 = (result["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0.0
+        regressed = throughput < -threshold or p95 > threshold
+        if regressed:
+            regressions.append(result["endpoint"])
+        print(
+            f"{result['documents']:>9}  {result['endpoint']:<36}{throughput:>+9.0f}%{p95:>+9.0f}%"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="Comma separated collection sizes")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per endpoint")
+    parser.add_argument("--heavy-requests", type=int, default=10, help="Requests for full listings/exports/batches")
+    parser.add_argument("--endpoints", nargs="*", help='Only these endpoints, e.g. "GET /credits/{id}"')
+    parser.add_argument("--url", help="Drive a running server instead of the app in this process")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--mongomock", action="store_true", help="Use the in-process mongomock stand-in")
+    parser.add_argument("--memory", action="store_true", help="Use the in-memory credit store, no database")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the database of a previous --keep run")
+    parser.add_argument("--keep", action="store_true", help="Don't drop the bench database afterwards")
+    parser.add_argument("--output", help="Results file, benchmarks/results/endpoints-<time>.json by default")
+    parser.add_argument("--compare", help="Results file of a previous run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=20, help="Regression threshold in percent")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if args.memory and (args.url or args.mongomock or args.skip_seed):
+        parser.error(
+            "--memory seeds the store of this process, it can't be combined with --url, --mongomock or --skip-seed"
+        )
+
+    database = None
+    if args.mongomock:
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("--mongomock needs mongomock: pip install mongomock")
+        # switch_db needs a default connection to switch from.
+        for alias in ("default", BENCH_ALIAS):
+            connect(alias=alias, db="credhive_bench_endpoints", mongo_client_class=mongomock.MongoClient)
+    elif not args.memory:
+        if not connect_mongo_db():
+            raise SystemExit(1)
+        connect(alias=BENCH_ALIAS, host=mongodb_uri, db=f"{get_db().name}_bench_endpoints")
+    if not args.memory:
+        database = get_db(BENCH_ALIAS)
+    limiter.enabled = False
+
+    started_at = datetime.utcnow()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    rng = random.Random(args.seed)
+    words = [company_word(rng) for _ in range(20000)]
+    results = []
+    with ExitStack() as stack:
+        for document in DOCUMENTS if database is not None else ():
+            stack.enter_context(switch_db(document, BENCH_ALIAS))
+        try:
+            print(
+                f"{'documents':>9}  {'endpoint':<36}{'req/s':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}  errors"
+            )
+            for documents in sizes:
+                if not args.skip_seed:
+                    started = time.perf_counter()
+                    if args.memory:
+                        seed_memory(documents, random.Random(args.seed), words)
+                    else:
+                        seed(documents, random.Random(args.seed), words, mongomock=args.mongomock)
+                    print(f"seeded {documents} credits in {time.perf_counter() - started:.0f}s")
+                credit_cache.clear()
+                risk_engine.clear()
+                results.extend(asyncio.run(run_size(documents, args, rng, words)))
+        finally:
+            if database is not None and not args.keep:
+                database.client.drop_database(database.name)
+
+    output = args.output or os.path.join("benchmarks", "results", f"endpoints-{started_at:%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    meta = {
+        "started_at": started_at.isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "backend": "memory" if args.memory else "mongomock" if args.mongomock else "mongodb",
+        "target": args.url or "in-process",
+        "concurrency": args.concurrency,
+        "sizes": sizes,
+    }
+    with open(output, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"results saved to {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
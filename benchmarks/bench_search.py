@@ -0,0 +1,124 @@
+"""
+Latency of company search and autocomplete on a large portfolio (1M credits by default).
+
+Seeds a separate `<db>_bench_search` database with generated company names and addresses, creates the Credit
+indexes (text index and normalized name prefix index included) and reports p50/p95/p99 of
+CreditModel.search_credits and CreditModel.autocomplete_credits for random queries.
+The database is dropped afterwards unless --keep is passed, reuse it with --skip-seed.
+
+Needs a running MongoDB at MONGO_DB_CONN_STRING, run from the repo root:
+    python -m benchmarks.bench_search --documents 1000000 --queries 500
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from mongoengine import connect, get_db
+from mongoengine.context_managers import switch_db
+
+from clients.mongo_client import connect_mongo_db, mongodb_uri
+from data.models.credit_model import Credit, CreditModel, normalize_name
+
+BENCH_ALIAS = "bench_search"
+SEED_BATCH_SIZE = 10000
+SYLLABLES = ["ac", "me", "glo", "bex", "ini", "tech", "um", "bre", "lla", "vo", "tra", "nix", "so", "lar", "qua", "dra"]
+SUFFIXES = ["Industries", "Holdings", "Logistics", "Foods", "Textiles", "Pharma", "Steel", "Power", "Finance"]
+CITIES = ["Mumbai", "Delhi", "Bengaluru", "Chennai", "Pune", "Kolkata", "Jaipur", "Surat", "Lucknow", "Nagpur"]
+
+
+def company_word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def seed(documents, rng):
+    collection = Credit._get_collection()
+    collection.drop()
+    CreditModel.ensure_indexes()
+    words = [company_word(rng) for _ in range(20000)]
+    for start in range(0, documents, SEED_BATCH_SIZE):
+        batch = []
+        for i in range(start, min(start + SEED_BATCH_SIZE, documents)):
+            name = f"{rng.choice(words)} {rng.choice(words)} {rng.choice(SUFFIXES)}"
+            batch.append(
+                {
+                    "CIN": f"SRCH{i:08d}",
+                    "company_name": name,
+                    "company_name_lower": normalize_name(name),
+                    "address": f"{rng.randint(1, 999)} {rng.choice(words)} Road, {rng.choice(CITIES)}",
+                    "account_status": "Active",
+                    "loan_amount": 250000.0,
+                    "version": 1,
+                }
+            )
+        collection.insert_many(batch, ordered=False)
+    return words
+
+
+def percentiles(timings):
+    cuts = statistics.quantiles(timings, n=100)
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+def measure(call, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        call(query)
+        timings.append(time.perf_counter() - started)
+    return percentiles(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the database of a previous --keep run")
+    parser.add_argument("--keep", action="store_true", help="Don't drop the bench database afterwards")
+    args = parser.parse_args()
+
+    if not connect_mongo_db():
+        raise SystemExit(1)
+    database = f"{get_db().name}_bench_search"
+    connect(alias=BENCH_ALIAS, host=mongodb_uri, db=database)
+    rng = random.Random(7)
+
+    with switch_db(Credit, BENCH_ALIAS):
+        try:
+            if args.skip_seed:
+                words = [company_word(rng) for _ in range(20000)]
+            else:
+                started = time.perf_counter()
+                words = seed(args.documents, rng)
+                print(f"seeded {args.documents} credits in {time.perf_counter() - started:.0f}s")
+
+            cases = {
+                "search (1 word)": (
+                    lambda q: CreditModel.search_credits(q, 20),
+                    [rng.choice(words) for _ in range(args.queries)],
+                ),
+                "search (2 words)": (
+                    lambda q: CreditModel.search_credits(q, 20),
+                    [f"{rng.choice(words)} {rng.choice(SUFFIXES)}" for _ in range(args.queries)],
+                ),
+                "autocomplete (2 chars)": (
+                    lambda q: CreditModel.autocomplete_credits(q, 10),
+                    [rng.choice(words)[:2] for _ in range(args.queries)],
+                ),
+                "autocomplete (5 chars)": (
+                    lambda q: CreditModel.autocomplete_credits(q, 10),
+                    [rng.choice(words)[:5] for _ in range(args.queries)],
+                ),
+            }
+            print(f"{'query':<26}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}")
+            for label, (call, queries) in cases.items():
+                p50, p95, p99 = measure(call, queries)
+                print(f"{label:<26}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+        finally:
+            if not args.keep:
+                Credit._get_collection().database.client.drop_database(database)
+
+
+if __name__ == "__main__":
+    main()
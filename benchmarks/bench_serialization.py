@@ -0,0 +1,85 @@
+"""
+Encode cost of credit responses, FastAPI's default path vs FastJSONResponse.
+
+  - default : jsonable_encoder over the content then JSONResponse (stdlib json), what the credits router used to do
+  - fast    : FastJSONResponse returned directly (orjson, no jsonable_encoder pass)
+  - ndjson  : one line per credit for the streaming endpoint, stdlib json vs orjson
+
+Times are per 10k credits, no MongoDB needed, run from the repo root:
+    python -m benchmarks.bench_serialization --records 10000 --repeat 5
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from routers.responses import FastJSONResponse, dumps
+
+
+def make_credits(count):
+    rng = random.Random(42)
+    statuses = ["Active", "Inactive", "Pending"]
+    return [
+        {
+            "CIN": f"U{index:020d}",
+            "company_name": f"Company {index}",
+            "address": f"{index} Bench Street, Mumbai",
+            "registration_date": datetime(2000, 1, 1) + timedelta(days=rng.randrange(8000)),
+            "number_of_employees": rng.randrange(10, 5000),
+            "raised_capital": rng.uniform(1e5, 1e8),
+            "turnover": rng.uniform(1e5, 1e8),
+            "net_profit": rng.uniform(-1e6, 1e7),
+            "contact_number": f"+91{rng.randrange(10**9, 10**10)}",
+            "contact_email": f"contact{index}@example.com",
+            "company_website": f"https://company{index}.example.com",
+            "loan_amount": rng.uniform(1e5, 1e7),
+            "loan_interest_percentage": round(rng.uniform(2, 15), 2),
+            "account_status": rng.choice(statuses),
+            "version": rng.randrange(1, 10),
+        }
+        for index in range(count)
+    ]
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    credits = make_credits(args.records)
+    content = {"data": credits}
+    cases = {
+        "default": lambda: JSONResponse(jsonable_encoder(content)),
+        "fast": lambda: FastJSONResponse(content),
+        "ndjson (json)": lambda: [json.dumps(credit, default=_json_default) for credit in credits],
+        "ndjson (orjson)": lambda: [dumps(credit) for credit in credits],
+    }
+
+    scale = 10000 / args.records
+    results = {label: best_of(fn, args.repeat) * scale * 1000 for label, fn in cases.items()}
+    for label, millis in results.items():
+        print(f"{label:<18}{millis:>10.1f} ms / 10k credits")
+    print(f"{'speedup':<18}{results['default'] / results['fast']:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
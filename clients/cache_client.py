@@ -0,0 +1,225 @@
+from collections import OrderedDict
+from dotenv import load_dotenv
+import bson
+import os
+import threading
+import time
+
+load_dotenv()
+
+_MISSING = object()
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "coalesced": self.coalesced}
+
+
+class LRUTTLCache:
+    """
+    In-process backend, least recently used entries are evicted once `max_entries` is reached
+    and entries older than their ttl are dropped on read.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries, ttl, stats=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = stats or CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.stats.incr("evictions")
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.incr("evictions")
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """
+    Shared backend so every worker process sees the same entries and invalidations.
+    Values are stored as BSON to keep Mongo types (datetime) intact across the round-trip.
+    """
+
+    name = "redis"
+
+    def __init__(self, url, ttl, prefix="credhive:cache:", stats=None):
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = stats or CacheStats()
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._redis.get(self.prefix + key)
+        if raw is None:
+            return _MISSING
+        return bson.decode(raw)["v"]
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(self.prefix + key, bson.encode({"v": value}), ex=max(1, int(self.ttl if ttl is None else ttl)))
+
+    def delete(self, key):
+        self._redis.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self._redis.delete(*keys)
+
+    def size(self):
+        return sum(1 for _ in self._redis.scan_iter(match=self.prefix + "*"))
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.stale = False
+
+
+class ReadThroughCache:
+    """
+    Read-through cache in front of a loader function.
+    Concurrent misses on the same key are collapsed into a single loader call (single-flight),
+    the other callers wait for the leader's result instead of hitting the database.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader, fresh=None):
+        """
+        The cached value of `key`, loaded on a miss. `fresh`, when given, tells whether a cached value can still be
+        served, a value it rejects is reloaded and replaced.
+        """
+        value = self.backend.get(key)
+        if value is not _MISSING and (fresh is None or fresh(value)):
+            self.backend.stats.incr("hits")
+            return value
+
+        self.backend.stats.incr("misses")
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self.backend.stats.incr("coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            # A write invalidated this key while we were loading, hand the value to the waiters but don't cache it.
+            # Checked and set under the lock `invalidate` marks flights with, so it can't land in between.
+            with self._lock:
+                if not flight.stale:
+                    self.backend.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                flight = self._flights.get(key)
+                if flight is not None:
+                    flight.stale = True
+        for key in keys:
+            self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {"backend": self.backend.name, "entries": self.backend.size(), **self.backend.stats.as_dict()}
+
+
+class NullCache:
+    name = "none"
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key):
+        return _MISSING
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def size(self):
+        return 0
+
+
+def build_cache_backend():
+    backend = os.environ.get("CACHE_BACKEND", "memory")
+    ttl = float(os.environ.get("CACHE_TTL_SECONDS", 30))
+    if backend == "memory":
+        return LRUTTLCache(max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", 10000)), ttl=ttl)
+    if backend == "redis":
+        return RedisCache(os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0"), ttl=ttl)
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+
+# Cache Instance shared by the credit data layer
+credit_cache = ReadThroughCache(build_cache_backend())
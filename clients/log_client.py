@@ -0,0 +1,52 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from dotenv import load_dotenv
+
+from clients.metrics_client import log_records_dropped
+
+load_dotenv()
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s"
+
+logger = logging.getLogger("credhive")
+
+_listener = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without blocking, when the queue is full the record is dropped
+    (and counted) rather than making the request wait for the console.
+    """
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+
+
+def configure_logging():
+    """
+    Route the `credhive` logger through a bounded queue, a background thread does the actual writes to stdout.
+    Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    logger.addHandler(DroppingQueueHandler(log_queue))
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
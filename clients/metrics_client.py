@@ -0,0 +1,125 @@
+import os
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from pymongo import monitoring
+
+load_dotenv()
+
+# With several uvicorn workers each process has its own counters, point PROMETHEUS_MULTIPROC_DIR at an empty
+# directory shared by the workers and /metrics aggregates them (see the prometheus_client multiprocess docs).
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Sub-millisecond buckets for cache hits and token checks, up to 10s for exports and aggregations.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start to the end of the response body, per route template and status code",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+credit_model_duration = Histogram(
+    "credit_model_call_duration_seconds",
+    "Time spent inside a CreditModel call made by a request, per CreditModel method",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds",
+    "Round-trip time of the Mongo commands of the sync client, per command",
+    ["command", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+jwt_verify_duration = Histogram(
+    "jwt_verify_duration_seconds",
+    "Time spent verifying the bearer token, `cached` when the verified-token cache answered",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+rate_limit_check_duration = Histogram(
+    "rate_limit_check_duration_seconds",
+    "Time spent checking the rate limits of a request against the limiter storage",
+    buckets=LATENCY_BUCKETS,
+)
+rate_limit_rejections = Counter(
+    "rate_limit_rejections_total", "Requests answered 429 by the rate limiter, per route template", ["route"]
+)
+log_records_dropped = Counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+
+def route_template(scope):
+    # The matched route's path keeps label cardinality bounded, raw paths would make one series per credit id.
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+@contextmanager
+def timed(histogram, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        (histogram.labels(**labels) if labels else histogram).observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware, unlike BaseHTTPMiddleware it doesn't put the response through an extra task and queue,
+    so it costs two clock reads per request. Streamed responses are timed up to their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.labels(scope["method"], route_template(scope), str(status_code)).observe(
+                time.perf_counter() - started
+            )
+
+
+class CommandTimer(monitoring.CommandListener):
+    """
+    pymongo command listener feeding `mongo_command_duration_seconds`, the driver measures the round-trip.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_command_duration.labels(event.command_name, "succeeded").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongo_command_duration.labels(event.command_name, "failed").observe(event.duration_micros / 1e6)
+
+
+command_timer = CommandTimer()
+
+
+def render_metrics():
+    """
+    Body and content type of the /metrics response in the Prometheus text format.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
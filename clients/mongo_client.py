@@ -1,22 +1,199 @@
+from contextlib import contextmanager
+from contextvars import Context, ContextVar
+
+import pymongo
 from dotenv import load_dotenv
-from mongoengine import Document, connect
+from mongoengine import connect, disconnect, get_connection
+from pymongo import monitoring
+from pymongo.errors import ExecutionTimeout, PyMongoError
+
+from clients.log_client import logger
+from clients.metrics_client import command_timer, credit_model_duration, timed
 import os
+import threading
+import time
 
 load_dotenv()
 
 mongodb_uri = os.getenv("MONGO_DB_CONN_STRING")
-connect(host=mongodb_uri)
 
+# Server side limit for every bounded query, Mongo aborts the operation instead of letting it pile up.
+MONGO_MAX_TIME_MS = int(os.environ.get("MONGO_MAX_TIME_MS", 10000))
+
+# Deadline (time.monotonic()) of the request served by the current thread, set by the admission layer.
+# Only the primary store call of a CreditModel method runs under it (`bounded`): the bookkeeping that follows a
+# committed write (feed tombstone, collection version, summary) must not fail because the request ran out of time.
+_request_deadline = ContextVar("request_deadline", default=None)
+
+
+def call_with_deadline(deadline, func, *args, **kwargs):
+    """
+    Call `func` with `deadline` as the request deadline, timed as a CreditModel call.
+    Contextvars don't follow a call into the threadpool, this runs in the thread making the queries.
+    """
+    token = _request_deadline.set(deadline)
+    try:
+        with timed(credit_model_duration, operation=getattr(func, "__name__", "unknown")):
+            return func(*args, **kwargs)
+    finally:
+        _request_deadline.reset(token)
+
+
+def remaining_time():
+    """
+    Seconds left before the request deadline, None when the current call has none.
+    """
+    deadline = _request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def bounded():
+    """
+    Bound every Mongo operation of the block by the request deadline, if there is one.
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        yield
+        return
+    if remaining <= 0:
+        # pymongo.timeout(0) would mean no timeout at all.
+        raise ExecutionTimeout("Request deadline exceeded")
+    with pymongo.timeout(remaining):
+        yield
+
+
+def unbounded(func, *args, **kwargs):
+    """
+    Call `func` free of the request deadline and of any `bounded` block around the call.
+    For the reads that tell what a write that ran out of time did commit.
+    """
+    # A new context holds the defaults of every contextvar: no request deadline and no pymongo.timeout.
+    return Context().run(func, *args, **kwargs)
+
+
+def connection_options():
+    """
+    Pool and timeout settings of the mongoengine connection.
+    """
+    return {
+        "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", 0)),
+        "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+        "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+        "socketTimeoutMS": int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 30000)),
+    }
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    Connection counters fed by pymongo's pool events, pymongo doesn't expose them otherwise.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+        self.cleared = 0
+
+    def _add(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
 
-# MongoDB Connections are lazzy in nature
-# creating a test document and running object_count method to make sure connection is made.
-class Test(Document):
-    pass
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "checkout_failures": self.checkout_failures,
+                "cleared": self.cleared,
+            }
+
+    def connection_created(self, event):
+        self._add("open")
+
+    def connection_closed(self, event):
+        self._add("open", -1)
+
+    def connection_checked_out(self, event):
+        self._add("checked_out")
+
+    def connection_checked_in(self, event):
+        self._add("checked_out", -1)
+
+    def connection_check_out_failed(self, event):
+        self._add("checkout_failures")
+
+    def pool_cleared(self, event):
+        self._add("cleared")
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+pool_stats = PoolStats()
+_registered = False
 
 
 def connect_mongo_db():
+    """
+    Registers the default mongoengine connection with the configured pool and timeouts, then pings the server.
+    Nothing touches Mongo before this is called (app startup, CLI entry points), returns whether it is reachable.
+    """
+    global _registered
+    if not _registered:
+        connect(host=mongodb_uri, event_listeners=[pool_stats, command_timer], **connection_options())
+        _registered = True
+    try:
+        get_connection().admin.command("ping")
+        logger.info("Connection to MongoDB successful")
+        return True
+    except PyMongoError as e:
+        logger.warning("Connection to MongoDB failed: %s", e)
+        return False
+
+
+def disconnect_mongo_db():
+    global _registered
+    if _registered:
+        disconnect()
+        _registered = False
+
+
+def mongo_status():
+    """
+    Reachability and pool state of the sync client, served on the readiness endpoint.
+    """
+    if not _registered:
+        return {"reachable": False, "error": "Not connected"}
+    client = get_connection()
+    pool_options = client.options.pool_options
+    status = {
+        "pool": {
+            "max_size": pool_options.max_pool_size,
+            "min_size": pool_options.min_pool_size,
+            **pool_stats.snapshot(),
+        },
+        "servers": {
+            f"{host}:{port}": server.server_type_name
+            for (host, port), server in client.topology_description.server_descriptions().items()
+        },
+    }
     try:
-        Test.objects.count()
-        print("Connection to MongoDB Successful")
-    except Exception as e:
-        print(f"Connection failed: {e}")
+        client.admin.command("ping")
+    except PyMongoError as e:
+        return {"reachable": False, "error": str(e), **status}
+    return {"reachable": True, **status}
@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import Storage
+from limits.storage.base import MovingWindowSupport
+
+PURGE_EVERY = 1000
+# Hits written before they carried their expiry are kept this long by the sweep, longer than any window we set.
+LEGACY_HIT_TTL = 86400
+
+
+class SQLiteStorage(Storage, MovingWindowSupport):
+    """
+    `limits` storage kept in a local SQLite file, so every uvicorn worker on the host shares the same counters
+    and they survive restarts. Registered as `sqlite://<path>`, e.g. `sqlite:///var/run/credhive/ratelimit.db`.
+
+    Every check is a single `BEGIN IMMEDIATE` transaction, which takes the file's write lock, so concurrent
+    workers can't both squeeze in the last hit of a window.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri, timeout=5.0, **options):
+        super().__init__(uri, **options)
+        self.path = uri[len("sqlite://") :] or ":memory:"
+        self.timeout = float(timeout)
+        self._connection = None
+        self._pid = None
+        self._writes = 0
+
+    def _conn(self):
+        # Reconnect after a fork, a SQLite connection must not be shared with the parent.
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS hits (key TEXT NOT NULL, ts REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS hits_key_ts ON hits (key, ts)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._add_hit_expiry(connection)
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    @staticmethod
+    def _add_hit_expiry(connection):
+        # Files created before hits carried their expiry, the first worker to open one migrates it.
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if "expires_at" not in {row[1] for row in connection.execute("PRAGMA table_info(hits)")}:
+                connection.execute("ALTER TABLE hits ADD COLUMN expires_at REAL NOT NULL DEFAULT 0")
+                connection.execute("UPDATE hits SET expires_at = ts + ?", (LEGACY_HIT_TTL,))
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _transaction(self, work):
+        with self.lock:
+            connection = self._conn()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(connection, time.time())
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return result
+
+    def _maybe_purge(self, connection, now):
+        # Keys of clients that went away are never touched again, sweep them every so often. Every row carries its
+        # own expiry: the limit that triggers the sweep says nothing about the windows of other keys.
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            connection.execute("DELETE FROM hits WHERE expires_at <= ?", (now,))
+            connection.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+
+        def work(connection, now):
+            connection.execute("DELETE FROM hits WHERE key = ? AND ts <= ?", (key, now - expiry))
+            (acquired,) = connection.execute("SELECT COUNT(*) FROM hits WHERE key = ?", (key,)).fetchone()
+            if acquired + amount > limit:
+                return False
+            connection.executemany(
+                "INSERT INTO hits (key, ts, expires_at) VALUES (?, ?, ?)", [(key, now, now + expiry)] * amount
+            )
+            self._maybe_purge(connection, now)
+            return True
+
+        return self._transaction(work)
+
+    def get_moving_window(self, key, limit, expiry):
+        with self.lock:
+            now = time.time()
+            start, acquired = (
+                self._conn()
+                .execute("SELECT MIN(ts), COUNT(*) FROM hits WHERE key = ? AND ts > ?", (key, now - expiry))
+                .fetchone()
+            )
+        return int(start if acquired else now), acquired
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        def work(connection, now):
+            row = connection.execute("SELECT value, expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                value, expires_at = amount, now + expiry
+            else:
+                value, expires_at = row[0] + amount, now + expiry if elastic_expiry else row[1]
+            connection.execute(
+                "INSERT OR REPLACE INTO counters (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at)
+            )
+            self._maybe_purge(connection, now)
+            return value
+
+        return self._transaction(work)
+
+    def get(self, key):
+        with self.lock:
+            row = (
+                self._conn()
+                .execute("SELECT value FROM counters WHERE key = ? AND expires_at > ?", (key, time.time()))
+                .fetchone()
+            )
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        with self.lock:
+            row = self._conn().execute("SELECT expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+        return int(row[0] if row else time.time())
+
+    def check(self):
+        try:
+            with self.lock:
+                self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        def work(connection, now):
+            (hits,) = connection.execute("SELECT COUNT(DISTINCT key) FROM hits").fetchone()
+            (counters,) = connection.execute("SELECT COUNT(*) FROM counters").fetchone()
+            connection.execute("DELETE FROM hits")
+            connection.execute("DELETE FROM counters")
+            return hits + counters
+
+        return self._transaction(work)
+
+    def clear(self, key):
+        def work(connection, now):
+            connection.execute("DELETE FROM hits WHERE key = ?", (key,))
+            connection.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+        self._transaction(work)
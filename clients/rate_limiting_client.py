@@ -1,5 +1,56 @@
+import os
+import time
+from dotenv import load_dotenv
 from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
-# Rate Limiter Instance using inbuilt method of limiting on remote address
-limiter = Limiter(key_func=get_remote_address)
+# Registers the `sqlite://` scheme with `limits`.
+from clients import rate_limit_storage  # noqa: F401
+from clients.metrics_client import rate_limit_check_duration, rate_limit_rejections, route_template
+
+load_dotenv()
+
+# `memory://` keeps counters per process, with several workers use a store they all share:
+# `sqlite:///path/to/ratelimit.db` (same host) or `redis://host:6379` (across hosts).
+RATE_LIMIT_STORAGE_URI = os.environ.get("RATE_LIMIT_STORAGE_URI", "memory://")
+# The moving window is exact and costs one round-trip per check on every backend (a Lua script on Redis).
+RATE_LIMIT_STRATEGY = os.environ.get("RATE_LIMIT_STRATEGY", "moving-window")
+# Only meant to be switched off for load tests (benchmarks/bench_endpoints.py --url).
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+
+def get_user_or_remote_address(request):
+    """
+    Rate limit key, the user `verify_token` authenticated (it runs before the limit check)
+    or the remote address for anonymous endpoints such as token generation.
+    """
+    user = getattr(request.state, "user", None)
+    if user:
+        return f"user:{user}"
+    return f"ip:{get_remote_address(request)}"
+
+
+class InstrumentedLimiter(Limiter):
+    """
+    Limiter recording the time spent in limit checks (a storage round-trip each) and the rejected requests.
+    """
+
+    def _check_request_limit(self, request, endpoint_func, in_middleware=True):
+        started = time.perf_counter()
+        try:
+            super()._check_request_limit(request, endpoint_func, in_middleware)
+        except RateLimitExceeded:
+            rate_limit_rejections.labels(route_template(request.scope)).inc()
+            raise
+        finally:
+            rate_limit_check_duration.observe(time.perf_counter() - started)
+
+
+# Rate Limiter Instance, shared between workers when RATE_LIMIT_STORAGE_URI points to a shared store
+limiter = InstrumentedLimiter(
+    key_func=get_user_or_remote_address,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=RATE_LIMIT_STRATEGY,
+    enabled=RATE_LIMIT_ENABLED,
+)
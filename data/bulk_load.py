@@ -0,0 +1,190 @@
+"""
+Bulk load company records into the Credit collection.
+
+Input is either a JSON array (like company_data.json) or NDJSON (one record per line), read incrementally so
+files of any size load in constant memory. Every row is validated with CreditData and the Credit document model,
+valid rows are written in unordered insert_many / upsert batches.
+
+Run from the repo root:
+    python -m data.bulk_load data/company_data.json
+    python -m data.bulk_load dump.ndjson --batch-size 5000 --upsert --errors-file errors.ndjson
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+
+from mongoengine import ValidationError as DocumentValidationError
+from pydantic import ValidationError
+
+from data.models.credit_model import CreditModel
+from data.validators.credit_data import CreditData
+
+READ_CHUNK_SIZE = 1 << 16
+MAX_PRINTED_ERRORS = 20
+
+
+def _iter_json_array(file, buffer):
+    decoder = json.JSONDecoder()
+    position = buffer.index("[") + 1
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            # Most likely the record is split across chunks, read more and retry.
+            if eof:
+                yield None, f"Invalid JSON: {e}"
+                return
+            chunk = file.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield record, None
+        position = end
+
+
+def _iter_ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None
+        except json.JSONDecodeError as e:
+            yield None, f"Invalid JSON: {e}"
+
+
+def iter_records(file):
+    """
+    Yield (record, error) pairs from a JSON array or an NDJSON stream without reading the whole file.
+    """
+    head = file.read(READ_CHUNK_SIZE)
+    if head.lstrip().startswith("["):
+        return _iter_json_array(file, head)
+    head_lines = head.splitlines(keepends=True)
+    if head_lines and not head_lines[-1].endswith("\n"):
+        # Complete the line that was cut by the chunk boundary.
+        head_lines[-1] += file.readline()
+    return _iter_ndjson(itertools.chain(head_lines, file))
+
+
+def validate_record(record):
+    """
+    Returns (document, None) for a valid record or (None, error message).
+    """
+    if not isinstance(record, dict):
+        return None, "Record must be a JSON object"
+    try:
+        return CreditModel.to_document(CreditData(**record)), None
+    except ValidationError as e:
+        return None, "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+    except DocumentValidationError as e:
+        return None, str(e)
+
+
+class LoadReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.upserted = 0
+        self.modified = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, row, cin, message):
+        self.errors.append({"row": row, "CIN": cin, "error": message})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "upserted": self.upserted,
+            "modified": self.modified,
+            "failed": len(self.errors),
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows / self.elapsed, 1) if self.elapsed else 0.0,
+        }
+
+
+def bulk_load(records, batch_size=1000, upsert=False):
+    """
+    Validate and write (record, error) pairs as produced by `iter_records`, returns a LoadReport.
+    Row numbers in the report are 1-based positions in the input.
+    """
+    report = LoadReport()
+    batch, batch_rows = [], []
+
+    def flush(batch, batch_rows):
+        summary = CreditModel.bulk_save_documents(batch, upsert=upsert)
+        report.inserted += summary["inserted"]
+        report.upserted += summary["upserted"]
+        report.modified += summary["modified"]
+        for index, message in summary["errors"].items():
+            report.add_error(batch_rows[index], batch[index]["CIN"], message)
+
+    for row, (record, error) in enumerate(records, start=1):
+        report.rows = row
+        if error is None:
+            document, error = validate_record(record)
+        if error is not None:
+            report.add_error(row, record.get("CIN") if isinstance(record, dict) else None, error)
+            continue
+        batch.append(document)
+        batch_rows.append(row)
+        if len(batch) >= batch_size:
+            flush(batch, batch_rows)
+            batch, batch_rows = [], []
+    if batch:
+        flush(batch, batch_rows)
+
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSON array or NDJSON file, '-' for stdin")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per bulk write (default 1000)")
+    parser.add_argument("--upsert", action="store_true", help="replace existing CINs instead of reporting them")
+    parser.add_argument("--errors-file", help="write every failed row as NDJSON to this file")
+    args = parser.parse_args()
+
+    from clients.mongo_client import connect_mongo_db
+
+    if not connect_mongo_db():
+        sys.exit(1)
+    # The unique CIN index is what turns duplicate rows into per-row errors.
+    CreditModel.ensure_indexes()
+
+    file = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+    try:
+        report = bulk_load(iter_records(file), batch_size=args.batch_size, upsert=args.upsert)
+    finally:
+        if file is not sys.stdin:
+            file.close()
+    if args.upsert:
+        # Upserts can't maintain the portfolio summary incrementally, recompute it once.
+        CreditModel.rebuild_portfolio_stats()
+
+    print(json.dumps(report.as_dict(), indent=4))
+    for error in report.errors[:MAX_PRINTED_ERRORS]:
+        print(f"row {error['row']} (CIN {error['CIN']}): {error['error']}")
+    if len(report.errors) > MAX_PRINTED_ERRORS:
+        print(f"... {len(report.errors) - MAX_PRINTED_ERRORS} more errors")
+    if args.errors_file:
+        with open(args.errors_file, "w", encoding="utf-8") as errors_file:
+            for error in report.errors:
+                errors_file.write(json.dumps(error) + "\n")
+
+
+if __name__ == "__main__":
+    main()
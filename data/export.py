@@ -0,0 +1,139 @@
+"""
+Serializers for the credit export, turning the batches of a Mongo cursor into NDJSON, CSV or Parquet chunks.
+
+Every serializer consumes one batch at a time and yields bytes, so an export of any size runs in memory bounded
+by the batch size. Parquet batches are built column by column and written as one row group each.
+"""
+
+import csv
+import io
+import zlib
+from datetime import datetime
+
+import orjson
+
+from data.models.credit_model import CREDIT_FIELDS, Credit
+
+FORMATS = ("ndjson", "csv", "parquet")
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def columns_for(fields):
+    # Same order as the Credit document, CIN first when only some fields are requested.
+    names = list(CREDIT_FIELDS)
+    if fields:
+        return ["CIN", *(name for name in names if name in fields and name != "CIN")]
+    return names
+
+
+def iter_ndjson(batches, columns):
+    # Keys in column order like the CSV header, a credit missing a field just doesn't have the key.
+    for batch in batches:
+        yield b"".join(
+            orjson.dumps({name: document[name] for name in columns if name in document}) + b"\n" for document in batch
+        )
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    return value
+
+
+def iter_csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for batch in batches:
+        for document in batch:
+            writer.writerow([_csv_value(document.get(name)) for name in columns])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        "StringField": pa.string(),
+        "EmailField": pa.string(),
+        "URLField": pa.string(),
+        "IntField": pa.int64(),
+        "FloatField": pa.float64(),
+        "DateField": pa.date32(),
+        "DateTimeField": pa.timestamp("ms"),
+    }
+    return pa.schema([(name, types[type(Credit._fields[name]).__name__]) for name in columns])
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file handed to the Parquet writer, the bytes written since the last drain are yielded to the client.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_column(documents, name, field_type):
+    import pyarrow as pa
+
+    values = [document.get(name) for document in documents]
+    if pa.types.is_date32(field_type):
+        values = [value.date() if isinstance(value, datetime) else value for value in values]
+    return pa.array(values, type=field_type)
+
+
+def iter_parquet(batches, columns, compression="snappy"):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(columns)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression=compression) as writer:
+        for batch in batches:
+            arrays = [_arrow_column(batch, field.name, field.type) for field in schema]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
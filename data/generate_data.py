@@ -1,36 +1,253 @@
-import json
+"""
+Generate synthetic company credit records for demos and capacity tests.
+
+Records are shaped like the POST /credits body and pass its validation. CINs follow the Indian format
+(listing, industry code, state, registration year, ownership, registration number) with the record index as the
+registration number, so they are unique within a run and across runs given disjoint --start ranges.
+
+Every record is generated from its own seed, derived from --seed and its index: the same --seed, --start and
+--as-of give the same records whatever the number of workers or the chunk size. Chunks of --chunk-size records
+are generated by --workers processes and written in order as they complete, so memory stays bounded by a few chunks.
+
+Distributions: employees are log-normal (median 60), turnover follows employees times a log-normal revenue per
+employee, net margins are normal around 7% (losses are reported as a 0 profit, the API doesn't take negative
+values), raised capital and loans are log-normal fractions of the turnover, the interest rate rises with the loan
+to turnover ratio, registration ages are exponential (mean 9 years) and recent companies are more often Pending.
+
+Formats: json (an array like company_data.json), ndjson (what bulk_load streams best) and parquet (columnar, one
+row group per chunk, needs pyarrow). Run from the repo root:
+    python -m data.generate_data --count 20 --output data/company_data.json
+    python -m data.generate_data --count 10000000 --output credits.ndjson --workers 8
+    python -m data.generate_data --count 1000000 --output - | python -m data.bulk_load -
+"""
+
+import argparse
+import math
+import os
 import random
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import orjson
 from faker import Faker
 
-fake = Faker()
+FIELDS = (
+    "CIN",
+    "company_name",
+    "address",
+    "registration_date",
+    "number_of_employees",
+    "raised_capital",
+    "turnover",
+    "net_profit",
+    "contact_number",
+    "contact_email",
+    "company_website",
+    "loan_amount",
+    "loan_interest_percentage",
+    "account_status",
+)
+FORMATS = ("json", "ndjson", "parquet")
+EXTENSIONS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet"}
+
+# Faker is slow per call, every worker draws its names, addresses and phone numbers from pools built once from
+# the seed, records only pick from them.
+POOL_SIZE = 5000
+INDUSTRY_CODES = ("01110", "15122", "17111", "24231", "27100", "45201", "51909", "55101", "65923", "72200", "74140")
+STATES = ("MH", "DL", "KA", "TN", "GJ", "WB", "TG", "UP", "HR", "RJ", "KL", "PB")
+STATUS_WEIGHTS = (("Active", 0.72), ("Inactive", 0.18), ("Pending", 0.10))
+# Newly registered companies are still being onboarded more often.
+RECENT_DAYS = 180
+RECENT_STATUS_WEIGHTS = (("Active", 0.45), ("Inactive", 0.05), ("Pending", 0.50))
+
+_pools = None
+
+
+def build_pools(seed, size=POOL_SIZE):
+    fake = Faker("en_IN")
+    fake.seed_instance(seed)
+    return {
+        "company_name": [fake.company() for _ in range(size)],
+        "address": [fake.address() for _ in range(size)],
+        "contact_number": [fake.phone_number() for _ in range(size)],
+        "user_name": [fake.user_name() for _ in range(size)],
+    }
+
+
+def _init_worker(seed):
+    global _pools
+    _pools = build_pools(seed)
+
+
+def _weighted(rng, weights):
+    threshold = rng.random()
+    for value, weight in weights:
+        threshold -= weight
+        if threshold < 0:
+            return value
+    return weights[-1][0]
+
 
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "", name.lower())[:40] or "company"
 
-# Function to generate a random company information data model
-def generate_company_data():
-    company_name = fake.company()
+
+def generate_record(index, seed, as_of, pools):
+    """
+    The record at position `index`, the same for a given seed and `as_of` date.
+    """
+    rng = random.Random((seed << 40) | index)
+    age = min(int(rng.expovariate(1 / (9 * 365))), 60 * 365)
+    registered = as_of - timedelta(days=age)
+
+    employees = max(1, min(200000, int(rng.lognormvariate(math.log(60), 1.3))))
+    turnover = round(employees * rng.lognormvariate(math.log(250000), 0.7), 2)
+    margin = rng.normalvariate(0.07, 0.09)
+    loan_ratio = rng.lognormvariate(math.log(0.2), 0.8)
+    loan_amount = max(10000.0, round(turnover * loan_ratio, -3))
+    interest = rng.normalvariate(9.0, 1.8) + min(4.0, 2 * loan_ratio)
+
+    name = rng.choice(pools["company_name"])
+    domain = f"{_slug(name)}.com"
+    listed = rng.random() < 0.05
+    cin = (
+        f"{'L' if listed else 'U'}{rng.choice(INDUSTRY_CODES)}{rng.choice(STATES)}{registered.year}"
+        f"{'PLC' if listed or rng.random() < 0.3 else 'PTC'}{index:06d}"
+    )
     return {
-        "CIN": str(random.randint(10, 1000)),
-        "company_name": company_name,
-        "address": fake.address(),
-        "registration_date": fake.date_between(start_date="-10y", end_date="today").isoformat(),
-        "number_of_employees": random.randint(10, 1000),
-        "raised_capital": random.randint(100000, 10000000),
-        "turnover": random.randint(500000, 50000000),
-        "net_profit": random.randint(100000, 10000000),
-        "contact_number": fake.phone_number(),
-        "contact_email": fake.company_email(),
-        "company_website": fake.url(),
-        "loan_amount": random.randint(50000, 5000000),
-        "loan_interest_percentage": round(random.uniform(2, 10), 2),
-        "account_status": random.choice(["Active", "Inactive", "Pending"]),
+        "CIN": cin,
+        "company_name": name,
+        "address": rng.choice(pools["address"]),
+        "registration_date": registered,
+        "number_of_employees": employees,
+        "raised_capital": round(turnover * rng.lognormvariate(math.log(0.25), 0.9), 2),
+        "turnover": turnover,
+        "net_profit": round(turnover * max(0.0, margin), 2),
+        "contact_number": rng.choice(pools["contact_number"]),
+        "contact_email": f"{rng.choice(pools['user_name'])}@{domain}",
+        "company_website": f"https://www.{domain}/",
+        "loan_amount": loan_amount,
+        "loan_interest_percentage": round(min(24.0, max(4.0, interest)), 2),
+        "account_status": _weighted(rng, RECENT_STATUS_WEIGHTS if age < RECENT_DAYS else STATUS_WEIGHTS),
     }
 
 
-# Generate 20 entries of company data
-company_data_list = [generate_company_data() for _ in range(20)]
+def generate_chunk(start, count, seed, as_of, output_format):
+    """
+    Generate records [start, start + count) in a worker and serialize them for `output_format`:
+    NDJSON / JSON array bytes, or an Arrow record batch.
+    """
+    records = [generate_record(index, seed, as_of, _pools) for index in range(start, start + count)]
+    if output_format == "parquet":
+        import pyarrow as pa
+
+        from data.export import arrow_schema
+
+        schema = arrow_schema(FIELDS)
+        return pa.record_batch(
+            [pa.array([record[field.name] for record in records], type=field.type) for field in schema], schema=schema
+        )
+    separator = b"\n" if output_format == "ndjson" else b",\n"
+    return separator.join(orjson.dumps(record) for record in records) + (b"\n" if output_format == "ndjson" else b"")
+
+
+class _Writer:
+    def __init__(self, path, output_format):
+        self.format = output_format
+        self.first = True
+        if output_format == "parquet":
+            import pyarrow.parquet as pq
+
+            from data.export import arrow_schema
+
+            self._parquet = pq.ParquetWriter(path, arrow_schema(FIELDS))
+            return
+        self._file = sys.stdout.buffer if path == "-" else open(path, "wb")
+        if output_format == "json":
+            self._file.write(b"[\n")
+
+    def write(self, chunk):
+        if self.format == "parquet":
+            self._parquet.write_batch(chunk)
+        else:
+            if self.format == "json" and not self.first:
+                self._file.write(b",\n")
+            self._file.write(chunk)
+        self.first = False
+
+    def close(self):
+        if self.format == "parquet":
+            self._parquet.close()
+            return
+        if self.format == "json":
+            self._file.write(b"\n]\n")
+        if self._file is sys.stdout.buffer:
+            self._file.flush()
+        else:
+            self._file.close()
+
+
+def generate(path, count, output_format="ndjson", start=0, seed=0, as_of=None, workers=None, chunk_size=10000):
+    """
+    Write `count` records starting at index `start` to `path` ('-' for stdout), returns the records written.
+    """
+    as_of = as_of or date.today()
+    workers = max(1, min(workers or os.cpu_count() or 1, math.ceil(count / chunk_size) or 1))
+    writer = _Writer(path, output_format)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(seed,)) as executor:
+            # A couple of chunks per worker in flight, completed chunks wait in order for the writer.
+            pending = deque()
+            for chunk_start in range(start, start + count, chunk_size):
+                chunk_count = min(chunk_size, start + count - chunk_start)
+                pending.append(executor.submit(generate_chunk, chunk_start, chunk_count, seed, as_of, output_format))
+                if len(pending) >= 2 * workers:
+                    writer.write(pending.popleft().result())
+            while pending:
+                writer.write(pending.popleft().result())
+    finally:
+        writer.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20, help="records to generate (default 20)")
+    parser.add_argument("--output", "-o", default="company_data.json", help="output file, '-' for stdout")
+    parser.add_argument("--format", choices=FORMATS, help="output format, guessed from the extension by default")
+    parser.add_argument("--start", type=int, default=0, help="index of the first record, for disjoint CIN ranges")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--as-of", type=date.fromisoformat, help="latest registration date, today by default")
+    parser.add_argument("--workers", type=int, help="generator processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="records per chunk (default 10000)")
+    args = parser.parse_args()
+
+    output_format = args.format or (
+        "ndjson" if args.output == "-" else EXTENSIONS.get(os.path.splitext(args.output)[1].lower())
+    )
+    if output_format is None:
+        parser.error("can't guess the format from the output name, pass --format")
+    if output_format == "parquet" and args.output == "-":
+        parser.error("parquet can't be written to stdout")
+
+    started = time.perf_counter()
+    count = generate(
+        args.output,
+        args.count,
+        output_format=output_format,
+        start=args.start,
+        seed=args.seed,
+        as_of=args.as_of,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
+    elapsed = time.perf_counter() - started
+    print(f"generated {count} records in {elapsed:.1f}s ({count / elapsed:.0f} records/s)", file=sys.stderr)
 
-# Convert to JSON
-json_data = json.dumps(company_data_list, indent=4)
 
-with open("company_data.json", "w+") as file:
-    file.write(json_data)
+if __name__ == "__main__":
+    main()
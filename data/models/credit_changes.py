@@ -0,0 +1,232 @@
+import heapq
+import os
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from mongoengine import DateTimeField, DictField, Document, IntField, ListField, StringField
+from pymongo import ReturnDocument, UpdateOne
+
+load_dotenv()
+
+SEQUENCE_ID = "credits"
+VERSION_ID = "credits"
+
+# A sequence number is reserved just before the write that uses it, so a change can land after a higher one.
+# Every reservation stays pending until its write is over and the feed only serves changes below the oldest pending
+# one: a position is never handed out as a `since` token while a write could still land before it, however long
+# that write takes. A reservation whose process died before releasing it stops holding the feed back after this.
+CHANGES_RESERVATION_TTL_SECONDS = float(os.environ.get("CHANGES_RESERVATION_TTL_SECONDS", 300))
+
+
+class CreditChangeSequence(Document):
+    """
+    Counter handing out the change sequence numbers of the credit collection.
+    """
+
+    id = StringField(primary_key=True, default=SEQUENCE_ID)
+    seq = IntField(required=True, default=0)
+    pending = ListField(DictField())
+    meta = {"collection": "credit_change_sequence"}
+
+
+class CreditCollectionVersion(Document):
+    """
+    Version of the credit collection as a whole, the ETag of the listings.
+    """
+
+    id = StringField(primary_key=True, default=VERSION_ID)
+    version = IntField(required=True, default=0)
+    updated_at = DateTimeField()
+    meta = {"collection": "credit_collection_version"}
+
+
+class CreditTombstone(Document):
+    """
+    Left behind by a deleted credit so the change feed can report the delete.
+    """
+
+    CIN = StringField(required=True, unique=True)
+    change_seq = IntField(required=True)
+    updated_at = DateTimeField(required=True)
+    meta = {"collection": "credit_tombstones", "auto_create_index": False, "indexes": ["change_seq"]}
+
+
+class CollectionVersion:
+    # Unlike the change sequence, which is reserved before the write, the version is bumped once the write
+    # has committed. A reader that got version N before reading the credits can't have missed a write that
+    # a later reader would see under the same N.
+    @staticmethod
+    def bump():
+        CreditCollectionVersion._get_collection().update_one(
+            {"_id": VERSION_ID}, {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}}, upsert=True
+        )
+
+    @staticmethod
+    def get():
+        """
+        (version, time of the last write), (0, None) before the first write.
+        """
+        document = CreditCollectionVersion._get_collection().find_one({"_id": VERSION_ID})
+        if document is None:
+            return 0, None
+        return document["version"], document.get("updated_at")
+
+
+class ChangeFeed:
+    @staticmethod
+    def reserve(count=1):
+        """
+        Reserve `count` consecutive sequence numbers, pending until `release`d, with one atomic update.
+        Returns the first of them and the write time to stamp with them.
+        """
+        updated_at = datetime.utcnow()
+        expired = updated_at - timedelta(seconds=CHANGES_RESERVATION_TTL_SECONDS)
+        # A pipeline update: the pending entry needs the counter it has just moved.
+        sequence = CreditChangeSequence._get_collection().find_one_and_update(
+            {"_id": SEQUENCE_ID},
+            [
+                {"$set": {"seq": {"$add": [{"$ifNull": ["$seq", 0]}, count]}}},
+                {
+                    "$set": {
+                        "pending": {
+                            "$concatArrays": [
+                                {
+                                    "$filter": {
+                                        "input": {"$ifNull": ["$pending", []]},
+                                        "cond": {"$gt": ["$$this.reserved_at", expired]},
+                                    }
+                                },
+                                [{"first": {"$subtract": ["$seq", count - 1]}, "reserved_at": updated_at}],
+                            ]
+                        }
+                    }
+                },
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return sequence["seq"] - count + 1, updated_at
+
+    @staticmethod
+    def release(first):
+        """
+        The write of the reservation starting at `first` is over, committed or not.
+        """
+        CreditChangeSequence._get_collection().update_one(
+            {"_id": SEQUENCE_ID}, {"$pull": {"pending": {"first": first}}}
+        )
+
+    @staticmethod
+    def served_below():
+        """
+        The sequence number the feed stops at: every change below it has been written.
+        """
+        sequence = CreditChangeSequence._get_collection().find_one({"_id": SEQUENCE_ID}) or {}
+        expired = datetime.utcnow() - timedelta(seconds=CHANGES_RESERVATION_TTL_SECONDS)
+        pending = [entry["first"] for entry in sequence.get("pending", []) if entry["reserved_at"] > expired]
+        return min(pending, default=sequence.get("seq", 0) + 1)
+
+    @staticmethod
+    def stamp(change_seq, updated_at):
+        return {"change_seq": change_seq, "updated_at": updated_at}
+
+    @staticmethod
+    def record_delete(cin, change_seq, updated_at):
+        # One tombstone per CIN, deleting a re-created credit moves it forward.
+        CreditTombstone._get_collection().update_one(
+            {"CIN": cin}, {"$set": ChangeFeed.stamp(change_seq, updated_at)}, upsert=True
+        )
+
+    @staticmethod
+    def changes_since(credit_collection, since, limit, projection=None, max_time_ms=None):
+        """
+        Changes with a sequence number above `since` and below the oldest pending reservation, in sequence order.
+        Credits and tombstones are both read from their `change_seq` index and merged.
+        Returns (changes, has_more), each change is {"op", "CIN", "change_seq", "updated_at", "credit"}.
+        """
+        # Read before the changes: a reservation released in between only holds this poll back.
+        query = {"change_seq": {"$gt": since, "$lt": ChangeFeed.served_below()}}
+        credits = credit_collection.find(query, projection or {"_id": 0}, max_time_ms=max_time_ms)
+        tombstones = CreditTombstone._get_collection().find(query, {"_id": 0}, max_time_ms=max_time_ms)
+        return merge_changes(
+            credits.sort("change_seq", 1).limit(limit + 1),
+            tombstones.sort("change_seq", 1).limit(limit + 1),
+            since,
+            limit,
+        )
+
+    @staticmethod
+    def last_seq():
+        """
+        The last sequence number handed out, 0 before the first write.
+        """
+        sequence = CreditChangeSequence._get_collection().find_one({"_id": SEQUENCE_ID}) or {}
+        return sequence.get("seq", 0)
+
+    @staticmethod
+    def backfill(credit_collection, batch_size=1000):
+        """
+        Give the credits written before the change feed existed a sequence number, returns how many were stamped.
+        """
+        stamped = 0
+        while True:
+            ids = [
+                document["_id"]
+                for document in credit_collection.find({"change_seq": {"$exists": False}}, {"_id": 1}).limit(batch_size)
+            ]
+            if not ids:
+                return stamped
+            first, updated_at = ChangeFeed.reserve(len(ids))
+            try:
+                credit_collection.bulk_write(
+                    [
+                        UpdateOne(
+                            {"_id": id, "change_seq": {"$exists": False}},
+                            {"$set": {**ChangeFeed.stamp(first + offset, updated_at), "created_seq": first + offset}},
+                        )
+                        for offset, id in enumerate(ids)
+                    ],
+                    ordered=False,
+                )
+            finally:
+                ChangeFeed.release(first)
+            stamped += len(ids)
+
+
+def merge_changes(credits, tombstones, since, limit):
+    """
+    Merge credits and tombstones, both in `change_seq` order and holding at least `limit + 1` entries after `since`
+    when there are that many, into the (changes, has_more) page served by the feed.
+    """
+    changes = []
+    merged = heapq.merge(
+        (_credit_change(credit, since) for credit in credits),
+        (_delete_change(tombstone) for tombstone in tombstones),
+        key=lambda change: change["change_seq"],
+    )
+    for change in merged:
+        if len(changes) == limit:
+            return changes, True
+        changes.append(change)
+    return changes, False
+
+
+def _credit_change(credit, since):
+    created_seq = credit.get("created_seq")
+    return {
+        "op": "insert" if created_seq is not None and created_seq > since else "update",
+        "CIN": credit["CIN"],
+        "change_seq": credit["change_seq"],
+        "updated_at": credit["updated_at"],
+        "credit": credit,
+    }
+
+
+def _delete_change(tombstone):
+    return {
+        "op": "delete",
+        "CIN": tombstone["CIN"],
+        "change_seq": tombstone["change_seq"],
+        "updated_at": tombstone["updated_at"],
+        "credit": None,
+    }
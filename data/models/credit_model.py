@@ -1,4 +1,19 @@
-from mongoengine import Document, StringField, IntField, FloatField, URLField, EmailField, DateField
+import base64
+import binascii
+import itertools
+import json
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, time
+
+from clients.cache_client import credit_cache
+from clients.mongo_client import bounded, remaining_time, unbounded
+from data.models.credit_changes import ChangeFeed
+from data.models.credit_summary import SUMMARY_FIELDS
+from data.risk_scoring import RISK_FIELDS, risk_engine
+from data.storage.credit_store import build_credit_store
+from mongoengine import Document, StringField, IntField, FloatField, URLField, EmailField, DateField, DateTimeField
+from mongoengine import ValidationError
 
 
 class Credit(Document):
@@ -16,56 +31,597 @@ class Credit(Document):
     loan_amount = FloatField(required=True)
     loan_interest_percentage = FloatField(required=True)
     account_status = StringField(required=True)
+    # Bumped by every write, exposed as the ETag for optimistic concurrency (If-Match).
+    version = IntField(required=True, default=1)
+    # Position in the change feed (GET /credits/changes), taken from a collection wide counter on every write.
+    change_seq = IntField()
+    created_seq = IntField()
+    updated_at = DateTimeField()
+    # Case and whitespace normalized company_name, backs the prefix index of the autocomplete.
+    company_name_lower = StringField()
+
+    # Indexes are created explicitly at startup (CreditModel.ensure_indexes) instead of on first collection access.
+    # Each supported filter/sort is served by an index, CIN is appended as the keyset pagination tiebreaker.
+    meta = {
+        "auto_create_index": False,
+        "indexes": [
+            ("loan_amount", "CIN"),
+            ("loan_interest_percentage", "CIN"),
+            ("registration_date", "CIN"),
+            ("account_status", "CIN"),
+            ("account_status", "loan_amount", "CIN"),
+            ("account_status", "loan_interest_percentage", "CIN"),
+            ("account_status", "registration_date", "CIN"),
+            "change_seq",
+            ("company_name_lower", "CIN"),
+            {
+                "fields": ["$company_name", "$address"],
+                "default_language": "english",
+                "weights": {"company_name": 10, "address": 2},
+                "name": "company_text",
+            },
+        ],
+    }
+
+    def clean(self):
+        self.company_name_lower = normalize_name(self.company_name)
+
+
+def normalize_name(name):
+    return " ".join(name.lower().split()) if name else name
+
+
+def encode_cursor(sort, value, cin):
+    # Opaque to clients, keyset pagination only needs the sort value and CIN of the last credit served.
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = json.dumps([sort, value, cin], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    """
+    Returns the (sort value, CIN) the cursor points after, raises ValueError if it is invalid for this sort.
+    """
+    try:
+        payload = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True)
+        cursor_sort, value, cin = json.loads(payload)
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["$date"])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid pagination cursor")
+    if cursor_sort != sort:
+        raise ValueError("Pagination cursor doesn't match the requested sort")
+    return value, cin
+
+
+def _as_datetime(value):
+    # registration_date is stored as a datetime by the DateField
+    return datetime.combine(value, time()) if isinstance(value, date) and not isinstance(value, datetime) else value
+
+
+def build_filter(filters):
+    """
+    Mongo query for a CreditFilters, every condition maps to an indexed field.
+    """
+    query = {}
+    if filters is None:
+        return query
+    if filters.account_status is not None:
+        query["account_status"] = filters.account_status
+    for field, lower, upper in (
+        ("loan_amount", filters.loan_amount_min, filters.loan_amount_max),
+        ("loan_interest_percentage", filters.loan_interest_percentage_min, filters.loan_interest_percentage_max),
+        ("registration_date", _as_datetime(filters.registered_from), _as_datetime(filters.registered_to)),
+    ):
+        condition = {}
+        if lower is not None:
+            condition["$gte"] = lower
+        if upper is not None:
+            condition["$lte"] = upper
+        if condition:
+            query[field] = condition
+    return query
+
+
+def sort_spec(sort):
+    """
+    (field, direction) and the pymongo sort for a sort key like "-loan_amount", CIN breaks ties.
+    """
+    field, direction = (sort[1:], -1) if sort.startswith("-") else (sort, 1)
+    if field == "CIN":
+        return field, direction, [("CIN", direction)]
+    return field, direction, [(field, direction), ("CIN", direction)]
+
+
+def _keyset_filter(field, direction, value, cin):
+    operator = "$gt" if direction == 1 else "$lt"
+    if field == "CIN":
+        return {"CIN": {operator: cin}}
+    return {"$or": [{field: {operator: value}}, {field: value, "CIN": {operator: cin}}]}
+
+
+ALL_CREDITS_CACHE_KEY = "credits:all"
+
+
+def credit_cache_key(id):
+    return f"credit:{id}"
+
+
+# Fields only kept for indexing are never returned.
+INTERNAL_FIELDS = ("company_name_lower",)
+CREDIT_FIELDS = tuple(name for name in Credit._fields if name != "id" and name not in INTERNAL_FIELDS)
+
+
+def parse_fields(fields):
+    """
+    Parse a comma separated `fields=` value into a tuple of Credit field names, None means every field.
+    """
+    if not fields:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in CREDIT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names or None
+
+
+def _projection(fields=None):
+    # CIN is always returned, clients need it to identify the credit and pagination needs it for the cursor.
+    if not fields:
+        return {"_id": 0, **dict.fromkeys(INTERNAL_FIELDS, 0)}
+    return {"_id": 0, "CIN": 1, **{name: 1 for name in fields}}
+
+
+class CreditVersionConflict(Exception):
+    """
+    The credit exists but its version doesn't match the one the client expected (If-Match).
+    """
+
+
+# Pre-images of a write only need what the derived data (portfolio summary, risk scores) is computed from.
+IMAGE_FIELDS = (*SUMMARY_FIELDS, *RISK_FIELDS)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def credit_store():
+    """
+    The CreditStore behind CreditModel, built from CREDIT_STORE on first use.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = build_credit_store()
+    return _store
+
+
+def use_credit_store(store):
+    """
+    Put `store` behind CreditModel (tests, benchmarks), returns the previous one.
+    The read cache and the risk engine hold data of the previous store, clear them when switching.
+    """
+    global _store
+    with _store_lock:
+        previous, _store = _store, store
+    return previous
 
 
 class CreditModel:
+    # Methods called by requests run their primary store call `bounded` by the request deadline. What follows a
+    # committed write (_on_write, delete tombstones) runs unbounded: a write that happened is never answered 503
+    # and the derived data never misses it.
+
+    @staticmethod
+    def _invalidate(*ids):
+        # Every write changes both the document and the full listing.
+        credit_cache.invalidate(*[credit_cache_key(id) for id in ids], ALL_CREDITS_CACHE_KEY)
+        credit_store().bump_version()
+
+    @staticmethod
+    def _on_write(changes):
+        """
+        Keep everything derived from the credit collection in step with a write.
+        `changes` are (before, after) credit dicts, before is None for an insert and after is None for a delete.
+        """
+        if not changes:
+            return
+        CreditModel._invalidate(*{(after or before)["CIN"] for before, after in changes})
+        credit_store().apply_summary_changes(changes)
+        risk_engine.apply_changes(changes)
+
+    @staticmethod
+    @contextmanager
+    def _change_seqs(count=1):
+        """
+        Reserve `count` change sequence numbers for the write of the block, released once it is over.
+        """
+        store = credit_store()
+        first, updated_at = store.reserve_change_seq(count)
+        try:
+            yield first, updated_at
+        finally:
+            # Past the request deadline like the rest of the bookkeeping: until then the feed waits for this write.
+            unbounded(store.release_change_seq, first)
+
+    @staticmethod
+    def connect():
+        """
+        Connect the configured store, returns whether it can serve requests.
+        """
+        return credit_store().connect()
+
+    @staticmethod
+    def close():
+        credit_store().close()
+
+    @staticmethod
+    def store_status():
+        return credit_store().status()
+
+    @staticmethod
+    def get_all_credits(fields=None, version=None):
+        # Only the full listing is cached, projected listings go to the store so they only ship the requested fields.
+        if fields:
+            return CreditModel._load_all_credits(fields)
+        # One slot holding the listing with the collection version it was loaded for (the listing ETag). A listing
+        # cached by a worker that missed another worker's invalidation is older than the version the caller read,
+        # it is reloaded in place rather than served under a newer version, and old copies never pile up.
+        entry = credit_cache.get_or_load(
+            ALL_CREDITS_CACHE_KEY,
+            lambda: {"version": version, "credits": CreditModel._load_all_credits()},
+            fresh=lambda entry: version is None or (entry["version"] is not None and entry["version"] >= version),
+        )
+        return entry["credits"]
+
+    @staticmethod
+    def get_collection_version():
+        """
+        (version, last write time) of the credit collection, bumped by every write method.
+        """
+        with bounded():
+            return credit_store().get_version()
+
     @staticmethod
-    def get_all_credits():
-        credits = Credit.objects.all()
-        credit_dicts = []
-        for credit in credits:
-            credit_dict = (
-                credit.to_mongo().to_dict()
-            )  # Converting to dict, experiment shows pydantic and mongo having different handling of data types.
-            # Remove the '_id' field
-            credit_dict.pop("_id", None)  # If there are other fields to remove, do similarly
-            credit_dicts.append(credit_dict)
-        return credit_dicts
-
-    @staticmethod
-    def get_id_credit(id):
-        credit = Credit.objects(CIN=id).first()
-        if credit:
-            credit_dict = credit.to_mongo().to_dict()
-            credit_dict.pop("_id", None)
+    def _load_all_credits(fields=None):
+        with bounded():
+            return credit_store().find_all(fields)
+
+    @staticmethod
+    def get_credits_page(limit, after=None, fields=None, filters=None):
+        """
+        Keyset pagination over the credits matching `filters` (a CreditFilters) in their sort order,
+        returns (credits, next_cursor). One extra document is fetched to know whether another page exists.
+        """
+        sort = filters.sort if filters is not None else "CIN"
+        field = sort_spec(sort)[0]
+        if after:
+            value, cin = decode_cursor(after, sort)
+            after = (_as_datetime(value), cin)
+
+        drop_sort_field = fields is not None and field != "CIN" and field not in fields
+        if drop_sort_field:
+            # The cursor needs the sort value even when the client didn't ask for it.
+            fields = (*fields, field)
+        with bounded():
+            credit_dicts = credit_store().find_page(limit + 1, after=after or None, fields=fields, filters=filters)
+
+        next_cursor = None
+        if len(credit_dicts) > limit:
+            credit_dicts = credit_dicts[:limit]
+            next_cursor = encode_cursor(sort, credit_dicts[-1][field], credit_dicts[-1]["CIN"])
+        if drop_sort_field:
+            for credit_dict in credit_dicts:
+                credit_dict.pop(field, None)
+        return credit_dicts, next_cursor
+
+    @staticmethod
+    def iter_credits(batch_size, fields=None, filters=None):
+        """
+        Yield raw credit dicts straight from the store, `batch_size` documents per round-trip.
+        """
+        yield from credit_store().iter_credits(batch_size, fields=fields, filters=filters)
+
+    @staticmethod
+    def iter_credit_batches(batch_size, fields=None, filters=None):
+        """
+        Same as `iter_credits`, grouped in lists of `batch_size` credits.
+        """
+        credits = CreditModel.iter_credits(batch_size, fields=fields, filters=filters)
+        while batch := list(itertools.islice(credits, batch_size)):
+            yield batch
+
+    @staticmethod
+    def get_id_credit(id, fields=None):
+        # The full document is cached once and projected in process, so every fieldset shares the same entry.
+        credit_dict = credit_cache.get_or_load(credit_cache_key(id), lambda: CreditModel._load_id_credit(id))
+        if credit_dict is None or not fields:
             return credit_dict
-        return None
+        return {name: credit_dict[name] for name in ("CIN", *fields) if name in credit_dict}
+
+    @staticmethod
+    def _load_id_credit(id):
+        with bounded():
+            return credit_store().get(id)
 
     @staticmethod
     def save_credit(credit_data):
-        existing_credit = Credit.objects(CIN=credit_data.CIN).first()
-        if existing_credit:
-            return False, "Credit with this CIN already exists"
-
-        # Convert Pydantic URL to string
-        credit_data.company_website = str(credit_data.company_website)
-        credit = Credit(**credit_data.dict())
-        credit.save()
+        # Single round-trip, the unique CIN rejects duplicates atomically instead of a read-then-write.
+        document = CreditModel.to_document(credit_data)
+        with bounded(), CreditModel._change_seqs() as (change_seq, updated_at):
+            document.update(ChangeFeed.stamp(change_seq, updated_at), created_seq=change_seq)
+            errors = credit_store().insert_many([document])
+        if errors:
+            return False, errors[0]
+        CreditModel._on_write([(None, document)])
         return True, "Credit saved successfully"
 
     @staticmethod
-    def update_credit_data(id, credit_data):
-        credit = Credit.objects(CIN=id).first()
-        print(credit)
-        if credit:
-            credit.update(**credit_data.dict(exclude_none=True))
-            return True
-        return False
+    def to_document(credit_data):
+        """
+        Validate a CreditData through the Credit document and return the raw dict that would be stored.
+        Raises mongoengine.ValidationError when the data doesn't pass the model checks.
+        """
+        data = credit_data.dict()
+        data["company_website"] = str(data["company_website"])
+        credit = Credit(**data)
+        credit.validate()
+        return credit.to_mongo().to_dict()
+
+    @staticmethod
+    def bulk_save_documents(documents, upsert=False):
+        """
+        Write already validated documents (see `to_document`) in one unordered bulk operation.
+        With `upsert` existing CINs are replaced, otherwise they are reported as duplicates.
+        Returns a summary with the written counts and an {index: error message} map of the failed documents.
+        Upserts don't know the documents they replaced, rebuild the portfolio summary once they are done.
+        """
+        summary = {"inserted": 0, "upserted": 0, "modified": 0, "errors": {}}
+        if not documents:
+            return summary
+        with bounded(), CreditModel._change_seqs(len(documents)) as (first, updated_at):
+            for offset, document in enumerate(documents):
+                document.update(ChangeFeed.stamp(first + offset, updated_at), created_seq=first + offset)
+            if upsert:
+                summary.update(credit_store().upsert_many(documents))
+            else:
+                summary["errors"] = credit_store().insert_many(documents)
+                summary["inserted"] = len(documents) - len(summary["errors"])
+        written = [(None, document) for index, document in enumerate(documents) if index not in summary["errors"]]
+        if upsert:
+            CreditModel._invalidate(*[document["CIN"] for document in documents])
+            risk_engine.apply_changes(written)
+        else:
+            CreditModel._on_write(written)
+        return summary
+
+    @staticmethod
+    def to_update_fields(credit_data):
+        """
+        $set fields for a PutCreditData, values go through the Credit fields so they are stored like save() stores them.
+        """
+        update = credit_data.dict(exclude_none=True, exclude={"CIN"})
+        if "company_website" in update:
+            update["company_website"] = str(update["company_website"])
+        if "company_name" in update:
+            update["company_name_lower"] = normalize_name(update["company_name"])
+        return {name: Credit._fields[name].to_mongo(value) for name, value in update.items()}
+
+    @staticmethod
+    def save_credits(credit_batch):
+        """
+        Insert a batch of CreditData in one unordered bulk write.
+        Returns one {"CIN", "status", "detail"} result per item, in input order, status is "created" or "failed".
+        """
+        results = [{"CIN": credit_data.CIN, "status": "created", "detail": None} for credit_data in credit_batch]
+        documents, positions = [], []
+        for position, credit_data in enumerate(credit_batch):
+            try:
+                documents.append(CreditModel.to_document(credit_data))
+                positions.append(position)
+            except ValidationError as e:
+                results[position].update(status="failed", detail=str(e))
+
+        summary = CreditModel.bulk_save_documents(documents)
+        for index, message in summary["errors"].items():
+            results[positions[index]].update(status="failed", detail=message)
+        return results
+
+    @staticmethod
+    def update_credits(credit_batch):
+        """
+        Apply a batch of partial updates (PutCreditData with a CIN), each credit atomically.
+        Returns one {"CIN", "status", "detail"} result per item, in input order,
+        status is "updated", "not_found" or "failed".
+        """
+        store = credit_store()
+        results = [{"CIN": credit_data.CIN, "status": "updated", "detail": None} for credit_data in credit_batch]
+
+        positions, updates, unchanged, seen = [], [], [], set()
+        for position, credit_data in enumerate(credit_batch):
+            if credit_data.CIN in seen:
+                # Two updates of the same CIN in one batch have no defined order.
+                results[position].update(status="failed", detail="Duplicate CIN in batch")
+                continue
+            seen.add(credit_data.CIN)
+            update = CreditModel.to_update_fields(credit_data)
+            if update:
+                positions.append(position)
+                updates.append(update)
+            else:
+                unchanged.append(position)
+
+        changes = []
+        with bounded():
+            if unchanged:
+                # Nothing to write, still tell missing credits apart.
+                cins = [credit_batch[position].CIN for position in unchanged]
+                existing = {document["CIN"] for document in store.get_many(cins, fields=("CIN",))}
+                for position in unchanged:
+                    if credit_batch[position].CIN not in existing:
+                        results[position].update(status="not_found", detail="Credit ID not found for update")
+            if updates:
+                with CreditModel._change_seqs(len(updates)) as (first, updated_at):
+                    for index, update in enumerate(updates):
+                        update.update(ChangeFeed.stamp(first + index, updated_at))
+                    # The pre-image of each update comes from the write itself, so the derived data gets the exact
+                    # delta even when another request changed or deleted the credit just before.
+                    images, failed = store.update_many(
+                        [(credit_batch[position].CIN, update) for position, update in zip(positions, updates)],
+                        image_fields=IMAGE_FIELDS,
+                    )
+                for index, position in enumerate(positions):
+                    if index in failed:
+                        results[position].update(status="failed", detail=failed[index])
+                    elif images[index] is None:
+                        results[position].update(status="not_found", detail="Credit ID not found for update")
+                    else:
+                        changes.append((images[index], {**images[index], **updates[index]}))
+        CreditModel._on_write(changes)
+        return results
+
+    @staticmethod
+    def update_credit_data(id, credit_data, expected_versions=None):
+        """
+        Atomically apply the update and bump the version.
+        Returns the new version, None if the credit doesn't exist, raises CreditVersionConflict
+        when `expected_versions` is given and none of them is the current version.
+        """
+        store = credit_store()
+        fields = CreditModel.to_update_fields(credit_data)
+        with bounded(), CreditModel._change_seqs() as (change_seq, updated_at):
+            fields.update(ChangeFeed.stamp(change_seq, updated_at))
+            # The pre-image lets the portfolio summary apply the exact delta of this update.
+            before = store.update_one(id, fields, expected_versions, image_fields=(*IMAGE_FIELDS, "version"))
+            if before is None:
+                # Only the failure path pays for a second read, to tell a stale version from a missing credit.
+                if expected_versions is not None and store.exists(id):
+                    raise CreditVersionConflict(id)
+                return None
+        CreditModel._on_write([(before, {**before, **fields})])
+        return before.get("version", 0) + 1
+
+    @staticmethod
+    def delete_credit_by_id(id, expected_versions=None):
+        store = credit_store()
+        with bounded():
+            deleted = store.delete_one(id, expected_versions, image_fields=IMAGE_FIELDS)
+            if deleted is None:
+                if expected_versions is not None and store.exists(id):
+                    raise CreditVersionConflict(id)
+                return False
+        with CreditModel._change_seqs() as (change_seq, updated_at):
+            store.record_delete(id, change_seq, updated_at)
+        CreditModel._on_write([(deleted, None)])
+        return True
+
+    @staticmethod
+    def get_portfolio_stats(live=False):
+        """
+        Portfolio totals, read from the incrementally maintained summary
+        or, with `live`, computed from scratch over the whole collection.
+        A missing summary is rebuilt.
+        """
+        with bounded():
+            if live:
+                return credit_store().aggregate_summary()
+            return credit_store().get_summary() or credit_store().rebuild_summary()
+
+    @staticmethod
+    def warm_caches(all_credits=False):
+        """
+        Loads what the first requests would otherwise pay for: the portfolio summary (rebuilt if missing)
+        and, with `all_credits`, the cached full listing (a copy of the collection in every worker).
+        """
+        CreditModel.get_portfolio_stats()
+        if all_credits:
+            CreditModel.get_all_credits(version=CreditModel.get_collection_version()[0])
+
+    @staticmethod
+    def rebuild_portfolio_stats():
+        with bounded():
+            return credit_store().rebuild_summary()
+
+    @staticmethod
+    def get_changes(since, limit):
+        """
+        Inserts, updates and deletes after the change sequence number `since`, see ChangeFeed.changes_since.
+        """
+        with bounded():
+            return credit_store().changes_since(since, limit)
+
+    @staticmethod
+    def search_credits(q, limit, fields=None):
+        """
+        Full-text search over company_name and address, best matches first (company_name matches weigh more).
+        Every credit comes with its relevance `score`.
+        """
+        with bounded():
+            return credit_store().search(q, limit, fields=fields)
+
+    @staticmethod
+    def autocomplete_credits(prefix, limit):
+        """
+        Credits whose company_name starts with `prefix`, ignoring case, in name order.
+        """
+        prefix = normalize_name(prefix) + (" " if prefix[-1:].isspace() else "")
+        with bounded():
+            return credit_store().autocomplete(prefix, limit)
+
+    @staticmethod
+    def _sync_risk_engine():
+        # The first load reads the whole collection, it runs in the background and outside the request deadline,
+        # a request only waits for it as long as its deadline allows (RiskScoresLoading past that).
+        # Catching up with the change feed afterwards is a bounded read like any other.
+        with bounded():
+            risk_engine.sync(credit_store(), wait=remaining_time())
+
+    @staticmethod
+    def get_risk_score(id):
+        CreditModel._sync_risk_engine()
+        return risk_engine.score(id)
+
+    @staticmethod
+    def get_top_risks(top):
+        CreditModel._sync_risk_engine()
+        return risk_engine.top(top)
+
+    @staticmethod
+    def load_risk_scores():
+        """
+        Start loading the risk engine in the background, so the first risk requests don't wait for it.
+        """
+        risk_engine.load_in_background(credit_store())
+
+    @staticmethod
+    def ensure_indexes():
+        credit_store().ensure_indexes()
+
+    @staticmethod
+    def backfill_versions():
+        """
+        Credits written before versioning have no version field, start them at 1 so If-Match filters see them.
+        """
+        modified = credit_store().backfill_versions()
+        if modified:
+            credit_store().bump_version()
+        return modified
+
+    @staticmethod
+    def backfill_change_seq():
+        """
+        Credits written before the change feed have no change_seq, number them so the feed reports them once.
+        """
+        numbered = credit_store().backfill_change_seq()
+        if numbered:
+            credit_store().bump_version()
+        return numbered
 
     @staticmethod
-    def delete_credit_by_id(id):
-        credit = Credit.objects(CIN=id).first()
-        if credit:
-            credit.delete()
-            return True
-        return False
+    def backfill_search_fields(batch_size=1000):
+        """
+        Fill company_name_lower on credits written before the autocomplete existed, returns how many were updated.
+        """
+        return credit_store().backfill_search_fields(batch_size)
@@ -0,0 +1,199 @@
+from bisect import bisect_right
+from datetime import datetime
+
+from mongoengine import DateTimeField, DictField, Document, StringField
+
+# Lower bounds of the turnover / net_profit buckets, values at or above the last bound fall in the open-ended bucket.
+TURNOVER_BOUNDARIES = [0, 1000000, 5000000, 10000000, 25000000, 50000000]
+NET_PROFIT_BOUNDARIES = [0, 1000000, 2500000, 5000000, 10000000]
+
+# Credit fields the summary is computed from, write paths only need these to maintain it.
+SUMMARY_FIELDS = ("account_status", "loan_amount", "loan_interest_percentage", "turnover", "net_profit")
+
+SUMMARY_ID = "portfolio"
+
+
+class CreditSummary(Document):
+    """
+    Materialized portfolio totals, maintained incrementally by the CreditModel write paths.
+    """
+
+    id = StringField(primary_key=True, default=SUMMARY_ID)
+    by_status = DictField()
+    turnover_buckets = DictField()
+    net_profit_buckets = DictField()
+    updated_at = DateTimeField()
+    meta = {"collection": "credit_summary"}
+
+
+def bucket_label(value, boundaries):
+    index = bisect_right(boundaries, value) - 1
+    if index < 0 or index >= len(boundaries) - 1:
+        return f"{boundaries[-1]}+"
+    return f"{boundaries[index]}-{boundaries[index + 1]}"
+
+
+def _status_key(status):
+    # Field paths can't contain "." or start with "$", account_status is free text.
+    return str(status).replace(".", "_").lstrip("$") or "_"
+
+
+def _contribution(credit, sign=1):
+    status = f"by_status.{_status_key(credit.get('account_status'))}"
+    loan_amount = credit.get("loan_amount") or 0
+    return {
+        f"{status}.count": sign,
+        f"{status}.loan_amount": sign * loan_amount,
+        f"{status}.weighted_interest": sign * loan_amount * (credit.get("loan_interest_percentage") or 0),
+        f"turnover_buckets.{bucket_label(credit.get('turnover') or 0, TURNOVER_BOUNDARIES)}": sign,
+        f"net_profit_buckets.{bucket_label(credit.get('net_profit') or 0, NET_PROFIT_BOUNDARIES)}": sign,
+    }
+
+
+def summary_increments(changes):
+    """
+    The {dotted path: amount} deltas (before, after) credit pairs make to the summary, zero deltas left out.
+    """
+    increments = {}
+    for before, after in changes:
+        for credit, sign in ((before, -1), (after, 1)):
+            if credit is None:
+                continue
+            for path, amount in _contribution(credit, sign).items():
+                increments[path] = increments.get(path, 0) + amount
+    return {path: amount for path, amount in increments.items() if amount}
+
+
+def apply_increments(summary, increments):
+    """
+    Apply `summary_increments` to a summary dict in place, the in-process counterpart of the $inc.
+    """
+    for path, amount in increments.items():
+        *parents, leaf = path.split(".")
+        node = summary
+        for name in parents:
+            node = node.setdefault(name, {})
+        node[leaf] = node.get(leaf, 0) + amount
+    return summary
+
+
+def _bucket_stage(field, boundaries):
+    return [
+        {
+            "$bucket": {
+                "groupBy": f"${field}",
+                "boundaries": boundaries,
+                "default": f"{boundaries[-1]}+",
+                "output": {"count": {"$sum": 1}},
+            }
+        }
+    ]
+
+
+def _bucket_counts(buckets, boundaries):
+    # $bucket ids are the lower bound, or the default label for the open-ended bucket.
+    return {
+        bucket["_id"] if isinstance(bucket["_id"], str) else bucket_label(bucket["_id"], boundaries): bucket["count"]
+        for bucket in buckets
+    }
+
+
+class PortfolioSummary:
+    @staticmethod
+    def apply_changes(changes):
+        """
+        Fold (before, after) credit pairs into the summary with a single atomic $inc.
+        `before` is None for inserts and `after` is None for deletes.
+        """
+        increments = summary_increments(changes)
+        if not increments:
+            return
+        CreditSummary._get_collection().update_one(
+            {"_id": SUMMARY_ID}, {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}}, upsert=True
+        )
+
+    @staticmethod
+    def aggregate(collection, max_time_ms=None):
+        """
+        Compute the summary from scratch with one aggregation pipeline over the credit collection,
+        `max_time_ms` bounds it server side.
+        """
+        pipeline = [
+            {
+                "$facet": {
+                    "by_status": [
+                        {
+                            "$group": {
+                                "_id": "$account_status",
+                                "count": {"$sum": 1},
+                                "loan_amount": {"$sum": "$loan_amount"},
+                                "weighted_interest": {
+                                    "$sum": {"$multiply": ["$loan_amount", "$loan_interest_percentage"]}
+                                },
+                            }
+                        }
+                    ],
+                    "turnover_buckets": _bucket_stage("turnover", TURNOVER_BOUNDARIES),
+                    "net_profit_buckets": _bucket_stage("net_profit", NET_PROFIT_BOUNDARIES),
+                }
+            }
+        ]
+        options = {"maxTimeMS": max_time_ms} if max_time_ms else {}
+        result = next(collection.aggregate(pipeline, **options))
+        return {
+            "by_status": {
+                _status_key(group["_id"]): {
+                    "count": group["count"],
+                    "loan_amount": group["loan_amount"],
+                    "weighted_interest": group["weighted_interest"],
+                }
+                for group in result["by_status"]
+            },
+            "turnover_buckets": _bucket_counts(result["turnover_buckets"], TURNOVER_BOUNDARIES),
+            "net_profit_buckets": _bucket_counts(result["net_profit_buckets"], NET_PROFIT_BOUNDARIES),
+            "updated_at": datetime.utcnow(),
+        }
+
+    @staticmethod
+    def rebuild(collection):
+        summary = PortfolioSummary.aggregate(collection)
+        CreditSummary._get_collection().replace_one({"_id": SUMMARY_ID}, summary, upsert=True)
+        return summary
+
+    @staticmethod
+    def get():
+        return CreditSummary._get_collection().find_one({"_id": SUMMARY_ID}, {"_id": 0})
+
+
+def format_stats(summary):
+    """
+    API shape of a summary document, derives the weighted average interest from the maintained sums.
+    """
+    by_status, total = [], {"count": 0, "loan_amount": 0, "weighted_interest": 0}
+    for status, sums in sorted(summary.get("by_status", {}).items()):
+        if not sums.get("count"):
+            continue
+        for key in total:
+            total[key] += sums.get(key, 0)
+        by_status.append({"account_status": status, **_format_sums(sums)})
+    return {
+        "by_status": by_status,
+        "total": _format_sums(total),
+        "turnover_buckets": _ordered_buckets(summary.get("turnover_buckets", {}), TURNOVER_BOUNDARIES),
+        "net_profit_buckets": _ordered_buckets(summary.get("net_profit_buckets", {}), NET_PROFIT_BOUNDARIES),
+        "updated_at": summary.get("updated_at"),
+    }
+
+
+def _ordered_buckets(counts, boundaries):
+    labels = [bucket_label(lower, boundaries) for lower in boundaries]
+    return {label: counts[label] for label in labels if counts.get(label)}
+
+
+def _format_sums(sums):
+    loan_amount = sums.get("loan_amount", 0)
+    return {
+        "count": sums.get("count", 0),
+        "total_loan_amount": loan_amount,
+        "weighted_avg_interest_percentage": sums.get("weighted_interest", 0) / loan_amount if loan_amount else None,
+    }
@@ -0,0 +1,285 @@
+"""
+Vectorized credit risk scoring over the whole portfolio.
+
+The numeric columns the score needs are kept in NumPy arrays, one row per credit, and scored in batches.
+The engine loads them once, in a background thread since it reads the whole collection, then keeps them current
+incrementally: CreditModel writes apply their after-images
+right away and every read first catches up with the change feed, so writes made by other workers are picked up
+without reloading the collection.
+
+Score, 0 (safest) to 100 (riskiest), a weighted sum of four clipped components:
+  - debt_to_turnover = loan_amount / turnover,                         full weight at 2x turnover
+  - net_margin       = net_profit / turnover,                          full weight at -20%, none from +20%
+  - interest_burden  = loan_amount * interest / 100 / net_profit,      full weight once interest eats the profit
+  - capital_cover    = raised_capital / loan_amount,                   full weight when nothing was raised
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from clients.log_client import logger
+
+load_dotenv()
+
+RISK_FIELDS = (
+    "turnover",
+    "net_profit",
+    "raised_capital",
+    "loan_amount",
+    "loan_interest_percentage",
+    "number_of_employees",
+)
+WEIGHTS = {"debt_to_turnover": 35.0, "net_margin": 25.0, "interest_burden": 30.0, "capital_cover": 10.0}
+GRADES = ((20, "A"), (40, "B"), (60, "C"), (80, "D"), (101, "E"))
+
+# Minimum time between two change feed catch-ups, reads in between are served from memory.
+RISK_SYNC_SECONDS = float(os.environ.get("RISK_SYNC_SECONDS", 2))
+SCORE_BATCH_SIZE = 65536
+LOAD_BATCH_SIZE = 10000
+
+
+def score_batch(columns):
+    """
+    Score a batch of credits, `columns` maps every RISK_FIELDS name to a float64 array of the same length.
+    Returns the ratios and the score as arrays, ratios that can't be computed (zero turnover, loan or loss) are inf.
+    """
+    turnover, net_profit = columns["turnover"], columns["net_profit"]
+    loan_amount, interest = columns["loan_amount"], columns["loan_interest_percentage"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        debt_to_turnover = np.where(turnover > 0, loan_amount / turnover, np.inf)
+        net_margin = np.where(turnover > 0, net_profit / turnover, -np.inf)
+        interest_burden = np.where(net_profit > 0, loan_amount * interest / 100 / net_profit, np.inf)
+        capital_cover = np.where(loan_amount > 0, columns["raised_capital"] / loan_amount, np.inf)
+
+    score = (
+        WEIGHTS["debt_to_turnover"] * np.clip(debt_to_turnover / 2, 0, 1)
+        + WEIGHTS["net_margin"] * np.clip((0.2 - net_margin) / 0.4, 0, 1)
+        + WEIGHTS["interest_burden"] * np.clip(interest_burden, 0, 1)
+        + WEIGHTS["capital_cover"] * np.clip(1 - capital_cover, 0, 1)
+    )
+    return {
+        "score": score,
+        "debt_to_turnover": debt_to_turnover,
+        "net_margin": net_margin,
+        "interest_burden": interest_burden,
+        "capital_cover": capital_cover,
+    }
+
+
+def grade(score):
+    return next(letter for bound, letter in GRADES if score < bound)
+
+
+def _finite(value):
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+class RiskScoresLoading(Exception):
+    """
+    The engine is still loading the portfolio, scores can't be served yet.
+    """
+
+
+class RiskEngine:
+    OUTPUTS = ("score", "debt_to_turnover", "net_margin", "interest_burden", "capital_cover")
+
+    def __init__(self, sync_seconds=RISK_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._loader = None
+        self._reset()
+
+    def _reset(self):
+        self.loaded = False
+        self._count = 0
+        self._cins = []
+        self._rows = {}
+        self._columns = {name: np.empty(0) for name in (*RISK_FIELDS, *self.OUTPUTS)}
+        self._since = 0
+        self._synced_at = 0.0
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _reserve(self, size):
+        capacity = len(self._columns["score"])
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        for name, column in self._columns.items():
+            grown = np.empty(capacity)
+            grown[: self._count] = column[: self._count]
+            self._columns[name] = grown
+
+    def _rescore(self, start, stop):
+        for offset in range(start, stop, SCORE_BATCH_SIZE):
+            end = min(offset + SCORE_BATCH_SIZE, stop)
+            scored = score_batch({name: self._columns[name][offset:end] for name in RISK_FIELDS})
+            for name, values in scored.items():
+                self._columns[name][offset:end] = values
+
+    def _upsert(self, credit):
+        row = self._rows.get(credit["CIN"])
+        if row is None:
+            row = self._count
+            self._reserve(row + 1)
+            self._rows[credit["CIN"]] = row
+            self._cins.append(credit["CIN"])
+            self._count += 1
+        for name in RISK_FIELDS:
+            self._columns[name][row] = credit.get(name) or 0.0
+        return row
+
+    def _remove(self, cin):
+        # Swap the last row into the hole so the arrays stay dense.
+        row = self._rows.pop(cin, None)
+        if row is None:
+            return
+        last = self._count - 1
+        if row != last:
+            for column in self._columns.values():
+                column[row] = column[last]
+            self._cins[row] = self._cins[last]
+            self._rows[self._cins[row]] = row
+        self._cins.pop()
+        self._count -= 1
+
+    def apply_changes(self, changes):
+        """
+        Rescore the credits touched by a write, `changes` are (before, after) dicts as passed to CreditModel._on_write.
+        After-images carry every RISK_FIELDS value, applying the same change twice is harmless.
+        """
+        with self._lock:
+            if not self.loaded:
+                return
+            rows = []
+            for before, after in changes:
+                if after is None:
+                    self._remove(before["CIN"])
+                else:
+                    rows.append(self._upsert(after))
+            for row in rows:
+                if row < self._count:
+                    self._rescore(row, row + 1)
+
+    def load(self, store):
+        """
+        Read the risk columns of every credit of the CreditStore and score them in batches.
+        """
+        with self._load_lock:
+            self._load(store)
+
+    def _load(self, store):
+        since = store.last_change_seq()
+        cins, columns = [], {name: [] for name in RISK_FIELDS}
+        for credit in store.iter_credits(LOAD_BATCH_SIZE, fields=RISK_FIELDS):
+            cins.append(credit["CIN"])
+            for name in RISK_FIELDS:
+                columns[name].append(credit.get(name) or 0.0)
+
+        with self._lock:
+            self._reset()
+            self._reserve(len(cins))
+            for name, values in columns.items():
+                self._columns[name][: len(values)] = values
+            self._cins = cins
+            self._rows = {cin: row for row, cin in enumerate(cins)}
+            self._count = len(cins)
+            self._rescore(0, self._count)
+            # Writes that landed while reading are replayed from the feed by the next sync.
+            self._since = since
+            self._synced_at = time.monotonic()
+            self.loaded = True
+
+    def load_in_background(self, store):
+        """
+        Start loading from `store` in a daemon thread, unless loaded or already loading. Returns the loading
+        thread, None when loaded. The thread inherits no request deadline, however long the load takes.
+        """
+        with self._lock:
+            if self.loaded:
+                return None
+            if self._loader is None or not self._loader.is_alive():
+                self._loader = threading.Thread(
+                    target=self._load_logging_errors, args=(store,), name="risk-engine-load", daemon=True
+                )
+                self._loader.start()
+            return self._loader
+
+    def _load_logging_errors(self, store):
+        try:
+            self.load(store)
+        except Exception as e:
+            # The next sync starts another load.
+            logger.warning("Loading the risk engine failed: %s", e)
+
+    def _stale(self):
+        return time.monotonic() - self._synced_at >= self.sync_seconds
+
+    def sync(self, store, batch_size=1000, wait=None):
+        """
+        Load on first use, afterwards apply the change feed entries since the last sync.
+        The first load runs in the background, raises RiskScoresLoading when it hasn't finished within `wait`
+        seconds (None waits for it).
+        """
+        if self.loaded and not self._stale():
+            return
+        if not self.loaded:
+            loader = self.load_in_background(store)
+            if loader is not None:
+                loader.join(None if wait is None else max(wait, 0))
+            if not self.loaded:
+                raise RiskScoresLoading()
+            return
+        with self._load_lock:
+            if not self._stale():
+                return
+            while True:
+                changes, has_more = store.changes_since(self._since, batch_size, fields=RISK_FIELDS)
+                self.apply_changes(
+                    [(change, None) if change["op"] == "delete" else (None, change["credit"]) for change in changes]
+                )
+                if changes:
+                    self._since = changes[-1]["change_seq"]
+                if not has_more:
+                    break
+            self._synced_at = time.monotonic()
+
+    def _result(self, row):
+        result = {"CIN": self._cins[row]}
+        for name in self.OUTPUTS:
+            result[name] = _finite(self._columns[name][row])
+        result["score"] = round(result["score"], 2)
+        result["grade"] = grade(result["score"])
+        return result
+
+    def score(self, cin):
+        with self._lock:
+            row = self._rows.get(cin)
+            return None if row is None else self._result(row)
+
+    def top(self, n):
+        """
+        The `n` riskiest credits, highest score first (ties by CIN).
+        """
+        with self._lock:
+            scores = self._columns["score"][: self._count]
+            n = min(n, self._count)
+            if n == 0:
+                return []
+            rows = np.argpartition(-scores, n - 1)[:n] if n < self._count else np.arange(self._count)
+            ordered = sorted(rows.tolist(), key=lambda row: (-scores[row], self._cins[row]))
+            return [self._result(row) for row in ordered]
+
+    def size(self):
+        return self._count
+
+
+risk_engine = RiskEngine()
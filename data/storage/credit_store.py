@@ -0,0 +1,214 @@
+"""
+Storage backends of the credit data layer.
+
+`CreditModel` keeps what is common to every backend (validation, the read cache, the derived data kept in step
+with the writes) and hands persistence to a `CreditStore`:
+  - `mongo`  : MongoCreditStore, the credit collection and its companion collections in MongoDB.
+  - `memory` : MemoryCreditStore, an indexed in-process engine. Empty for tests and benchmarks, or preloaded from
+               a JSON/NDJSON snapshot (CREDIT_STORE_SNAPSHOT) to serve it without a database, read-only by default.
+
+Credits go in and out of a store as raw dicts shaped like the stored Mongo documents. Read methods take `fields`,
+a tuple of credit field names to return on top of CIN, or None for every field.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class ReadOnlyStoreError(Exception):
+    """
+    A write reached a store that only serves a snapshot.
+    """
+
+
+class CreditStore:
+    name = None
+    read_only = False
+
+    # Lifecycle
+
+    def connect(self):
+        """
+        Open the connections the store needs, returns whether it can serve requests.
+        """
+        return True
+
+    def close(self):
+        pass
+
+    def status(self):
+        """
+        Reachability and state of the store, served on the readiness endpoint.
+        """
+        raise NotImplementedError
+
+    def ensure_indexes(self):
+        pass
+
+    # Migrations of documents written before a feature existed, nothing to do for stores that start empty.
+
+    def backfill_versions(self):
+        return 0
+
+    def backfill_change_seq(self):
+        return 0
+
+    def backfill_search_fields(self, batch_size=1000):
+        return 0
+
+    # Reads
+
+    def find_all(self, fields=None):
+        """
+        Every credit, in storage order.
+        """
+        raise NotImplementedError
+
+    def find_page(self, limit, after=None, fields=None, filters=None):
+        """
+        Up to `limit` credits matching `filters` (a CreditFilters) in its sort order, after the
+        (sort value, CIN) position `after`.
+        """
+        raise NotImplementedError
+
+    def iter_credits(self, batch_size, fields=None, filters=None):
+        """
+        Lazily yield every credit matching `filters` in its sort order, `batch_size` is a hint for round-trips.
+        """
+        raise NotImplementedError
+
+    def get(self, cin):
+        raise NotImplementedError
+
+    def get_many(self, cins, fields=None):
+        raise NotImplementedError
+
+    def exists(self, cin):
+        raise NotImplementedError
+
+    def search(self, q, limit, fields=None):
+        """
+        Credits matching any word of `q` in their company name or address, best first, with their `score`.
+        """
+        raise NotImplementedError
+
+    def autocomplete(self, prefix, limit):
+        """
+        {CIN, company_name} of the credits whose normalized name starts with the normalized `prefix`.
+        """
+        raise NotImplementedError
+
+    # Writes, documents arrive validated and stamped with their change_seq and updated_at.
+
+    def insert_many(self, documents):
+        """
+        Insert every document whose CIN is free, returns {index: error message} of the others.
+        """
+        raise NotImplementedError
+
+    def upsert_many(self, documents):
+        """
+        Insert or overwrite the documents by CIN, bumping the version of the overwritten ones.
+        Returns {"upserted", "modified", "errors"} with errors as in `insert_many`.
+        """
+        raise NotImplementedError
+
+    def update_many(self, updates, image_fields=None):
+        """
+        Set the fields of (CIN, fields) pairs and bump their version, each one atomically like `update_one`.
+        Returns (pre-images, errors): the credit before each update limited to `image_fields`, None when it doesn't
+        exist or the update failed, and {index: error message} of the failed updates.
+        """
+        raise NotImplementedError
+
+    def update_one(self, cin, fields, expected_versions=None, image_fields=None):
+        """
+        Set `fields` and bump the version, if the credit exists and its version is one of `expected_versions`
+        (any version when None). Returns the credit before the update, limited to `image_fields`, or None.
+        """
+        raise NotImplementedError
+
+    def delete_one(self, cin, expected_versions=None, image_fields=None):
+        """
+        Same as `update_one` for a delete, returns the deleted credit or None.
+        """
+        raise NotImplementedError
+
+    # Change feed
+
+    def reserve_change_seq(self, count=1):
+        """
+        Reserve `count` consecutive change sequence numbers, returns the first and the write time.
+        The feed doesn't serve past them until they are released.
+        """
+        raise NotImplementedError
+
+    def release_change_seq(self, first):
+        """
+        The write that reserved the numbers starting at `first` is over, whether it committed or not.
+        """
+        raise NotImplementedError
+
+    def last_change_seq(self):
+        raise NotImplementedError
+
+    def record_delete(self, cin, change_seq, updated_at):
+        raise NotImplementedError
+
+    def changes_since(self, since, limit, fields=None):
+        """
+        (changes, has_more) after the sequence number `since` and below the oldest reservation still pending,
+        see credit_changes.merge_changes.
+        """
+        raise NotImplementedError
+
+    # Collection version, the listing ETag
+
+    def bump_version(self):
+        raise NotImplementedError
+
+    def get_version(self):
+        """
+        (version, time of the last write), (0, None) before the first write.
+        """
+        raise NotImplementedError
+
+    # Portfolio summary
+
+    def apply_summary_changes(self, changes):
+        raise NotImplementedError
+
+    def get_summary(self):
+        """
+        The maintained summary, None when there is none yet.
+        """
+        raise NotImplementedError
+
+    def aggregate_summary(self):
+        """
+        The summary computed from scratch over every credit.
+        """
+        raise NotImplementedError
+
+    def rebuild_summary(self):
+        raise NotImplementedError
+
+
+def build_credit_store():
+    backend = os.environ.get("CREDIT_STORE", "mongo")
+    if backend == "mongo":
+        from data.storage.mongo_store import MongoCreditStore
+
+        return MongoCreditStore()
+    if backend == "memory":
+        from data.storage.memory_store import MemoryCreditStore
+
+        snapshot = os.environ.get("CREDIT_STORE_SNAPSHOT")
+        if not snapshot:
+            return MemoryCreditStore()
+        read_only = os.environ.get("CREDIT_STORE_READ_ONLY", "true").lower() == "true"
+        return MemoryCreditStore.from_snapshot(snapshot, read_only=read_only)
+    raise ValueError(f"Unknown CREDIT_STORE: {backend}")
@@ -0,0 +1,412 @@
+import copy
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import datetime
+from operator import itemgetter
+
+from data.models.credit_changes import merge_changes
+from data.models.credit_model import INTERNAL_FIELDS, _as_datetime, sort_spec
+from data.models.credit_summary import apply_increments, summary_increments
+from data.storage.credit_store import CreditStore, ReadOnlyStoreError
+
+DUPLICATE_MESSAGE = "Credit with this CIN already exists"
+# Sorted (value, CIN) indexes: the sortable fields of the listing, the autocomplete name and the change feed.
+INDEXED_FIELDS = ("CIN", "loan_amount", "loan_interest_percentage", "registration_date", "company_name_lower")
+# Same weights as the Mongo text index.
+TEXT_WEIGHTS = {"company_name": 10, "address": 2}
+WORD = re.compile(r"\w+")
+_value = itemgetter(0)
+
+
+def _words(text):
+    return WORD.findall(text.lower()) if text else []
+
+
+def _project(document, fields=None):
+    if not fields:
+        return {name: value for name, value in document.items() if name not in INTERNAL_FIELDS}
+    return {name: document[name] for name in ("CIN", *fields) if name in document}
+
+
+def _matcher(filters):
+    """
+    Predicate equivalent to credit_model.build_filter for a CreditFilters.
+    """
+    if filters is None:
+        return lambda document: True
+    conditions = []
+    if filters.account_status is not None:
+        conditions.append(lambda document: document.get("account_status") == filters.account_status)
+    for field, lower, upper in (
+        ("loan_amount", filters.loan_amount_min, filters.loan_amount_max),
+        ("loan_interest_percentage", filters.loan_interest_percentage_min, filters.loan_interest_percentage_max),
+        ("registration_date", _as_datetime(filters.registered_from), _as_datetime(filters.registered_to)),
+    ):
+        if lower is not None:
+            conditions.append(lambda document, field=field, lower=lower: document.get(field) >= lower)
+        if upper is not None:
+            conditions.append(lambda document, field=field, upper=upper: document.get(field) <= upper)
+    return lambda document: all(condition(document) for condition in conditions)
+
+
+def _sort_range(filters, field):
+    """
+    (lower, upper) bounds the filters put on the sort field, the scan of its index starts and stops there.
+    """
+    if filters is None or field == "CIN":
+        return None, None
+    return {
+        "loan_amount": (filters.loan_amount_min, filters.loan_amount_max),
+        "loan_interest_percentage": (filters.loan_interest_percentage_min, filters.loan_interest_percentage_max),
+        "registration_date": (_as_datetime(filters.registered_from), _as_datetime(filters.registered_to)),
+    }[field]
+
+
+class MemoryCreditStore(CreditStore):
+    """
+    Indexed in-process credit store: a dict of documents keyed by CIN, sorted (value, CIN) lists for the listing
+    sorts, the autocomplete and the change feed, and an inverted word index for the search.
+
+    Stored documents are never mutated, a write replaces the document, so a reader holding references to them
+    keeps a consistent snapshot. Readers only take the lock to collect those references (a page, or the whole
+    sorted index for a stream), projecting and serializing happen outside of it while writes go on.
+    """
+
+    name = "memory"
+
+    def __init__(self, documents=(), read_only=False):
+        self._lock = threading.RLock()
+        self._credits = {}
+        self._indexes = {field: [] for field in (*INDEXED_FIELDS, "change_seq")}
+        self._word_index = defaultdict(set)
+        self._tombstones = {}
+        self._tombstone_index = []
+        self._seq = 0
+        self._pending = set()
+        self._version, self._updated_at = 0, None
+        self._summary = None
+        self.read_only = False
+        self.load(documents)
+        self.read_only = read_only
+
+    @classmethod
+    def from_snapshot(cls, path, read_only=True):
+        """
+        A store holding the credits of a JSON array or NDJSON file (like company_data.json or an NDJSON export).
+        Every row is validated like the bulk loader does, an invalid one raises ValueError.
+        """
+        from data.bulk_load import iter_records, validate_record
+
+        documents = []
+        with open(path, encoding="utf-8") as file:
+            for row, (record, error) in enumerate(iter_records(file), start=1):
+                if error is None:
+                    document, error = validate_record(record)
+                if error is not None:
+                    raise ValueError(f"{path} row {row}: {error}")
+                documents.append(document)
+        return cls(documents, read_only=read_only)
+
+    def load(self, documents):
+        """
+        Insert documents that don't carry change feed stamps yet, numbering them in order.
+        Returns the {index: error message} of the duplicates.
+        """
+        documents = [dict(document) for document in documents]
+        first, updated_at = self.reserve_change_seq(len(documents))
+        for offset, document in enumerate(documents):
+            document.setdefault("version", 1)
+            document.setdefault("created_seq", first + offset)
+            document.setdefault("change_seq", first + offset)
+            document.setdefault("updated_at", updated_at)
+        try:
+            errors = self.insert_many(documents)
+        finally:
+            self.release_change_seq(first)
+        self._summary = self.aggregate_summary()
+        return errors
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyStoreError("Credits are read-only, the API serves a snapshot")
+
+    # Index maintenance, called with the lock held.
+
+    def _index(self, document):
+        cin = document["CIN"]
+        for field, index in self._indexes.items():
+            if document.get(field) is not None:
+                insort(index, (document[field], cin))
+        for field in TEXT_WEIGHTS:
+            for word in _words(document.get(field)):
+                self._word_index[word].add(cin)
+
+    def _unindex(self, document):
+        cin = document["CIN"]
+        for field, index in self._indexes.items():
+            if document.get(field) is not None:
+                del index[bisect_left(index, (document[field], cin))]
+        for field in TEXT_WEIGHTS:
+            for word in _words(document.get(field)):
+                cins = self._word_index.get(word)
+                if cins is not None:
+                    cins.discard(cin)
+                    if not cins:
+                        del self._word_index[word]
+
+    def _replace(self, before, after):
+        if before is not None:
+            self._unindex(before)
+        if after is None:
+            del self._credits[before["CIN"]]
+            return
+        self._credits[after["CIN"]] = after
+        self._index(after)
+
+    def _scan(self, field, direction, after=None, lower=None, upper=None):
+        """
+        CINs in (field value, CIN) order from the position after `after`, within [lower, upper].
+        Only call with the lock held, the positions move with the writes.
+        """
+        index = self._indexes[field]
+        if direction == 1:
+            start = bisect_left(index, lower, key=_value) if lower is not None else 0
+            if after is not None:
+                start = max(start, bisect_right(index, after))
+            for position in range(start, len(index)):
+                value, cin = index[position]
+                if upper is not None and value > upper:
+                    return
+                yield cin
+        else:
+            start = bisect_right(index, upper, key=_value) if upper is not None else len(index)
+            if after is not None:
+                start = min(start, bisect_left(index, after))
+            for position in range(start - 1, -1, -1):
+                value, cin = index[position]
+                if lower is not None and value < lower:
+                    return
+                yield cin
+
+    def _select(self, filters, after=None, limit=None):
+        field, direction, _ = sort_spec(filters.sort if filters is not None else "CIN")
+        lower, upper = _sort_range(filters, field)
+        match = _matcher(filters)
+        documents = []
+        for cin in self._scan(field, direction, after=after, lower=lower, upper=upper):
+            document = self._credits[cin]
+            if match(document):
+                documents.append(document)
+                if len(documents) == limit:
+                    break
+        return documents
+
+    # Lifecycle
+
+    def status(self):
+        return {"reachable": True, "backend": self.name, "read_only": self.read_only, "credits": len(self._credits)}
+
+    # Reads
+
+    def find_all(self, fields=None):
+        with self._lock:
+            documents = list(self._credits.values())
+        return [_project(document, fields) for document in documents]
+
+    def find_page(self, limit, after=None, fields=None, filters=None):
+        if after is not None:
+            after = (_as_datetime(after[0]), after[1])
+        with self._lock:
+            documents = self._select(filters, after=after, limit=limit)
+        return [_project(document, fields) for document in documents]
+
+    def iter_credits(self, batch_size, fields=None, filters=None):
+        with self._lock:
+            documents = self._select(filters)
+        for document in documents:
+            yield _project(document, fields)
+
+    def get(self, cin):
+        document = self._credits.get(cin)
+        return None if document is None else _project(document)
+
+    def get_many(self, cins, fields=None):
+        with self._lock:
+            documents = [self._credits[cin] for cin in dict.fromkeys(cins) if cin in self._credits]
+        return [_project(document, fields) for document in documents]
+
+    def exists(self, cin):
+        return cin in self._credits
+
+    def search(self, q, limit, fields=None):
+        # Scored like the text index (word matches weighted by field), without its stemming and stop words.
+        words = set(_words(q))
+        with self._lock:
+            cins = set().union(*(self._word_index.get(word, ()) for word in words))
+            documents = [self._credits[cin] for cin in cins]
+        scored = []
+        for document in documents:
+            score = sum(
+                weight * sum(word in words for word in _words(document.get(field)))
+                for field, weight in TEXT_WEIGHTS.items()
+            )
+            scored.append((-score, document["CIN"], document))
+        scored.sort(key=itemgetter(0, 1))
+        return [{**_project(document, fields), "score": -score} for score, _, document in scored[:limit]]
+
+    def autocomplete(self, prefix, limit):
+        suggestions = []
+        with self._lock:
+            index = self._indexes["company_name_lower"]
+            for position in range(bisect_left(index, prefix, key=_value), len(index)):
+                name, cin = index[position]
+                if not name.startswith(prefix) or len(suggestions) == limit:
+                    break
+                suggestions.append({"CIN": cin, "company_name": self._credits[cin]["company_name"]})
+        return suggestions
+
+    # Writes
+
+    def insert_many(self, documents):
+        self._check_writable()
+        errors = {}
+        with self._lock:
+            for index, document in enumerate(documents):
+                if document["CIN"] in self._credits:
+                    errors[index] = DUPLICATE_MESSAGE
+                    continue
+                self._replace(None, dict(document))
+        return errors
+
+    def upsert_many(self, documents):
+        self._check_writable()
+        summary = {"upserted": 0, "modified": 0, "errors": {}}
+        with self._lock:
+            for document in documents:
+                before = self._credits.get(document["CIN"])
+                if before is None:
+                    self._replace(None, {**document, "version": 1})
+                    summary["upserted"] += 1
+                    continue
+                fields = {name: value for name, value in document.items() if name not in ("version", "created_seq")}
+                self._replace(before, {**before, **fields, "version": before.get("version", 0) + 1})
+                summary["modified"] += 1
+        return summary
+
+    def update_many(self, updates, image_fields=None):
+        self._check_writable()
+        images = []
+        with self._lock:
+            for cin, fields in updates:
+                before = self._credits.get(cin)
+                if before is not None:
+                    self._replace(before, {**before, **fields, "version": before.get("version", 0) + 1})
+                images.append(before)
+        return [None if before is None else _project(before, image_fields) for before in images], {}
+
+    def _current(self, cin, expected_versions):
+        document = self._credits.get(cin)
+        if document is None or (expected_versions is not None and document.get("version") not in expected_versions):
+            return None
+        return document
+
+    def update_one(self, cin, fields, expected_versions=None, image_fields=None):
+        self._check_writable()
+        with self._lock:
+            before = self._current(cin, expected_versions)
+            if before is None:
+                return None
+            self._replace(before, {**before, **fields, "version": before.get("version", 0) + 1})
+        return _project(before, image_fields)
+
+    def delete_one(self, cin, expected_versions=None, image_fields=None):
+        self._check_writable()
+        with self._lock:
+            before = self._current(cin, expected_versions)
+            if before is None:
+                return None
+            self._replace(before, None)
+        return _project(before, image_fields)
+
+    # Change feed
+
+    def reserve_change_seq(self, count=1):
+        self._check_writable()
+        with self._lock:
+            self._seq += count
+            self._pending.add(self._seq - count + 1)
+            return self._seq - count + 1, datetime.utcnow()
+
+    def release_change_seq(self, first):
+        with self._lock:
+            self._pending.discard(first)
+
+    def last_change_seq(self):
+        return self._seq
+
+    def record_delete(self, cin, change_seq, updated_at):
+        self._check_writable()
+        with self._lock:
+            previous = self._tombstones.get(cin)
+            if previous is not None:
+                del self._tombstone_index[bisect_left(self._tombstone_index, (previous["change_seq"], cin))]
+            self._tombstones[cin] = {"CIN": cin, "change_seq": change_seq, "updated_at": updated_at}
+            insort(self._tombstone_index, (change_seq, cin))
+
+    def changes_since(self, since, limit, fields=None):
+        fields = fields and ("change_seq", "created_seq", "updated_at", *fields)
+        with self._lock:
+            below = min(self._pending, default=self._seq + 1)
+            index = self._indexes["change_seq"]
+            start, end = bisect_right(index, since, key=_value), bisect_left(index, below, key=_value)
+            credits = [self._credits[cin] for _, cin in index[start : min(start + limit + 1, end)]]
+            index = self._tombstone_index
+            start, end = bisect_right(index, since, key=_value), bisect_left(index, below, key=_value)
+            tombstones = [dict(self._tombstones[cin]) for _, cin in index[start : min(start + limit + 1, end)]]
+        return merge_changes((_project(credit, fields) for credit in credits), tombstones, since, limit)
+
+    # Collection version
+
+    def bump_version(self):
+        with self._lock:
+            self._version += 1
+            self._updated_at = datetime.utcnow()
+
+    def get_version(self):
+        with self._lock:
+            return self._version, self._updated_at
+
+    # Portfolio summary
+
+    def apply_summary_changes(self, changes):
+        increments = summary_increments(changes)
+        if not increments:
+            return
+        with self._lock:
+            if self._summary is None:
+                return
+            apply_increments(self._summary, increments)
+            self._summary["updated_at"] = datetime.utcnow()
+
+    def get_summary(self):
+        with self._lock:
+            if self._summary is None:
+                return None
+            # The sums keep changing under the lock, callers get their own copy.
+            return copy.deepcopy(self._summary)
+
+    def aggregate_summary(self):
+        with self._lock:
+            documents = list(self._credits.values())
+        summary = {"by_status": {}, "turnover_buckets": {}, "net_profit_buckets": {}}
+        apply_increments(summary, summary_increments([(None, document) for document in documents]))
+        summary["updated_at"] = datetime.utcnow()
+        return summary
+
+    def rebuild_summary(self):
+        summary = self.aggregate_summary()
+        with self._lock:
+            self._summary = summary
+        return summary
@@ -0,0 +1,285 @@
+import re
+
+from clients import mongo_client
+from clients.mongo_client import MONGO_MAX_TIME_MS, unbounded
+from data.models.credit_changes import ChangeFeed, CollectionVersion, CreditTombstone
+from data.models.credit_model import Credit, _as_datetime, _keyset_filter, _projection, build_filter, normalize_name
+from data.models.credit_model import sort_spec
+from data.models.credit_summary import PortfolioSummary
+from data.storage.credit_store import CreditStore
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+DUPLICATE_KEY = 11000
+DUPLICATE_MESSAGE = "Credit with this CIN already exists"
+# The change feed needs these whatever fields the caller asked for.
+CHANGE_FIELDS = ("change_seq", "created_seq", "updated_at")
+
+
+def _version_filter(id, expected_versions):
+    query = {"CIN": id}
+    if expected_versions is not None:
+        query["version"] = {"$in": list(expected_versions)}
+    return query
+
+
+def _write_errors(error):
+    return {
+        item["index"]: DUPLICATE_MESSAGE if item.get("code") == DUPLICATE_KEY else item.get("errmsg")
+        for item in error.details.get("writeErrors", [])
+    }
+
+
+class MongoCreditStore(CreditStore):
+    """
+    The `Credit` collection, plus the change sequence, tombstones, collection version and portfolio summary
+    documents next to it. Bounded reads carry MONGO_MAX_TIME_MS so Mongo aborts them instead of piling up.
+    """
+
+    name = "mongo"
+
+    @staticmethod
+    def _collection():
+        return Credit._get_collection()
+
+    def connect(self):
+        return mongo_client.connect_mongo_db()
+
+    def close(self):
+        mongo_client.disconnect_mongo_db()
+
+    def status(self):
+        return mongo_client.mongo_status()
+
+    def ensure_indexes(self):
+        Credit.ensure_indexes()
+        CreditTombstone.ensure_indexes()
+
+    def backfill_versions(self):
+        return self._collection().update_many({"version": {"$exists": False}}, {"$set": {"version": 1}}).modified_count
+
+    def backfill_change_seq(self):
+        return ChangeFeed.backfill(self._collection())
+
+    def backfill_search_fields(self, batch_size=1000):
+        collection = self._collection()
+        updated = 0
+        while True:
+            documents = list(
+                collection.find({"company_name_lower": {"$exists": False}}, {"company_name": 1}).limit(batch_size)
+            )
+            if not documents:
+                return updated
+            collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": document["_id"]},
+                        {"$set": {"company_name_lower": normalize_name(document.get("company_name")) or ""}},
+                    )
+                    for document in documents
+                ],
+                ordered=False,
+            )
+            updated += len(documents)
+
+    def find_all(self, fields=None):
+        # Raw documents straight from the driver, hydrating Credit objects only to convert them back is wasted work.
+        return list(self._collection().find({}, _projection(fields), max_time_ms=MONGO_MAX_TIME_MS))
+
+    def find_page(self, limit, after=None, fields=None, filters=None):
+        field, direction, order = sort_spec(filters.sort if filters is not None else "CIN")
+        query = build_filter(filters)
+        if after is not None:
+            value, cin = after
+            keyset = _keyset_filter(field, direction, _as_datetime(value), cin)
+            query = {"$and": [query, keyset]} if query else keyset
+        cursor = self._collection().find(query, _projection(fields), max_time_ms=MONGO_MAX_TIME_MS)
+        return list(cursor.sort(order).limit(limit))
+
+    def iter_credits(self, batch_size, fields=None, filters=None):
+        order = sort_spec(filters.sort if filters is not None else "CIN")[2]
+        # No maxTimeMS here, it counts the server time of the whole cursor and a stream legitimately runs long.
+        cursor = self._collection().find(build_filter(filters), _projection(fields))
+        yield from cursor.sort(order).batch_size(batch_size)
+
+    def get(self, cin):
+        return self._collection().find_one({"CIN": cin}, _projection(), max_time_ms=MONGO_MAX_TIME_MS)
+
+    def get_many(self, cins, fields=None):
+        return list(
+            self._collection().find({"CIN": {"$in": list(cins)}}, _projection(fields), max_time_ms=MONGO_MAX_TIME_MS)
+        )
+
+    def exists(self, cin):
+        return self._collection().count_documents({"CIN": cin}, limit=1) > 0
+
+    def search(self, q, limit, fields=None):
+        # Text index, company_name matches weigh more than address ones.
+        projection = {**_projection(fields), "score": {"$meta": "textScore"}}
+        cursor = self._collection().find({"$text": {"$search": q}}, projection, max_time_ms=MONGO_MAX_TIME_MS)
+        return list(cursor.sort([("score", {"$meta": "textScore"}), ("CIN", 1)]).limit(limit))
+
+    def autocomplete(self, prefix, limit):
+        # An anchored regex on the normalized name is a range scan of its index.
+        query = {"company_name_lower": {"$regex": f"^{re.escape(prefix)}"}}
+        cursor = self._collection().find(query, {"_id": 0, "CIN": 1, "company_name": 1}, max_time_ms=MONGO_MAX_TIME_MS)
+        return list(cursor.sort([("company_name_lower", 1), ("CIN", 1)]).limit(limit))
+
+    def insert_many(self, documents):
+        errors = {}
+        try:
+            self._collection().insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            errors = _write_errors(e)
+        finally:
+            # insert_many adds the generated _id to the passed dicts, keep callers' documents clean.
+            for document in documents:
+                document.pop("_id", None)
+        return errors
+
+    def upsert_many(self, documents):
+        operations = [
+            UpdateOne(
+                {"CIN": document["CIN"]},
+                {
+                    "$set": {name: value for name, value in document.items() if name not in ("version", "created_seq")},
+                    "$inc": {"version": 1},
+                    "$setOnInsert": {"created_seq": document.get("created_seq")},
+                },
+                upsert=True,
+            )
+            for document in documents
+        ]
+        try:
+            result = self._collection().bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            return {
+                "upserted": e.details.get("nUpserted", 0),
+                "modified": e.details.get("nModified", 0),
+                "errors": _write_errors(e),
+            }
+        return {"upserted": result.upserted_count, "modified": result.modified_count, "errors": {}}
+
+    def update_many(self, updates, image_fields=None):
+        # One bulk write. Each update is guarded by the version its pre-image was read at, so an update that matched
+        # was applied to exactly that pre-image. A bulk write only reports totals: when some didn't match (another
+        # write got in between) or the write failed part way, the change_seq every update stamps tells which landed.
+        # The ones that lost a race are replayed one by one with find-and-modify, which returns their pre-image. Only an
+        # update overwritten again within the round-trip to that read is mistaken for a lost one.
+        collection = self._collection()
+        projection = _projection(image_fields and (*image_fields, "version"))
+        cins = [cin for cin, _ in updates]
+        found = {
+            document["CIN"]: document
+            for document in collection.find({"CIN": {"$in": cins}}, projection, max_time_ms=MONGO_MAX_TIME_MS)
+        }
+        images, errors = [None] * len(updates), {}
+        indexes = [index for index, cin in enumerate(cins) if cin in found]
+        if not indexes:
+            return images, errors
+
+        operations = [
+            UpdateOne(
+                {"CIN": cins[index], "version": found[cins[index]].get("version")},
+                {"$set": updates[index][1], "$inc": {"version": 1}},
+            )
+            for index in indexes
+        ]
+        failed, timed_out = {}, False
+        try:
+            settled = collection.bulk_write(operations, ordered=False).matched_count == len(operations)
+        except PyMongoError as e:
+            if not (e.timeout or isinstance(e, BulkWriteError)):
+                raise
+            settled, timed_out = False, e.timeout
+            if isinstance(e, BulkWriteError):
+                failed = {indexes[position]: message for position, message in _write_errors(e).items()}
+
+        landed = set(indexes)
+        if not settled:
+            # What did commit is read past the deadline, the derived data must follow it.
+            stamps = unbounded(
+                lambda: {
+                    document["CIN"]: document.get("change_seq")
+                    for document in collection.find(
+                        {"CIN": {"$in": [cins[index] for index in indexes]}}, {"_id": 0, "CIN": 1, "change_seq": 1}
+                    )
+                }
+            )
+            landed = {index for index in indexes if stamps.get(cins[index]) == updates[index][1].get("change_seq")}
+        lost = []
+        for index in indexes:
+            if index in landed:
+                images[index] = found[cins[index]]
+                if image_fields and "version" not in image_fields:
+                    images[index].pop("version", None)
+            elif index in failed:
+                errors[index] = failed[index]
+            elif timed_out:
+                errors[index] = "Request deadline exceeded"
+            else:
+                lost.append(index)
+
+        for position, index in enumerate(lost):
+            try:
+                images[index] = self.update_one(cins[index], updates[index][1], image_fields=image_fields)
+            except PyMongoError as e:
+                if not e.timeout:
+                    if not isinstance(e, OperationFailure):
+                        raise
+                    errors[index] = (e.details or {}).get("errmsg") or str(e)
+                    continue
+                # Out of time: the updates made so far are reported, so their derived data still follows them.
+                errors.update(dict.fromkeys(lost[position:], "Request deadline exceeded"))
+                break
+        return images, errors
+
+    def update_one(self, cin, fields, expected_versions=None, image_fields=None):
+        # One find-and-modify, the pre-image lets the derived data apply the exact delta of this update.
+        return self._collection().find_one_and_update(
+            _version_filter(cin, expected_versions),
+            {"$set": fields, "$inc": {"version": 1}},
+            projection=_projection(image_fields),
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    def delete_one(self, cin, expected_versions=None, image_fields=None):
+        return self._collection().find_one_and_delete(
+            _version_filter(cin, expected_versions), projection=_projection(image_fields)
+        )
+
+    def reserve_change_seq(self, count=1):
+        return ChangeFeed.reserve(count)
+
+    def release_change_seq(self, first):
+        ChangeFeed.release(first)
+
+    def last_change_seq(self):
+        return ChangeFeed.last_seq()
+
+    def record_delete(self, cin, change_seq, updated_at):
+        ChangeFeed.record_delete(cin, change_seq, updated_at)
+
+    def changes_since(self, since, limit, fields=None):
+        projection = _projection(fields and (*fields, *CHANGE_FIELDS))
+        return ChangeFeed.changes_since(
+            self._collection(), since, limit, projection=projection, max_time_ms=MONGO_MAX_TIME_MS
+        )
+
+    def bump_version(self):
+        CollectionVersion.bump()
+
+    def get_version(self):
+        return CollectionVersion.get()
+
+    def apply_summary_changes(self, changes):
+        PortfolioSummary.apply_changes(changes)
+
+    def get_summary(self):
+        return PortfolioSummary.get()
+
+    def aggregate_summary(self):
+        return PortfolioSummary.aggregate(self._collection(), max_time_ms=MONGO_MAX_TIME_MS)
+
+    def rebuild_summary(self):
+        return PortfolioSummary.rebuild(self._collection())
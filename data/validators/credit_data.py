@@ -1,8 +1,15 @@
 from pydantic import BaseModel, EmailStr, HttpUrl, validator
 from datetime import date
+from dotenv import load_dotenv
 from typing import Optional
+import os
 import re
 
+load_dotenv()
+
+# Upper bound of items accepted by the batch endpoints.
+MAX_BATCH_SIZE = int(os.environ.get("CREDITS_MAX_BATCH_SIZE", 100))
+
 
 class CreditData(BaseModel):
     CIN: str
@@ -63,7 +70,7 @@ class PutCreditData(BaseModel):
     loan_interest_percentage: Optional[float] = None
     account_status: Optional[str] = None
 
-    @validator("registration_date", pre=True, always=True)
+    @validator("registration_date", always=True)
     def date_must_be_past_or_none(cls, value):
         if value is not None and value > date.today():
             raise ValueError("Registration date must not be in the future or None.")
@@ -83,3 +90,7 @@ class PutCreditData(BaseModel):
         if value is not None and value < 0:
             raise ValueError("Value must not be negative or None.")
         return value
+
+
+class PutCreditBatchItem(PutCreditData):
+    CIN: str
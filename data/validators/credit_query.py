@@ -0,0 +1,29 @@
+from pydantic import BaseModel
+from datetime import date
+from typing import Literal, Optional
+
+# Every sort key is backed by a compound index on the Credit model, "-" sorts descending.
+CreditSort = Literal[
+    "CIN",
+    "-CIN",
+    "loan_amount",
+    "-loan_amount",
+    "loan_interest_percentage",
+    "-loan_interest_percentage",
+    "registration_date",
+    "-registration_date",
+]
+
+
+class CreditFilters(BaseModel):
+    account_status: Optional[str] = None
+    loan_amount_min: Optional[float] = None
+    loan_amount_max: Optional[float] = None
+    loan_interest_percentage_min: Optional[float] = None
+    loan_interest_percentage_max: Optional[float] = None
+    registered_from: Optional[date] = None
+    registered_to: Optional[date] = None
+    sort: CreditSort = "CIN"
+
+    def is_default(self):
+        return self == CreditFilters()
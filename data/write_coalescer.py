@@ -0,0 +1,153 @@
+"""
+Write-behind coalescing of single credit inserts.
+
+Concurrent `POST /credits/` requests park their validated CreditData in a queue. The queue is flushed as one
+unordered bulk insert once `max_batch` items are waiting or the oldest one has waited `max_delay` seconds,
+and every request is then resolved with its own result (created, duplicate CIN, validation failure).
+Off by default (WRITE_COALESCE_ENABLED), the trade is up to `max_delay` extra latency per insert for far
+fewer round-trips under bursts.
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+from clients.mongo_client import call_with_deadline
+from data.models.credit_model import CreditModel
+
+load_dotenv()
+
+WRITE_COALESCE_ENABLED = os.environ.get("WRITE_COALESCE_ENABLED", "false").lower() == "true"
+WRITE_COALESCE_MAX_DELAY_MS = float(os.environ.get("WRITE_COALESCE_MAX_DELAY_MS", 5))
+WRITE_COALESCE_MAX_BATCH = int(os.environ.get("WRITE_COALESCE_MAX_BATCH", 100))
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+QUEUE_LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+
+
+class Histogram:
+    """
+    Non-cumulative bucket counts, `buckets` are inclusive upper bounds and larger values land in "+Inf".
+    Only touched from the event loop, so no locking.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        labels = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class WriteCoalescer:
+    def __init__(self, flush, max_delay, max_batch, enabled=True):
+        """
+        `flush` is a blocking callable taking a list of items and returning one result per item, in order.
+        It runs in the threadpool like an admitted CreditModel call (deadline, timing), several batches may be
+        in flight at once.
+        """
+        self.flush = flush
+        self.enabled = enabled
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_latency_ms = Histogram(QUEUE_LATENCY_BUCKETS_MS)
+        self.failed_batches = 0
+        self._pending = []
+        self._timer = None
+        self._in_flight = set()
+
+    async def submit(self, item, deadline=None):
+        """
+        Queue `item` and wait for its result. `deadline` is the time.monotonic() deadline of the request,
+        None for none, a batch is flushed under the latest deadline of its items.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter(), deadline))
+        if len(self._pending) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+        # A cancelled request (client gone) doesn't take its item out of the batch, the insert still happens.
+        return await asyncio.shield(future)
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._flush(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued_at, _ in batch:
+            self.queue_latency_ms.observe((started - enqueued_at) * 1000)
+        deadlines = [deadline for _, _, _, deadline in batch]
+        deadline = None if None in deadlines else max(deadlines)
+        try:
+            results = await run_in_threadpool(call_with_deadline, deadline, self.flush, [item for item, *_ in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def drain(self):
+        """
+        Flush whatever is queued and wait for every in-flight batch, called on shutdown.
+        """
+        self._start_flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "max_delay_ms": self.max_delay * 1000,
+            "max_batch": self.max_batch,
+            "pending": len(self._pending),
+            "in_flight_batches": len(self._in_flight),
+            "failed_batches": self.failed_batches,
+            "batch_size": self.batch_sizes.as_dict(),
+            "queue_latency_ms": self.queue_latency_ms.as_dict(),
+        }
+
+
+def save_credits(credit_batch):
+    # Looked up on every flush rather than bound once, so CreditModel stays patchable.
+    return CreditModel.save_credits(credit_batch)
+
+
+credit_inserts = WriteCoalescer(
+    save_credits, WRITE_COALESCE_MAX_DELAY_MS / 1000, WRITE_COALESCE_MAX_BATCH, enabled=WRITE_COALESCE_ENABLED
+)
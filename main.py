@@ -1,31 +1,90 @@
-import traceback
+import asyncio
+import importlib.util
 import uvicorn
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from slowapi.errors import RateLimitExceeded
 from slowapi import _rate_limit_exceeded_handler
 
 from routers.auth import router as auth_router
 from routers.credits import router as credit_router
-from clients.mongo_client import connect_mongo_db
-from clients.rate_limiting_client import limiter
+from routers.health import mark_prepared, router as health_router
+from routers.metrics import router as metrics_router
+from clients.log_client import configure_logging, logger
+from clients.metrics_client import MetricsMiddleware
+from clients.rate_limiting_client import limiter, RATE_LIMIT_STORAGE_URI
+from data.models.credit_model import CreditModel
+from data.storage.credit_store import ReadOnlyStoreError
+from data.write_coalescer import credit_inserts
 
 load_dotenv()
+configure_logging()
 
-connect_mongo_db()
+# `development` runs a single reloading process with debug tracebacks, `production` the tuned multi-worker server.
+APP_ENV = os.environ.get("APP_ENV", "development")
+PRODUCTION = APP_ENV == "production"
+CACHE_WARM_ON_STARTUP = os.environ.get("CACHE_WARM_ON_STARTUP", "false").lower() == "true"
+MONGO_RETRY_SECONDS = int(os.environ.get("MONGO_RETRY_SECONDS", 5))
 
-app = FastAPI(debug=True)
+
+def prepare_credit_collection():
+    if not CreditModel.connect():
+        return False
+    try:
+        CreditModel.ensure_indexes()
+        CreditModel.backfill_versions()
+        CreditModel.backfill_change_seq()
+        CreditModel.backfill_search_fields()
+    except Exception as e:
+        logger.warning("Preparing the credit collection failed: %s", e)
+        return False
+    mark_prepared()
+    try:
+        CreditModel.warm_caches(all_credits=CACHE_WARM_ON_STARTUP)
+    except Exception as e:
+        # Only an optimization, the first requests load what is missing.
+        logger.warning("Warming the credit caches failed: %s", e)
+    # Reads the whole collection, off the startup path and out of any request deadline.
+    CreditModel.load_risk_scores()
+    return True
+
+
+async def prepare_until_ready():
+    while not await run_in_threadpool(prepare_credit_collection):
+        await asyncio.sleep(MONGO_RETRY_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker before it accepts traffic, the blocking pymongo calls go to the threadpool.
+    # Without Mongo the worker still starts but /health/ready answers 503 until the retries get through.
+    retry = None
+    if not await run_in_threadpool(prepare_credit_collection):
+        retry = asyncio.create_task(prepare_until_ready())
+    yield
+    if retry is not None:
+        retry.cancel()
+    await credit_inserts.drain()
+    CreditModel.close()
+
+
+app = FastAPI(debug=not PRODUCTION, lifespan=lifespan)
 app.state.limiter = limiter
 app.include_router(auth_router, prefix="/authentication")
 app.include_router(credit_router, prefix="/credits")
+app.include_router(health_router, prefix="/health")
+app.include_router(metrics_router)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    # Log the full stack trace for debugging purposes
-    print(traceback.format_exc())
+    # Log the full stack trace for debugging purposes, the write to stdout happens off the request path.
+    logger.error("Unhandled error on %s %s", request.method, request.url.path, exc_info=exc)
 
     # Return a generic error response
     return JSONResponse(
@@ -36,5 +95,40 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+
+@app.exception_handler(ReadOnlyStoreError)
+async def read_only_store_handler(request: Request, exc: ReadOnlyStoreError):
+    # Embedded mode serves a snapshot, writes are refused rather than failing as server errors.
+    return JSONResponse(status_code=status.HTTP_405_METHOD_NOT_ALLOWED, content={"detail": str(exc)})
+
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def server_options():
+    """
+    uvicorn settings for the configured APP_ENV.
+    """
+    options = {"host": "0.0.0.0", "port": int(os.environ.get("APP_PORT", 8002))}
+    if not PRODUCTION:
+        return {**options, "reload": True}
+
+    workers = int(os.environ.get("APP_WORKERS", os.cpu_count() or 1))
+    if workers > 1 and RATE_LIMIT_STORAGE_URI.startswith("memory://"):
+        logger.warning("Rate limits are kept per worker, set RATE_LIMIT_STORAGE_URI to a shared store")
+    return {
+        **options,
+        "workers": workers,
+        # uvloop isn't available on Windows, fall back to the stdlib loop / pure python parser when missing.
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        # On SIGTERM stop accepting connections and give in-flight requests this long to finish.
+        "timeout_graceful_shutdown": int(os.environ.get("APP_GRACEFUL_SHUTDOWN_SECONDS", 30)),
+        "timeout_keep_alive": int(os.environ.get("APP_KEEP_ALIVE_SECONDS", 5)),
+        "proxy_headers": True,
+    }
+
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=int(os.environ.get("APP_PORT", 8002)), reload=True)
+    uvicorn.run("main:app", **server_options())
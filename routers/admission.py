@@ -0,0 +1,189 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from pymongo.errors import PyMongoError
+
+from clients.mongo_client import call_with_deadline
+
+load_dotenv()
+
+# Every credits route gets its own gate: at most `limit` requests run at once, up to `max_queue` more wait for
+# a slot for at most ADMISSION_QUEUE_TIMEOUT_MS, anything beyond is answered 503 right away. When Mongo slows
+# down the excess is shed quickly instead of piling up in the event loop and the threadpool.
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", 32))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 64))
+ADMISSION_QUEUE_TIMEOUT_MS = int(os.environ.get("ADMISSION_QUEUE_TIMEOUT_MS", 500))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.environ.get("ADMISSION_RETRY_AFTER_SECONDS", 1))
+# Budget of a request from arrival, queueing included. What is left of it bounds every Mongo call the request makes.
+REQUEST_DEADLINE_MS = int(os.environ.get("REQUEST_DEADLINE_MS", 5000))
+
+# Routes whose requests are expensive enough to deserve a tighter limit than ADMISSION_MAX_CONCURRENCY.
+DEFAULT_ROUTE_LIMITS = {"export": 2, "stats_rebuild": 1, "insert_batch": 8, "update_batch": 8}
+
+
+def parse_route_limits(value):
+    """
+    `name=limit` pairs separated by commas, e.g. ADMISSION_ROUTE_LIMITS="export=4,search=16".
+    """
+    limits = {}
+    for pair in filter(None, (part.strip() for part in (value or "").split(","))):
+        name, _, limit = pair.partition("=")
+        limits[name.strip()] = int(limit)
+    return limits
+
+
+ROUTE_LIMITS = {**DEFAULT_ROUTE_LIMITS, **parse_route_limits(os.environ.get("ADMISSION_ROUTE_LIMITS"))}
+
+
+def service_unavailable(detail):
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+    )
+
+
+class Gate:
+    """
+    Concurrency limit with a bounded FIFO wait queue. Only used from the event loop, so no locking.
+    """
+
+    def __init__(self, name, limit, max_queue, queue_timeout):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters = deque()
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise service_unavailable(f"Too many concurrent {self.name} requests")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.timed_out += 1
+            raise service_unavailable(f"Timed out waiting for a {self.name} slot")
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        self.admitted += 1
+
+    def _abandon(self, waiter):
+        if waiter.done():
+            # The slot was handed over just as the wait ended, give it to the next in line.
+            self.release()
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def release(self):
+        # A freed slot goes straight to the oldest waiter, `active` only drops when nobody is waiting.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+gates = {}
+
+
+@contextmanager
+def _deadline_errors(deadline):
+    try:
+        yield
+    except PyMongoError as e:
+        if e.timeout and deadline is not None:
+            raise service_unavailable("Request deadline exceeded")
+        raise
+
+
+class Admission:
+    """
+    Handed to an admitted request, carries its deadline down to the CreditModel calls.
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def remaining(self):
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        `run_in_threadpool` bounded by the request deadline: the primary store call of the CreditModel method
+        fails once the deadline has passed, and the request is answered 503 instead of waiting on a slow database.
+        """
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            raise service_unavailable("Request deadline exceeded")
+        with _deadline_errors(self.deadline):
+            return await run_in_threadpool(call_with_deadline, self.deadline, func, *args, **kwargs)
+
+    async def submit(self, coalescer, item):
+        """
+        Queue `item` on a WriteCoalescer, its batch is flushed under the deadline of the request that waits longest.
+        """
+        with _deadline_errors(self.deadline):
+            return await coalescer.submit(item, deadline=self.deadline)
+
+
+def admit(route, deadline_ms=REQUEST_DEADLINE_MS):
+    """
+    Dependency admitting a request to `route` through its gate, yields the request's Admission.
+    The slot is held until the response has been sent, streamed responses included.
+    `deadline_ms=None` leaves the Mongo calls of the route unbounded.
+    """
+    gate = gates.setdefault(
+        route,
+        Gate(
+            route,
+            ROUTE_LIMITS.get(route, ADMISSION_MAX_CONCURRENCY),
+            ADMISSION_MAX_QUEUE,
+            ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+        ),
+    )
+
+    async def dependency():
+        deadline = None if deadline_ms is None else time.monotonic() + deadline_ms / 1000
+        await gate.acquire()
+        try:
+            yield Admission(deadline)
+        finally:
+            gate.release()
+
+    return dependency
+
+
+def admission_stats():
+    return {route: gate.stats() for route, gate in sorted(gates.items())}
@@ -1,22 +1,36 @@
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+import hashlib
 import os
+import time
 from datetime import timedelta, datetime
 from dotenv import load_dotenv
 from typing import Optional
 from jose import jwt, JWTError
 
+from clients.cache_client import LRUTTLCache
+from clients.metrics_client import jwt_verify_duration
+
 
 load_dotenv()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/authentication/token")
 
+# Signing config is read once at import, rotating the key needs a restart.
+SECRET_KEY = os.environ.get("SECRET_KEY")
+ALGORITHM = os.environ.get("ALGORITHM")
+ALGORITHMS = [ALGORITHM]
+
+# Tokens that already passed verification, keyed by their digest and expiring at their `exp`,
+# so a client reusing one token for an hour pays for the signature check once.
+verified_tokens = LRUTTLCache(max_entries=int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", 10000)), ttl=0)
+
 
 def create_access_token(data: dict, expires_delta: timedelta):
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, os.environ.get("SECRET_KEY"), algorithm=os.environ.get("ALGORITHM"))
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
@@ -28,19 +42,49 @@ def authenticate_user(username: str, password: str) -> None:
     return False
 
 
-def verify_token(token: str = Depends(oauth2_scheme)) -> Optional[str]:
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _verify(token: str) -> str:
+    started = time.perf_counter()
+    outcome = "rejected"
     try:
-        payload = jwt.decode(token, os.environ.get("SECRET_KEY"), algorithms=[os.environ.get("ALGORITHM")])
+        digest = _token_digest(token)
+        username = verified_tokens.get(digest)
+        if isinstance(username, str):
+            outcome = "cached"
+            return username
+
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=ALGORITHMS)
+        except JWTError:
+            raise _credentials_exception()
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise _credentials_exception()
         # You can include additional user checks here (e.g., is user active?)
+        # jose already rejected expired tokens, tokens without `exp` never expire so they aren't cached.
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            verified_tokens.set(digest, username, ttl=exp - time.time())
+        outcome = "decoded"
         return username
-    except JWTError:
-        raise credentials_exception
+    finally:
+        jwt_verify_duration.labels(outcome).observe(time.perf_counter() - started)
+
+
+def verify_token(token: str = Depends(oauth2_scheme), request: Request = None) -> Optional[str]:
+    username = _verify(token)
+    # The rate limiter keys authenticated requests on the user instead of the remote address.
+    if request is not None:
+        request.state.user = username
+    return username
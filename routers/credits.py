@@ -1,77 +1,519 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from .admission import Admission, admission_stats, admit, service_unavailable
 from .authentication.authenticate import verify_token
-from data.validators.credit_data import CreditData, PutCreditData
-from data.models.credit_model import CreditModel
+from .responses import FastJSONResponse, dumps
+from data.validators.credit_data import CreditData, PutCreditData, PutCreditBatchItem, MAX_BATCH_SIZE
+from data.validators.credit_query import CreditFilters
+from data.models.credit_model import CreditModel, CreditVersionConflict, parse_fields
+from data.models.credit_summary import format_stats
+from data.risk_scoring import RiskScoresLoading
+from data import export
+from data.write_coalescer import credit_inserts
+from clients.cache_client import credit_cache
 from clients.rate_limiting_client import limiter
 
-router = APIRouter()
+# CreditModel talks to Mongo through blocking mongoengine calls, every call below is pushed to the threadpool
+# so a slow query only ties up a worker thread instead of the whole event loop. Each route admits requests through
+# its own gate (see admission.py), which sheds excess load with a 503 and bounds the calls by the request deadline.
+router = APIRouter(default_response_class=FastJSONResponse)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EXPORT_BATCH_SIZE = 5000
+MAX_SEARCH_RESULTS = 100
+MAX_AUTOCOMPLETE_RESULTS = 50
+
+
+def _etag(version):
+    return f'"{version}"'
+
+
+def _parse_if_match(if_match):
+    """
+    Versions accepted by an If-Match header, None when any version is acceptable (no header or `*`).
+    Weak or malformed tags never match, as If-Match requires a strong comparison.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+
+def _http_date(value):
+    # Stored datetimes are naive UTC.
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def _cache_validators(etag, last_modified=None):
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def _not_modified(request, etag, last_modified=None):
+    """
+    Whether the client's copy is current: If-None-Match (weak comparison) when sent, otherwise If-Modified-Since.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have a one second resolution.
+    return last_modified.replace(microsecond=0, tzinfo=timezone.utc) <= since
+
+
+def _not_modified_response(headers):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def _listing_etag(version, request):
+    # Every query string is its own representation of the same collection version.
+    query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+    return f'"{version}-{hashlib.blake2b(query.encode(), digest_size=8).hexdigest()}"'
+
+
+def _precondition_failed(id):
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail=f"Credit {id} was modified, its version doesn't match If-Match",
+    )
+
+
+def sparse_fields(
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated fields to return, e.g. `CIN,company_name,loan_amount`. CIN is always included",
+    )
+):
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _ndjson_lines(batch_size, fields=None, filters=None):
+    # Sync generator, starlette iterates it in the threadpool so the Mongo cursor never blocks the event loop.
+    lines = []
+    for credit_dict in CreditModel.iter_credits(batch_size, fields=fields, filters=filters):
+        lines.append(dumps(credit_dict))
+        if len(lines) == batch_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
 
 
 @router.get("/", summary="Get All Credits", tags=["Credits"])
 @limiter.limit("5/minute")
-async def get_credits(request: Request, current_user: str = Depends(verify_token)):
+async def get_credits(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size for cursor pagination"),
+    after: Optional[str] = Query(None, description="`next_cursor` returned by the previous page"),
+    stream: bool = Query(False, description="Stream every credit as NDJSON"),
+    fields: Optional[tuple] = Depends(sparse_fields),
+    filters: CreditFilters = Depends(),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("list")),
+):
     """
     Retrieve all credit entries.
 
     This endpoint returns a list of all credit entries in the system.
+    Pass `limit` (and `after` for subsequent pages) to page through credits ordered by CIN,
+    or `stream=true` / `Accept: application/x-ndjson` to stream them as newline delimited JSON.
+    `fields` restricts the returned fields, the projection is applied by Mongo.
+    Filtering on `account_status`, `loan_amount`/`loan_interest_percentage` ranges and a `registration_date`
+    window, or sorting on an indexed field (prefix with `-` for descending), always returns a paginated result.
+    Non-streamed responses carry an `ETag` and `Last-Modified` derived from the collection version, which every
+    write bumps: send them back as `If-None-Match`/`If-Modified-Since` to get a 304 while nothing changed.
     The response is rate-limited to 5 requests per minute.
     """
-    all_credit_data = CreditModel.get_all_credits()
+    if stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _ndjson_lines(STREAM_BATCH_SIZE, fields=fields, filters=filters), media_type=NDJSON_MEDIA_TYPE
+        )
+
+    # A polling client that already has this version of the collection gets a 304 before any credit is read.
+    version, updated_at = await admission.run(CreditModel.get_collection_version)
+    headers = _cache_validators(_listing_etag(version, request), updated_at)
+    if _not_modified(request, headers["ETag"], updated_at):
+        return _not_modified_response(headers)
+
+    if limit is not None or after is not None or not filters.is_default():
+        try:
+            page, next_cursor = await admission.run(
+                CreditModel.get_credits_page, limit or DEFAULT_PAGE_SIZE, after=after, fields=fields, filters=filters
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return FastJSONResponse({"data": page, "next_cursor": next_cursor}, headers=headers)
+
+    all_credit_data = await admission.run(CreditModel.get_all_credits, fields=fields, version=version)
     if not all_credit_data:  # Checking if the list is empty
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No credits found")
-    return {"data": all_credit_data}
+    return FastJSONResponse({"data": all_credit_data}, headers=headers)
+
+
+@router.get("/stats", summary="Portfolio Statistics", tags=["Credits"])
+@limiter.limit("10/minute")
+async def get_portfolio_stats(
+    request: Request,
+    live: bool = Query(False, description="Compute with an aggregation over the whole collection"),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("stats")),
+):
+    """
+    Portfolio totals: loan amount and weighted average interest per account status, turnover and net profit buckets.
+
+    By default they are read from a summary document the write endpoints keep up to date, so the call costs
+    a single document read. `live=true` recomputes them with an aggregation pipeline inside Mongo.
+    """
+    summary = await admission.run(CreditModel.get_portfolio_stats, live=live)
+    return FastJSONResponse({"data": {**format_stats(summary), "source": "live" if live else "summary"}})
+
+
+@router.post("/stats/rebuild", summary="Rebuild Portfolio Statistics", tags=["Credits"])
+@limiter.limit("3/minute")
+async def rebuild_portfolio_stats(
+    request: Request,
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("stats_rebuild", deadline_ms=None)),
+):
+    """
+    Recompute the portfolio summary document from the collection, e.g. after a bulk upsert.
+    """
+    summary = await admission.run(CreditModel.rebuild_portfolio_stats)
+    return {"data": {**format_stats(summary), "source": "summary"}}
+
+
+@router.get("/export", summary="Export Credits", tags=["Credits"])
+@limiter.limit("2/minute")
+async def export_credits(
+    request: Request,
+    format: Literal[export.FORMATS] = Query("ndjson", description="Output format"),
+    compression: Optional[Literal["gzip"]] = Query(None, description="Compress the export"),
+    fields: Optional[tuple] = Depends(sparse_fields),
+    filters: CreditFilters = Depends(),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("export", deadline_ms=None)),
+):
+    """
+    Snapshot of the credits (all of them, or those matching the listing filters) as a file download.
+
+    The export streams from a Mongo cursor in batches of 5000 credits, memory stays bounded whatever the size
+    of the collection. Parquet batches are written as one row group each. `compression=gzip` gzips NDJSON
+    and CSV exports, Parquet files use it as their column codec instead of the default snappy.
+    This endpoint is rate-limited to 2 requests per minute.
+    """
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Parquet export needs pyarrow")
+
+    batches = CreditModel.iter_credit_batches(EXPORT_BATCH_SIZE, fields=fields, filters=filters)
+    columns = export.columns_for(fields)
+    filename, media_type = f"credits.{format}", export.MEDIA_TYPES[format]
+    if format == "parquet":
+        chunks = export.iter_parquet(batches, columns, compression=compression or "snappy")
+    else:
+        serializer = export.iter_ndjson if format == "ndjson" else export.iter_csv
+        chunks = serializer(batches, columns)
+        if compression:
+            chunks = export.gzip_chunks(chunks)
+            filename, media_type = f"{filename}.gz", "application/gzip"
+    return StreamingResponse(
+        chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/changes", summary="Credit Changes Since", tags=["Credits"])
+@limiter.limit("30/minute")
+async def get_credit_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="`next_since` of the previous poll, 0 to start from the beginning"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of changes"),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("changes")),
+):
+    """
+    Inserts, updates and deletes after `since`, in the order they were made, to keep a mirror of the credits in sync.
+
+    Every write gives the credit (or the tombstone of a deleted credit) the next change sequence number,
+    a poll reads only what changed from the `change_seq` indexes, so its cost follows the churn rather than
+    the size of the collection. Poll again with `next_since` right away while `has_more` is true.
+    Changes show up once every write that started before them is over.
+    """
+    changes, has_more = await admission.run(CreditModel.get_changes, since, limit)
+    next_since = changes[-1]["change_seq"] if changes else since
+    return FastJSONResponse({"data": changes, "next_since": next_since, "has_more": has_more})
+
+
+@router.get("/search", summary="Search Credits By Company", tags=["Credits"])
+@limiter.limit("30/minute")
+async def search_credits(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to look for in company names and addresses"),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS, description="Maximum number of results"),
+    fields: Optional[tuple] = Depends(sparse_fields),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("search")),
+):
+    """
+    Full-text search over `company_name` and `address` served by a text index, best matches first.
+    A match in the company name weighs more than one in the address, each credit carries its relevance `score`.
+    """
+    credits = await admission.run(CreditModel.search_credits, q, limit, fields=fields)
+    return FastJSONResponse({"data": credits})
+
+
+@router.get("/autocomplete", summary="Autocomplete Company Names", tags=["Credits"])
+@limiter.limit("120/minute")
+async def autocomplete_credits(
+    request: Request,
+    prefix: str = Query(..., min_length=1, max_length=100, description="Start of the company name, any case"),
+    limit: int = Query(10, ge=1, le=MAX_AUTOCOMPLETE_RESULTS, description="Maximum number of suggestions"),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("autocomplete")),
+):
+    """
+    `CIN` and `company_name` of the credits whose company name starts with `prefix`, ignoring case,
+    in name order. Served from the normalized company name index, cheap enough to call on every keystroke.
+    """
+    suggestions = await admission.run(CreditModel.autocomplete_credits, prefix, limit)
+    return FastJSONResponse({"data": suggestions})
+
+
+@router.get("/risk", summary="Riskiest Credits", tags=["Credits"])
+@limiter.limit("30/minute")
+async def get_top_risks(
+    request: Request,
+    top: int = Query(10, ge=1, le=MAX_PAGE_SIZE, description="Number of credits to return"),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("risk")),
+):
+    """
+    The `top` credits with the highest risk score, riskiest first.
+
+    Scores (0 safest, 100 riskiest) combine debt/turnover, net margin, interest burden and capital cover.
+    The whole portfolio is scored in memory with vectorized batches and kept current as credits change.
+    Answers 503 while a worker is still loading the portfolio.
+    """
+    try:
+        risks = await admission.run(CreditModel.get_top_risks, top)
+    except RiskScoresLoading:
+        raise service_unavailable("Risk scores are loading")
+    return FastJSONResponse({"data": risks})
+
+
+@router.get("/cache/stats", summary="Credit Cache Statistics", tags=["Credits"])
+async def get_cache_stats(current_user: str = Depends(verify_token)):
+    """
+    Hit, miss and eviction counters of the credit read cache, used to size it.
+    """
+    return {"data": credit_cache.stats()}
+
+
+@router.get("/writes/stats", summary="Write Coalescing Statistics", tags=["Credits"])
+async def get_write_stats(current_user: str = Depends(verify_token)):
+    """
+    Batch sizes and queueing latency of the coalesced single credit inserts (WRITE_COALESCE_ENABLED).
+    """
+    return {"data": credit_inserts.stats()}
+
+
+@router.get("/admission/stats", summary="Admission Control Statistics", tags=["Credits"])
+async def get_admission_stats(current_user: str = Depends(verify_token)):
+    """
+    Per route concurrency limit, running and queued requests, and how many were admitted, shed or timed out.
+    """
+    return {"data": admission_stats()}
+
+
+def _batch_response(results, success_status):
+    succeeded = sum(1 for result in results if result["status"] == success_status)
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+
+@router.post("/batch", summary="Add New Credits In Batch", tags=["Credits"])
+@limiter.limit("3/minute")
+async def add_new_credits_batch(
+    request: Request,
+    credit_batch: List[CreditData] = Body(..., min_length=1, max_length=MAX_BATCH_SIZE),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("insert_batch")),
+):
+    """
+    Add several credit entries in a single bulk write.
+
+    The whole batch is validated up front, then written at once. The response holds one status per item
+    (`created` or `failed` with a detail, e.g. a duplicate CIN) so a partial failure doesn't fail the batch.
+    This endpoint is rate-limited to 3 requests per minute.
+    """
+    results = await admission.run(CreditModel.save_credits, credit_batch)
+    return FastJSONResponse(_batch_response(results, "created"))
+
+
+@router.put("/batch", summary="Update Credits In Batch", tags=["Credits"])
+@limiter.limit("10/minute")
+async def update_credits_batch(
+    request: Request,
+    credit_batch: List[PutCreditBatchItem] = Body(..., min_length=1, max_length=MAX_BATCH_SIZE),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("update_batch")),
+):
+    """
+    Update several credit entries, identified by their `CIN`, in a single bulk write. An update that races another
+    write to the same credit is retried on its own.
+
+    Only the provided fields of each item are updated. The response holds one status per item
+    (`updated`, `not_found` or `failed`).
+    """
+    results = await admission.run(CreditModel.update_credits, credit_batch)
+    return FastJSONResponse(_batch_response(results, "updated"))
 
 
 @router.get("/{id}", summary="Get Credit By ID", tags=["Credits"])
 @limiter.limit("5/minute")
-async def get_credit_by_id(id: str, request: Request, current_user: str = Depends(verify_token)):
+async def get_credit_by_id(
+    id: str,
+    request: Request,
+    fields: Optional[tuple] = Depends(sparse_fields),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("get")),
+):
     """
-    Retrieve a specific credit entry by its ID.
+    Retrieve a specific credit entry by its ID, `fields` restricts the returned fields.
+    The `ETag` header carries the credit version, send it back as `If-Match` on PUT/DELETE, or as `If-None-Match`
+    (or `Last-Modified` as `If-Modified-Since`) to get a bodiless 304 while the credit is unchanged.
+    Responses whose `fields` leave out `version` carry no validators.
     The response is rate-limited to 5 requests per minute.
     """
-    id_data = CreditModel.get_id_credit(id=id)
+    id_data = await admission.run(CreditModel.get_id_credit, id=id, fields=fields)
     if not id_data:
         raise HTTPException(status_code=404, detail="Credit ID not found")
-    return {"data": id_data}
+    if "version" not in id_data:
+        return FastJSONResponse({"data": id_data})
+    headers = _cache_validators(_etag(id_data["version"]), id_data.get("updated_at"))
+    if _not_modified(request, headers["ETag"], id_data.get("updated_at")):
+        return _not_modified_response(headers)
+    return FastJSONResponse({"data": id_data}, headers=headers)
+
+
+@router.get("/{id}/score", summary="Credit Risk Score", tags=["Credits"])
+@limiter.limit("30/minute")
+async def get_credit_score(
+    id: str,
+    request: Request,
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("score")),
+):
+    """
+    Risk score, grade (A safest to E) and the ratios it was computed from, for one credit.
+    Ratios that can't be computed (no turnover, no loan, a loss) are null.
+    """
+    try:
+        score = await admission.run(CreditModel.get_risk_score, id)
+    except RiskScoresLoading:
+        raise service_unavailable("Risk scores are loading")
+    if score is None:
+        raise HTTPException(status_code=404, detail="Credit ID not found")
+    return FastJSONResponse({"data": score})
 
 
 @router.post("/", summary="Add New Credit", tags=["Credits"])
 @limiter.limit("3/minute")
-async def add_new_credit(credit_data: CreditData, request: Request, current_user: str = Depends(verify_token)):
+async def add_new_credit(
+    credit_data: CreditData,
+    request: Request,
+    response: Response,
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("insert")),
+):
     """
     Add a new credit entry to the system.
 
+    With WRITE_COALESCE_ENABLED concurrent inserts are grouped into one bulk write, see `/credits/writes/stats`.
     This endpoint is rate-limited to 3 requests per minute.
     """
     # Logic to add new credit
     # saved = save_credit(credit_data)
-    saved, message = CreditModel.save_credit(credit_data)
+    if credit_inserts.enabled:
+        result = await admission.submit(credit_inserts, credit_data)
+        saved, message = result["status"] == "created", result["detail"]
+    else:
+        saved, message = await admission.run(CreditModel.save_credit, credit_data)
     if not saved:
         raise HTTPException(status_code=400, detail=message)
+    response.headers["ETag"] = _etag(1)
     return {"saved": credit_data}
 
 
 @router.put("/{id}", summary="Update Credit", tags=["Credits"])
 @limiter.limit("10/minute")
 async def update_credit(
-    id: str, credit_data: PutCreditData, request: Request, current_user: str = Depends(verify_token)
+    id: str,
+    credit_data: PutCreditData,
+    request: Request,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("update")),
 ):
     """
     Update an existing credit entry by its ID.
+
+    Send the `ETag` of the credit as `If-Match` to only update it if nobody changed it in the meantime,
+    a stale version is answered with 412. The new version is returned in the `ETag` header.
     """
-    updated = CreditModel.update_credit_data(id, credit_data)
-    if not updated:
+    try:
+        version = await admission.run(
+            CreditModel.update_credit_data, id, credit_data, expected_versions=_parse_if_match(if_match)
+        )
+    except CreditVersionConflict:
+        raise _precondition_failed(id)
+    if not version:
         raise HTTPException(status_code=404, detail="Credit ID not found for update")
-    return {"updated": updated}
+    response.headers["ETag"] = _etag(version)
+    return {"updated": True}
 
 
 @router.delete("/{id}", summary="Delete Credit", tags=["Credits"])
 @limiter.limit("3/minute")
-async def delete_credit(id: str, request: Request, current_user: str = Depends(verify_token)):
+async def delete_credit(
+    id: str,
+    request: Request,
+    if_match: Optional[str] = Header(None),
+    current_user: str = Depends(verify_token),
+    admission: Admission = Depends(admit("delete")),
+):
     """
     Delete a credit entry from the system by its ID.
+    Honors `If-Match` like the update endpoint.
     """
-    deleted = CreditModel.delete_credit_by_id(id)
+    try:
+        deleted = await admission.run(CreditModel.delete_credit_by_id, id, expected_versions=_parse_if_match(if_match))
+    except CreditVersionConflict:
+        raise _precondition_failed(id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Credit ID not found for deletion")
     return {"deleted_credit_id": id}
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from clients import mongo_client
+from data.models.credit_model import credit_store
+
+# Probes for the load balancer / orchestrator, not authenticated nor rate limited.
+router = APIRouter()
+
+# Whether the startup preparation of the credit collection (indexes, backfills) went through in this worker,
+# set by main.prepare_credit_collection.
+prepared = False
+
+
+def mark_prepared():
+    global prepared
+    prepared = True
+
+
+@router.get("/live", summary="Liveness Probe", tags=["Health"])
+async def live():
+    """
+    The worker process is up and its event loop answers, says nothing about its dependencies.
+    """
+    return {"status": "alive"}
+
+
+@router.get("/ready", summary="Readiness Probe", tags=["Health"])
+async def ready():
+    """
+    Whether this worker can serve traffic: its startup preparation went through and MongoDB answers a ping.
+    Reports the connection pool state, answers 503 while preparing or while the database is unreachable so the
+    load balancer takes the worker out of rotation. The in-memory store has nothing to reach, it reports its size.
+    """
+    if not prepared:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "preparing"})
+    if credit_store().name != "mongo":
+        return {"status": "ready", "storage": credit_store().status()}
+    mongo = await run_in_threadpool(mongo_client.mongo_status)
+    if not mongo["reachable"]:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "unavailable", "mongo": mongo}
+        )
+    return {"status": "ready", "mongo": mongo}
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Response
+
+from clients.metrics_client import render_metrics
+
+# Scraped by Prometheus, not authenticated nor rate limited like the health probes.
+router = APIRouter()
+
+
+@router.get("/metrics", summary="Prometheus Metrics", tags=["Health"])
+def metrics():
+    """
+    Request latency per route and status, time spent in CreditModel calls, Mongo commands, JWT verification
+    and rate limit checks, and rate limit rejections, in the Prometheus text format.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,27 @@
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# Credit documents only hold str, int, float and datetime values, all of which orjson encodes natively in C,
+# so the raw dicts CreditModel returns go straight to bytes without a per-field conversion pass.
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson.
+    Return it directly from a handler to also skip FastAPI's `jsonable_encoder` pass over the content.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
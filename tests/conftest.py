@@ -0,0 +1,10 @@
+import pytest
+
+from clients.rate_limiting_client import limiter
+
+
+# Every test fetches its own token, reset the in-memory limiter so the suite doesn't trip its own rate limits.
+@pytest.fixture(autouse=True)
+def reset_rate_limiter():
+    limiter.reset()
+    yield
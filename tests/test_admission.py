@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from pymongo import _csot
+from pymongo.errors import ExecutionTimeout
+from starlette import status
+
+from clients.mongo_client import bounded, unbounded
+from main import app
+from routers.admission import Admission, Gate, gates, parse_route_limits
+
+client = TestClient(app)
+
+
+def test_gate_queues_then_sheds():
+    gate = Gate("test", limit=1, max_queue=1, queue_timeout=5)
+
+    async def scenario():
+        await gate.acquire()
+        queued = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as shed:
+            await gate.acquire()
+        gate.release()
+        await queued
+        return shed.value
+
+    shed = asyncio.run(scenario())
+    assert shed.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert shed.headers["Retry-After"] == "1"
+    # The released slot was handed to the queued request, not given back.
+    assert gate.stats() == {"limit": 1, "active": 1, "queued": 0, "admitted": 2, "rejected": 1, "timed_out": 0}
+
+
+def test_gate_queue_timeout():
+    gate = Gate("test", limit=1, max_queue=10, queue_timeout=0.01)
+
+    async def scenario():
+        await gate.acquire()
+        with pytest.raises(HTTPException):
+            await gate.acquire()
+        gate.release()
+
+    asyncio.run(scenario())
+    assert gate.stats()["timed_out"] == 1
+    assert gate.stats()["active"] == 0 and gate.stats()["queued"] == 0
+
+
+def test_parse_route_limits():
+    assert parse_route_limits("export=4, search=16,") == {"export": 4, "search": 16}
+    assert parse_route_limits(None) == {}
+
+
+def _bounded_remaining():
+    with bounded():
+        return _csot.remaining()
+
+
+def _unbounded_remaining():
+    with bounded():
+        return unbounded(_csot.remaining)
+
+
+def test_admission_bounds_mongo_calls_by_the_deadline():
+    admission = Admission(time.monotonic() + 2)
+    remaining = asyncio.run(admission.run(_bounded_remaining))
+    assert 0 < remaining <= 2
+    assert asyncio.run(admission.run(_unbounded_remaining)) is None
+    # Only the bounded block gets the deadline.
+    assert asyncio.run(admission.run(_csot.remaining)) is None
+    assert asyncio.run(Admission(None).run(_bounded_remaining)) is None
+
+
+def test_admission_answers_503_past_the_deadline():
+    def slow_query():
+        raise ExecutionTimeout("operation exceeded time limit")
+
+    def expired():
+        time.sleep(0.02)
+        return _bounded_remaining()
+
+    for admission, func in (
+        (Admission(time.monotonic() - 1), _csot.remaining),
+        (Admission(time.monotonic() + 1), slow_query),
+        (Admission(time.monotonic() + 0.01), expired),
+    ):
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(admission.run(func))
+        assert e.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+def _token():
+    return client.post(
+        "/authentication/token",
+        data={"username": os.environ.get("JWT_USERNAME"), "password": os.environ.get("JWT_PASSWORD")},
+    ).json()["access_token"]
+
+
+@patch("data.models.credit_model.CreditModel.get_id_credit")
+def test_saturated_route_is_shed(mock_get_id_credit):
+    with patch.object(gates["get"], "limit", 0), patch.object(gates["get"], "max_queue", 0):
+        response = client.get("/credits/375", headers={"Authorization": f"Bearer {_token()}"})
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+    mock_get_id_credit.assert_not_called()
+    stats = client.get("/credits/admission/stats", headers={"Authorization": f"Bearer {_token()}"}).json()["data"]
+    assert stats["get"]["rejected"] >= 1 and stats["export"]["limit"] == 2
@@ -0,0 +1,51 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from routers.authentication import authenticate
+from routers.authentication.authenticate import create_access_token, verified_tokens, verify_token
+
+
+@pytest.fixture(autouse=True)
+def clear_verified_tokens():
+    verified_tokens.clear()
+    yield
+    verified_tokens.clear()
+
+
+def test_verified_token_skips_signature_check():
+    token = create_access_token({"sub": "Credhive"}, timedelta(minutes=5))
+    with patch.object(authenticate.jwt, "decode", wraps=jwt.decode) as mock_decode:
+        assert verify_token(token) == "Credhive"
+        assert verify_token(token) == "Credhive"
+    assert mock_decode.call_count == 1
+
+
+def test_cached_token_expires_with_the_token():
+    token = create_access_token({"sub": "Credhive"}, timedelta(minutes=5))
+    with patch.object(authenticate.jwt, "decode", wraps=jwt.decode) as mock_decode:
+        with patch("clients.cache_client.time.monotonic", return_value=0):
+            verify_token(token)
+            verify_token(token)
+        # Past the token's exp the cached entry is gone and the token goes through jose again.
+        with patch("clients.cache_client.time.monotonic", return_value=301):
+            verify_token(token)
+    assert mock_decode.call_count == 2
+
+
+def test_expired_token_is_rejected_and_not_cached():
+    token = create_access_token({"sub": "Credhive"}, timedelta(minutes=-1))
+    with pytest.raises(HTTPException) as exc_info:
+        verify_token(token)
+    assert exc_info.value.status_code == 401
+    assert verified_tokens.size() == 0
+
+
+def test_tampered_token_is_rejected():
+    token = create_access_token({"sub": "Credhive"}, timedelta(minutes=5))
+    verify_token(token)
+    with pytest.raises(HTTPException):
+        verify_token(token[:-2] + ("AA" if token[-2:] != "AA" else "BB"))
@@ -0,0 +1,61 @@
+import io
+import json
+from unittest.mock import patch
+
+import data.bulk_load as bulk_load_module
+from data.bulk_load import bulk_load, iter_records
+
+COMPANY = {
+    "CIN": "375",
+    "company_name": "KMT",
+    "address": "PSC 9272, Box 0102\nAPO AE 04350",
+    "registration_date": "2021-09-21",
+    "number_of_employees": 525,
+    "raised_capital": 2258687,
+    "turnover": 28122016,
+    "net_profit": 6759702,
+    "contact_number": "526.729.1296x803",
+    "contact_email": "jodi93@hill.com",
+    "company_website": "http://www.thomas.com/",
+    "loan_amount": 3500750,
+    "loan_interest_percentage": 6.98,
+    "account_status": "Inactive",
+}
+
+
+def test_iter_records_streams_json_array_across_chunks():
+    records = [{**COMPANY, "CIN": str(i)} for i in range(5)]
+    with patch.object(bulk_load_module, "READ_CHUNK_SIZE", 16):
+        parsed = list(iter_records(io.StringIO(json.dumps(records, indent=4))))
+    assert [record["CIN"] for record, error in parsed] == ["0", "1", "2", "3", "4"]
+    assert all(error is None for record, error in parsed)
+
+
+def test_iter_records_reads_ndjson_and_reports_bad_lines():
+    text = json.dumps(COMPANY) + "\n\n{not json\n" + json.dumps({**COMPANY, "CIN": "502"}) + "\n"
+    with patch.object(bulk_load_module, "READ_CHUNK_SIZE", 16):
+        parsed = list(iter_records(io.StringIO(text)))
+    assert len(parsed) == 3
+    assert parsed[0][0]["CIN"] == "375"
+    assert parsed[1][0] is None and parsed[1][1].startswith("Invalid JSON")
+    assert parsed[2][0]["CIN"] == "502"
+
+
+@patch(
+    "data.models.credit_model.CreditModel.bulk_save_documents",
+    return_value={"inserted": 1, "upserted": 0, "modified": 0, "errors": {1: "Credit with this CIN already exists"}},
+)
+def test_bulk_load_reports_per_row_errors(mock_bulk_save):
+    records = [
+        (COMPANY, None),
+        ({**COMPANY, "loan_amount": -1}, None),
+        (None, "Invalid JSON: Expecting value"),
+        ({**COMPANY, "CIN": "502"}, None),
+    ]
+    report = bulk_load(iter(records), batch_size=10)
+
+    documents = mock_bulk_save.call_args.args[0]
+    assert [document["CIN"] for document in documents] == ["375", "502"]
+    assert report.as_dict()["rows"] == 4
+    assert report.inserted == 1
+    assert [(error["row"], error["CIN"]) for error in report.errors] == [(2, "375"), (3, None), (4, "502")]
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from clients.cache_client import LRUTTLCache, ReadThroughCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ReadThroughCache(LRUTTLCache(max_entries=2, ttl=60))
+    cache.get_or_load("a", lambda: 1)
+    cache.get_or_load("b", lambda: 2)
+    cache.get_or_load("a", lambda: 1)  # "a" is now the most recently used
+    cache.get_or_load("c", lambda: 3)
+
+    assert cache.get_or_load("a", lambda: "reloaded") == 1
+    assert cache.get_or_load("b", lambda: "reloaded") == "reloaded"
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_ttl_expires_entries():
+    cache = ReadThroughCache(LRUTTLCache(max_entries=10, ttl=0.05))
+    cache.get_or_load("a", lambda: 1)
+    time.sleep(0.1)
+    assert cache.get_or_load("a", lambda: 2) == 2
+
+
+def test_invalidate_forces_reload():
+    cache = ReadThroughCache(LRUTTLCache(max_entries=10, ttl=60))
+    cache.get_or_load("a", lambda: 1)
+    cache.invalidate("a")
+    assert cache.get_or_load("a", lambda: 2) == 2
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["misses"] == 2
+
+
+def test_concurrent_misses_are_collapsed():
+    cache = ReadThroughCache(LRUTTLCache(max_entries=10, ttl=60))
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"CIN": "375"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("a", slow_loader))) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"CIN": "375"}] * 10
+    assert cache.stats()["coalesced"] == 9
+
+
+def test_invalidate_during_load_is_not_cached():
+    cache = ReadThroughCache(LRUTTLCache(max_entries=10, ttl=60))
+
+    def loader():
+        cache.invalidate("a")  # a write lands while the read is in flight
+        return "stale"
+
+    assert cache.get_or_load("a", loader) == "stale"
+    assert cache.get_or_load("a", lambda: "fresh") == "fresh"
+
+
+def test_invalidate_racing_the_cache_fill_is_not_lost():
+    invalidations = []
+
+    class RacingBackend(LRUTTLCache):
+        def set(self, key, value, ttl=None):
+            # A write's invalidation arrives right after the loader returned.
+            invalidation = threading.Thread(target=cache.invalidate, args=(key,))
+            invalidation.start()
+            invalidation.join(0.1)
+            invalidations.append(invalidation)
+            super().set(key, value, ttl)
+
+    cache = ReadThroughCache(RacingBackend(max_entries=10, ttl=60))
+    assert cache.get_or_load("a", lambda: "stale") == "stale"
+    invalidations[0].join()
+    assert cache.get_or_load("a", lambda: "fresh") == "fresh"
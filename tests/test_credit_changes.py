@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from data.models.credit_changes import ChangeFeed
+from main import app
+
+client = TestClient(app)
+
+WRITTEN = datetime.utcnow() - timedelta(minutes=5)
+
+
+def _collection(documents):
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value.limit.return_value = documents
+    return collection
+
+
+def _credit(cin, change_seq, created_seq, updated_at=WRITTEN):
+    return {"CIN": cin, "change_seq": change_seq, "created_seq": created_seq, "updated_at": updated_at}
+
+
+def _tombstone(cin, change_seq, updated_at=WRITTEN):
+    return {"CIN": cin, "change_seq": change_seq, "updated_at": updated_at}
+
+
+def _changes_since(credits, tombstones, since=10, limit=10):
+    with patch("data.models.credit_changes.CreditTombstone._get_collection", return_value=_collection(tombstones)):
+        with patch.object(ChangeFeed, "served_below", return_value=100):
+            return ChangeFeed.changes_since(_collection(credits), since, limit)
+
+
+def test_merges_credits_and_tombstones_in_sequence_order():
+    changes, has_more = _changes_since(
+        [_credit("A", 11, 11), _credit("B", 14, 3)],
+        [_tombstone("C", 12), _tombstone("D", 15)],
+    )
+    assert [(change["op"], change["CIN"]) for change in changes] == [
+        ("insert", "A"),
+        ("delete", "C"),
+        ("update", "B"),
+        ("delete", "D"),
+    ]
+    assert changes[2]["credit"]["CIN"] == "B"
+    assert not has_more
+
+
+def test_limit_reports_more_changes():
+    changes, has_more = _changes_since([_credit("A", 11, 1), _credit("B", 12, 1)], [_tombstone("C", 13)], limit=2)
+    assert [change["change_seq"] for change in changes] == [11, 12]
+    assert has_more
+
+
+def test_feed_stops_below_the_oldest_pending_reservation():
+    credits = _collection([])
+    with patch("data.models.credit_changes.CreditTombstone._get_collection", return_value=_collection([])):
+        with patch.object(ChangeFeed, "served_below", return_value=12):
+            ChangeFeed.changes_since(credits, 10, 5)
+    assert credits.find.call_args.args[0] == {"change_seq": {"$gt": 10, "$lt": 12}}
+
+
+def test_served_below():
+    sequence = MagicMock()
+    with patch("data.models.credit_changes.CreditChangeSequence._get_collection", return_value=sequence):
+        sequence.find_one.return_value = None
+        assert ChangeFeed.served_below() == 1
+        sequence.find_one.return_value = {"seq": 20, "pending": []}
+        assert ChangeFeed.served_below() == 21
+        # 9 was reserved by a process that died before releasing it.
+        sequence.find_one.return_value = {
+            "seq": 20,
+            "pending": [
+                {"first": 9, "reserved_at": datetime.utcnow() - timedelta(hours=1)},
+                {"first": 12, "reserved_at": datetime.utcnow()},
+            ],
+        }
+        assert ChangeFeed.served_below() == 12
+
+
+@patch(
+    "data.models.credit_model.CreditModel.get_changes",
+    return_value=([{"op": "delete", "CIN": "375", "change_seq": 42, "updated_at": WRITTEN, "credit": None}], True),
+)
+def test_changes_endpoint(mock_get_changes):
+    token = client.post(
+        "/authentication/token",
+        data={"username": os.environ.get("JWT_USERNAME"), "password": os.environ.get("JWT_PASSWORD")},
+    ).json()["access_token"]
+    response = client.get("/credits/changes?since=41&limit=1", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["next_since"] == 42
+    assert response.json()["has_more"] is True
+    mock_get_changes.assert_called_once_with(41, 1)
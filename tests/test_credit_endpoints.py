@@ -1,11 +1,17 @@
+import json
 import os
+import pytest
+from datetime import datetime
 from dotenv import load_dotenv
 from fastapi.testclient import TestClient
 from unittest.mock import patch
 from starlette import status
 
 from main import app
+from data.models.credit_model import CreditVersionConflict
+from data.validators.credit_query import CreditFilters
 from routers.authentication.authenticate import verify_token
+from clients.rate_limiting_client import limiter
 
 load_dotenv()
 
@@ -16,7 +22,7 @@ client = TestClient(app)
 # Mocking the database model for testing
 class MockCreditModel:
     @staticmethod
-    def get_all_credits():
+    def get_all_credits(fields=None, version=None):
         return [
             {
                 "CIN": "375",
@@ -69,6 +75,16 @@ class MockCreditModel:
         ]
 
 
+COLLECTION_VERSION = (42, datetime(2024, 1, 2, 3, 4, 5, 600000))
+
+
+# Listings read the collection version for their ETag before anything else.
+@pytest.fixture(autouse=True)
+def collection_version():
+    with patch("data.models.credit_model.CreditModel.get_collection_version", return_value=COLLECTION_VERSION) as mock:
+        yield mock
+
+
 def mock_verify_token():
     return os.environ.get("JWT_USERNAME")
 
@@ -215,3 +231,234 @@ def test_delete_credit_failure(mock_verify, mock_delete_credit):
     response = client.delete(f"/credits/{test_id}", headers={"Authorization": f"Bearer {token}"})
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert response.json()["detail"] == "Credit ID not found for deletion"
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch(
+    "data.models.credit_model.CreditModel.get_credits_page",
+    return_value=(MockCreditModel.get_all_credits()[:2], "NTAy"),
+)
+def test_get_credits_page(mock_get_page, mock_verify):
+    token = get_mocked_token()
+    response = client.get("/credits?limit=2", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["data"]) == 2
+    assert response.json()["next_cursor"] == "NTAy"
+    mock_get_page.assert_called_once_with(2, after=None, fields=None, filters=CreditFilters())
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch("data.models.credit_model.CreditModel.get_credits_page", return_value=([], None))
+def test_get_credits_filtered(mock_get_page, mock_verify):
+    token = get_mocked_token()
+    response = client.get(
+        "/credits?account_status=Active&loan_amount_min=100000&sort=-loan_amount",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"data": [], "next_cursor": None}
+    filters = mock_get_page.call_args.kwargs["filters"]
+    assert (filters.account_status, filters.loan_amount_min, filters.sort) == ("Active", 100000, "-loan_amount")
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+def test_get_credits_unindexed_sort(mock_verify):
+    token = get_mocked_token()
+    response = client.get("/credits?sort=company_name", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+def test_get_credits_invalid_cursor(mock_verify):
+    token = get_mocked_token()
+    response = client.get("/credits?after=***", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Invalid pagination cursor"
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch("data.models.credit_model.CreditModel.iter_credits", return_value=iter(MockCreditModel.get_all_credits()))
+def test_get_credits_stream(mock_iter_credits, mock_verify):
+    token = get_mocked_token()
+    response = client.get("/credits?stream=true", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.strip().split("\n")
+    assert [json.loads(line)["CIN"] for line in lines] == ["375", "502", "633"]
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch(
+    "data.models.credit_model.CreditModel.save_credits",
+    return_value=[
+        {"CIN": "375", "status": "created", "detail": None},
+        {"CIN": "502", "status": "failed", "detail": "Credit with this CIN already exists"},
+    ],
+)
+def test_add_new_credits_batch_partial_failure(mock_save_credits, mock_verify):
+    token = get_mocked_token()
+    batch = MockCreditModel.get_all_credits()[:2]
+    response = client.post("/credits/batch", headers={"Authorization": f"Bearer {token}"}, json=batch)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["succeeded"] == 1
+    assert response.json()["failed"] == 1
+    assert [result["status"] for result in response.json()["results"]] == ["created", "failed"]
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+def test_add_new_credits_batch_empty(mock_verify):
+    token = get_mocked_token()
+    response = client.post("/credits/batch", headers={"Authorization": f"Bearer {token}"}, json=[])
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch(
+    "data.models.credit_model.CreditModel.update_credits",
+    return_value=[
+        {"CIN": "375", "status": "updated", "detail": None},
+        {"CIN": "nonexistent_id", "status": "not_found", "detail": "Credit ID not found for update"},
+    ],
+)
+def test_update_credits_batch(mock_update_credits, mock_verify):
+    token = get_mocked_token()
+    update_data = [{"CIN": "375", "company_name": "KPMG"}, {"CIN": "nonexistent_id", "company_name": "KPMG"}]
+    response = client.put("/credits/batch", headers={"Authorization": f"Bearer {token}"}, json=update_data)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["succeeded"] == 1
+    assert [item.CIN for item in mock_update_credits.call_args.args[0]] == ["375", "nonexistent_id"]
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch("data.models.credit_model.CreditModel.update_credit_data", return_value=4)
+def test_update_credit_if_match(mock_update_credit, mock_verify):
+    token = get_mocked_token()
+    response = client.put(
+        "/credits/375",
+        headers={"Authorization": f"Bearer {token}", "If-Match": '"3"'},
+        json={"company_name": "KPMG"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == '"4"'
+    assert mock_update_credit.call_args.kwargs["expected_versions"] == [3]
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch("data.models.credit_model.CreditModel.update_credit_data", side_effect=CreditVersionConflict("375"))
+def test_update_credit_stale_if_match(mock_update_credit, mock_verify):
+    token = get_mocked_token()
+    response = client.put(
+        "/credits/375",
+        headers={"Authorization": f"Bearer {token}", "If-Match": '"1"'},
+        json={"company_name": "KPMG"},
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch("data.models.credit_model.CreditModel.delete_credit_by_id", side_effect=CreditVersionConflict("375"))
+def test_delete_credit_stale_if_match(mock_delete_credit, mock_verify):
+    token = get_mocked_token()
+    response = client.delete("/credits/375", headers={"Authorization": f"Bearer {token}", "If-Match": '"1"'})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch("data.models.credit_model.CreditModel.get_id_credit", return_value={"CIN": "375", "loan_amount": 3500750})
+def test_get_credit_by_id_sparse_fields(mock_get_id_credit, mock_verify):
+    token = get_mocked_token()
+    response = client.get("/credits/375?fields=loan_amount", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"] == {"CIN": "375", "loan_amount": 3500750}
+    assert mock_get_id_credit.call_args.kwargs["fields"] == ("loan_amount",)
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+def test_get_credits_unknown_fields(mock_verify):
+    token = get_mocked_token()
+    response = client.get("/credits?fields=CIN,password", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Unknown fields: password"
+
+
+@patch("routers.authentication.authenticate.verify_token", side_effect=mock_verify_token)
+@patch(
+    "data.models.credit_model.CreditModel.get_portfolio_stats",
+    return_value={
+        "by_status": {"Active": {"count": 1, "loan_amount": 2620355, "weighted_interest": 2620355 * 7.35}},
+        "turnover_buckets": {"25000000-50000000": 1},
+        "net_profit_buckets": {"5000000-10000000": 1},
+    },
+)
+def test_get_portfolio_stats(mock_get_stats, mock_verify):
+    token = get_mocked_token()
+    response = client.get("/credits/stats", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()["data"]
+    assert data["source"] == "summary"
+    assert data["total"]["total_loan_amount"] == 2620355
+    assert round(data["total"]["weighted_avg_interest_percentage"], 2) == 7.35
+    mock_get_stats.assert_called_once_with(live=False)
+
+
+@patch("data.models.credit_model.CreditModel.get_all_credits", side_effect=MockCreditModel.get_all_credits)
+def test_get_credits_conditional(mock_get_all_credits):
+    headers = {"Authorization": f"Bearer {get_mocked_token()}"}
+    response = client.get("/credits", headers=headers)
+    etag = response.headers["ETag"]
+    assert etag.startswith('"42-')
+    assert response.headers["Last-Modified"] == "Tue, 02 Jan 2024 03:04:05 GMT"
+    assert mock_get_all_credits.call_args.kwargs["version"] == 42
+
+    mock_get_all_credits.reset_mock()
+    for conditional in (
+        {"If-None-Match": etag},
+        {"If-None-Match": f'"other", W/{etag}'},
+        {"If-Modified-Since": "Tue, 02 Jan 2024 03:04:05 GMT"},
+    ):
+        response = client.get("/credits", headers={**headers, **conditional})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+    mock_get_all_credits.assert_not_called()
+
+    # The listing allows 5 requests a minute.
+    limiter.reset()
+    # A different query is a different representation, an older date or tag means the client is out of date.
+    assert client.get("/credits?fields=CIN", headers=headers).headers["ETag"] != etag
+    for conditional in ({"If-None-Match": '"41-0"'}, {"If-Modified-Since": "Tue, 02 Jan 2024 03:04:04 GMT"}):
+        assert client.get("/credits", headers={**headers, **conditional}).status_code == status.HTTP_200_OK
+
+
+@patch(
+    "data.models.credit_model.CreditModel.get_id_credit",
+    return_value={"CIN": "375", "version": 3, "updated_at": datetime(2024, 1, 2, 3, 4, 5)},
+)
+def test_get_credit_by_id_conditional(mock_get_id_credit):
+    headers = {"Authorization": f"Bearer {get_mocked_token()}"}
+    response = client.get("/credits/375", headers={**headers, "If-None-Match": '"3"'})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["ETag"] == '"3"'
+    assert response.headers["Last-Modified"] == "Tue, 02 Jan 2024 03:04:05 GMT"
+    # If-None-Match wins over If-Modified-Since.
+    response = client.get(
+        "/credits/375",
+        headers={**headers, "If-None-Match": '"2"', "If-Modified-Since": "Wed, 03 Jan 2024 00:00:00 GMT"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"]["version"] == 3
+
+
+@patch("data.models.credit_model.CreditModel._load_all_credits", return_value=[{"CIN": "375"}])
+def test_listing_cache_is_keyed_by_collection_version(mock_load_all_credits):
+    from clients.cache_client import credit_cache
+    from data.models.credit_model import ALL_CREDITS_CACHE_KEY, CreditModel
+
+    credit_cache.clear()
+    for version in (7, 7, 8, 7, 9):
+        assert CreditModel.get_all_credits(version=version) == [{"CIN": "375"}]
+    # Older versions are served by the newer listing, every newer version replaces it in the same slot.
+    assert mock_load_all_credits.call_count == 3
+    assert credit_cache.backend.get(ALL_CREDITS_CACHE_KEY)["version"] == 9
+    assert credit_cache.backend.size() == 1
+    credit_cache.clear()
@@ -0,0 +1,119 @@
+import os
+from datetime import date
+
+import pytest
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import PyMongoError
+
+from data.models.credit_model import Credit, _keyset_filter, build_filter, normalize_name, sort_spec
+from data.validators.credit_query import CreditFilters
+
+load_dotenv()
+
+# Every filter / sort the credits router supports, each one must be served from an index.
+SUPPORTED_QUERIES = [
+    CreditFilters(),
+    CreditFilters(sort="-CIN"),
+    CreditFilters(account_status="Active"),
+    CreditFilters(loan_amount_min=100000, loan_amount_max=2000000),
+    CreditFilters(loan_interest_percentage_min=4, loan_interest_percentage_max=8),
+    CreditFilters(registered_from=date(2015, 1, 1), registered_to=date(2020, 12, 31)),
+    CreditFilters(sort="-loan_amount"),
+    CreditFilters(sort="loan_interest_percentage"),
+    CreditFilters(sort="-registration_date"),
+    CreditFilters(account_status="Active", loan_amount_min=100000, sort="-loan_amount"),
+    CreditFilters(account_status="Pending", loan_interest_percentage_max=5, sort="loan_interest_percentage"),
+    CreditFilters(account_status="Inactive", registered_from=date(2018, 1, 1), sort="registration_date"),
+]
+
+
+@pytest.fixture(scope="module")
+def credit_collection():
+    client = MongoClient(os.environ.get("MONGO_DB_CONN_STRING"), serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("MongoDB is not reachable")
+
+    database = client["credhive_index_test"]
+    collection = database[Credit._get_collection_name()]
+    collection.drop()
+    for spec in Credit._meta["index_specs"]:
+        options = {key: value for key, value in spec.items() if key != "fields"}
+        collection.create_index(spec["fields"], **options)
+    collection.insert_many(
+        [
+            {
+                "CIN": f"IDX{i:05d}",
+                "company_name": f"{('Acme', 'Globex', 'Initech')[i % 3]} Holdings {i}",
+                "company_name_lower": normalize_name(f"{('Acme', 'Globex', 'Initech')[i % 3]} Holdings {i}"),
+                "address": f"{i} Marine Drive, Mumbai",
+                "registration_date": Credit.registration_date.to_mongo(date(2010 + i % 12, 1 + i % 12, 1 + i % 28)),
+                "loan_amount": float(50000 + (i * 7919) % 5000000),
+                "loan_interest_percentage": 2 + (i % 80) / 10,
+                "account_status": ("Active", "Inactive", "Pending")[i % 3],
+            }
+            for i in range(2000)
+        ]
+    )
+    yield collection
+    client.drop_database(database)
+    client.close()
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+def _assert_index_scan(cursor):
+    stages = set(_stages(cursor.explain()["queryPlanner"]["winningPlan"]))
+    assert "COLLSCAN" not in stages
+    assert "IXSCAN" in stages or "EXPRESS_IXSCAN" in stages
+
+
+def test_declared_indexes_exist(credit_collection):
+    index_keys = [list(index["key"].items()) for index in credit_collection.list_indexes()]
+    assert [("CIN", ASCENDING)] in index_keys
+    assert [("account_status", ASCENDING), ("loan_amount", ASCENDING), ("CIN", ASCENDING)] in index_keys
+
+
+@pytest.mark.parametrize(
+    "filters", SUPPORTED_QUERIES, ids=lambda filters: filters.model_dump_json(exclude_defaults=True)
+)
+def test_filter_is_served_from_index(credit_collection, filters):
+    order = sort_spec(filters.sort)[2]
+    _assert_index_scan(credit_collection.find(build_filter(filters)).sort(order).limit(101))
+
+
+@pytest.mark.parametrize(
+    "filters", SUPPORTED_QUERIES, ids=lambda filters: filters.model_dump_json(exclude_defaults=True)
+)
+def test_next_page_is_served_from_index(credit_collection, filters):
+    field, direction, order = sort_spec(filters.sort)
+    last = credit_collection.find_one(build_filter(filters), sort=order)
+    keyset = _keyset_filter(field, direction, last[field], last["CIN"])
+    query = build_filter(filters)
+    query = {"$and": [query, keyset]} if query else keyset
+    _assert_index_scan(credit_collection.find(query).sort(order).limit(101))
+
+
+def test_text_search_uses_text_index(credit_collection):
+    cursor = credit_collection.find({"$text": {"$search": "globex"}}, {"score": {"$meta": "textScore"}})
+    stages = set(_stages(cursor.sort([("score", {"$meta": "textScore"})]).limit(20).explain()["queryPlanner"]))
+    assert "COLLSCAN" not in stages
+    assert stages & {"TEXT", "TEXT_MATCH", "TEXT_OR"}
+
+
+def test_autocomplete_is_served_from_index(credit_collection):
+    cursor = credit_collection.find(
+        {"company_name_lower": {"$regex": "^glob"}}, {"_id": 0, "CIN": 1, "company_name": 1}
+    )
+    _assert_index_scan(cursor.sort([("company_name_lower", 1), ("CIN", 1)]).limit(10))
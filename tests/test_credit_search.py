@@ -0,0 +1,73 @@
+import os
+from unittest.mock import MagicMock, patch
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from data.models.credit_model import Credit, CreditModel, normalize_name
+from data.validators.credit_data import PutCreditData
+from main import app
+
+client = TestClient(app)
+
+
+def get_token():
+    response = client.post(
+        "/authentication/token",
+        data={"username": os.environ.get("JWT_USERNAME"), "password": os.environ.get("JWT_PASSWORD")},
+    )
+    return response.json()["access_token"]
+
+
+def test_normalize_name():
+    assert normalize_name("  Acme   Steel LTD ") == "acme steel ltd"
+    assert normalize_name(None) is None
+
+
+def test_company_name_lower_is_kept_in_step():
+    credit = Credit(company_name="Acme  Steel")
+    credit.clean()
+    assert credit.company_name_lower == "acme steel"
+    assert CreditModel.to_update_fields(PutCreditData(company_name="Zeta Corp"))["company_name_lower"] == "zeta corp"
+    assert "company_name_lower" not in CreditModel.to_update_fields(PutCreditData(loan_amount=5))
+
+
+@patch("data.models.credit_model.Credit._get_collection")
+def test_autocomplete_is_an_anchored_normalized_prefix(mock_collection):
+    collection = MagicMock()
+    mock_collection.return_value = collection
+    CreditModel.autocomplete_credits("Acme (India", 10)
+    query = collection.find.call_args.args[0]
+    assert query == {"company_name_lower": {"$regex": r"^acme\ \(india"}}
+
+
+@patch("routers.authentication.authenticate.verify_token")
+@patch(
+    "data.models.credit_model.CreditModel.search_credits",
+    return_value=[{"CIN": "375", "company_name": "Acme Steel", "score": 7.5}],
+)
+def test_search_endpoint(mock_search, mock_verify):
+    token = get_token()
+    response = client.get("/credits/search?q=acme steel&limit=5", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"][0]["score"] == 7.5
+    mock_search.assert_called_once_with("acme steel", 5, fields=None)
+
+
+@patch("routers.authentication.authenticate.verify_token")
+@patch(
+    "data.models.credit_model.CreditModel.autocomplete_credits",
+    return_value=[{"CIN": "375", "company_name": "Acme Steel"}],
+)
+def test_autocomplete_endpoint(mock_autocomplete, mock_verify):
+    token = get_token()
+    response = client.get("/credits/autocomplete?prefix=ac", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"] == [{"CIN": "375", "company_name": "Acme Steel"}]
+    mock_autocomplete.assert_called_once_with("ac", 10)
+
+
+def test_search_needs_a_query():
+    token = get_token()
+    response = client.get("/credits/search?q=", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
@@ -0,0 +1,59 @@
+from unittest.mock import MagicMock, patch
+
+from data.models.credit_summary import (
+    NET_PROFIT_BOUNDARIES,
+    TURNOVER_BOUNDARIES,
+    PortfolioSummary,
+    bucket_label,
+    format_stats,
+)
+
+CREDIT = {
+    "CIN": "375",
+    "account_status": "Active",
+    "loan_amount": 1000.0,
+    "loan_interest_percentage": 5.0,
+    "turnover": 2000000.0,
+    "net_profit": 50000000.0,
+}
+
+
+def test_bucket_label():
+    assert bucket_label(0, TURNOVER_BOUNDARIES) == "0-1000000"
+    assert bucket_label(1000000, TURNOVER_BOUNDARIES) == "1000000-5000000"
+    assert bucket_label(75000000, TURNOVER_BOUNDARIES) == "50000000+"
+    assert bucket_label(10000000, NET_PROFIT_BOUNDARIES) == "10000000+"
+
+
+@patch("data.models.credit_summary.CreditSummary._get_collection")
+def test_apply_changes_folds_deltas_into_one_inc(mock_collection):
+    collection = MagicMock()
+    mock_collection.return_value = collection
+    updated = {**CREDIT, "account_status": "Inactive", "loan_amount": 3000.0}
+
+    PortfolioSummary.apply_changes([(None, CREDIT), (CREDIT, updated)])
+
+    increments = collection.update_one.call_args.args[1]["$inc"]
+    # The insert and the status change cancel out on Active, only the Inactive side remains.
+    assert "by_status.Active.count" not in increments
+    assert increments["by_status.Inactive.count"] == 1
+    assert increments["by_status.Inactive.loan_amount"] == 3000.0
+    assert increments["by_status.Inactive.weighted_interest"] == 15000.0
+    assert increments["turnover_buckets.1000000-5000000"] == 1
+
+
+def test_format_stats_weighted_average():
+    summary = {
+        "by_status": {
+            "Active": {"count": 2, "loan_amount": 3000.0, "weighted_interest": 21000.0},
+            "Inactive": {"count": 1, "loan_amount": 1000.0, "weighted_interest": 3000.0},
+            "Pending": {"count": 0, "loan_amount": 0.0, "weighted_interest": 0.0},
+        },
+        "turnover_buckets": {"50000000+": 1, "0-1000000": 2},
+        "net_profit_buckets": {},
+    }
+    stats = format_stats(summary)
+    assert [status["account_status"] for status in stats["by_status"]] == ["Active", "Inactive"]
+    assert stats["by_status"][0]["weighted_avg_interest_percentage"] == 7.0
+    assert stats["total"] == {"count": 3, "total_loan_amount": 4000.0, "weighted_avg_interest_percentage": 6.0}
+    assert list(stats["turnover_buckets"]) == ["0-1000000", "50000000+"]
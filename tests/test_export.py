@@ -0,0 +1,102 @@
+import csv
+import gzip
+import io
+import json
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from data import export
+from main import app
+
+client = TestClient(app)
+
+CREDITS = [
+    {
+        "CIN": f"{index:03d}",
+        "company_name": f"Company {index}",
+        "registration_date": datetime(2015, 5, 10),
+        "number_of_employees": 100 + index,
+        "loan_amount": 1000.5 * index,
+        "account_status": "Active",
+        "version": 1,
+    }
+    for index in range(5)
+]
+BATCHES = [CREDITS[:2], CREDITS[2:4], CREDITS[4:]]
+COLUMNS = ["CIN", "company_name", "registration_date", "number_of_employees", "loan_amount", "version"]
+
+
+def get_token():
+    response = client.post(
+        "/authentication/token",
+        data={"username": os.environ.get("JWT_USERNAME"), "password": os.environ.get("JWT_PASSWORD")},
+    )
+    return response.json()["access_token"]
+
+
+def test_columns_follow_document_order():
+    assert export.columns_for(None)[0] == "CIN"
+    assert export.columns_for(("loan_amount", "company_name")) == ["CIN", "company_name", "loan_amount"]
+
+
+def test_csv_yields_one_chunk_per_batch():
+    chunks = list(export.iter_csv(iter(BATCHES), COLUMNS))
+    assert len(chunks) == 3
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert rows[0] == COLUMNS
+    assert rows[1] == ["000", "Company 0", "2015-05-10", "100", "0.0", "1"]
+    assert len(rows) == 6
+
+
+def test_ndjson_keeps_the_columns():
+    lines = b"".join(export.iter_ndjson(iter(BATCHES), ["CIN", "loan_amount", "turnover"])).splitlines()
+    assert [json.loads(line) for line in lines][1] == {"CIN": "001", "loan_amount": 1000.5}
+    assert len(lines) == 5
+
+
+def test_gzip_chunks_round_trip():
+    chunks = export.iter_ndjson(iter(BATCHES), COLUMNS)
+    lines = gzip.decompress(b"".join(export.gzip_chunks(chunks))).splitlines()
+    assert [json.loads(line)["CIN"] for line in lines] == ["000", "001", "002", "003", "004"]
+
+
+def test_parquet_writes_a_row_group_per_batch():
+    pq = pytest.importorskip("pyarrow.parquet")
+    data = b"".join(export.iter_parquet(iter(BATCHES), COLUMNS))
+    parquet_file = pq.ParquetFile(io.BytesIO(data))
+    assert parquet_file.metadata.num_row_groups == 3
+    table = parquet_file.read()
+    assert table.column("CIN").to_pylist() == ["000", "001", "002", "003", "004"]
+    assert table.column("registration_date").to_pylist()[0] == datetime(2015, 5, 10).date()
+
+
+@patch("data.models.credit_model.CreditModel.iter_credit_batches", return_value=iter(BATCHES))
+def test_export_endpoint_streams_gzipped_csv(mock_batches):
+    token = get_token()
+    response = client.get(
+        "/credits/export?format=csv&compression=gzip&fields=company_name",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="credits.csv.gz"' in response.headers["content-disposition"]
+    rows = list(csv.reader(io.StringIO(gzip.decompress(response.content).decode())))
+    assert rows[0] == ["CIN", "company_name"]
+    assert len(rows) == 6
+
+
+def test_export_rejects_unknown_formats():
+    response = client.get("/credits/export?format=xml", headers={"Authorization": f"Bearer {get_token()}"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@patch("data.export.parquet_available", return_value=False)
+def test_export_parquet_without_pyarrow(mock_available):
+    token = get_token()
+    response = client.get("/credits/export?format=parquet", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
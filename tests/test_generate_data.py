@@ -0,0 +1,51 @@
+import json
+from datetime import date
+
+import pytest
+
+from data.bulk_load import iter_records
+from data.generate_data import build_pools, generate, generate_record
+from data.validators.credit_data import CreditData
+
+AS_OF = date(2026, 1, 1)
+
+
+def test_records_are_valid_unique_and_reproducible():
+    pools = build_pools(7, size=50)
+    records = [generate_record(index, 7, AS_OF, pools) for index in range(2000)]
+    assert len({record["CIN"] for record in records}) == 2000
+    for record in records:
+        CreditData(**record)
+        assert record["registration_date"] <= AS_OF
+    assert generate_record(1234, 7, AS_OF, pools) == records[1234]
+    assert generate_record(1234, 8, AS_OF, pools) != records[1234]
+    assert {record["account_status"] for record in records} == {"Active", "Inactive", "Pending"}
+
+
+def test_output_does_not_depend_on_workers_or_chunks(tmp_path):
+    one, two = tmp_path / "one.ndjson", tmp_path / "two.ndjson"
+    generate(str(one), 95, output_format="ndjson", start=10, seed=3, as_of=AS_OF, workers=1, chunk_size=100)
+    generate(str(two), 95, output_format="ndjson", start=10, seed=3, as_of=AS_OF, workers=3, chunk_size=7)
+    assert one.read_bytes() == two.read_bytes()
+
+    with open(one) as file:
+        parsed = list(iter_records(file))
+    assert len(parsed) == 95 and all(error is None for record, error in parsed)
+    assert parsed[0][0]["CIN"].endswith("000010")
+
+
+def test_json_array_output(tmp_path):
+    path = tmp_path / "credits.json"
+    generate(str(path), 12, output_format="json", as_of=AS_OF, workers=2, chunk_size=5)
+    records = json.loads(path.read_text())
+    assert len(records) == 12
+    assert CreditData(**records[-1]).registration_date <= AS_OF
+
+
+def test_parquet_output(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "credits.parquet"
+    generate(str(path), 25, output_format="parquet", as_of=AS_OF, workers=2, chunk_size=10)
+    table = pq.read_table(path)
+    assert table.num_rows == 25 and pq.ParquetFile(path).num_row_groups == 3
+    assert table.column("CIN").to_pylist()[-1].endswith("000024")
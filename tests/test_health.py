@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+
+client = TestClient(app)
+
+POOL = {"max_size": 100, "min_size": 0, "open": 2, "checked_out": 0, "checkout_failures": 0, "cleared": 0}
+
+
+def test_live():
+    response = client.get("/health/live")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"status": "alive"}
+
+
+@pytest.fixture(autouse=True)
+def prepared():
+    with patch("routers.health.prepared", True):
+        yield
+
+
+@patch(
+    "clients.mongo_client.mongo_status",
+    return_value={"reachable": True, "pool": POOL, "servers": {"localhost:27017": "Standalone"}},
+)
+def test_ready_reports_pool_state(mock_status):
+    response = client.get("/health/ready")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "ready"
+    assert response.json()["mongo"]["pool"]["open"] == 2
+
+
+@patch(
+    "clients.mongo_client.mongo_status",
+    return_value={"reachable": False, "error": "No servers found", "pool": POOL, "servers": {}},
+)
+def test_ready_fails_without_mongo(mock_status):
+    response = client.get("/health/ready")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["status"] == "unavailable"
+    assert response.json()["mongo"]["error"] == "No servers found"
+
+
+def test_not_ready_until_prepared():
+    with patch("routers.health.prepared", False), patch("clients.mongo_client.mongo_status") as mock_status:
+        response = client.get("/health/ready")
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json() == {"status": "preparing"}
+    mock_status.assert_not_called()
+
+
+def test_mongo_status_before_connecting():
+    from clients import mongo_client
+
+    with patch.object(mongo_client, "_registered", False):
+        assert mongo_client.mongo_status() == {"reachable": False, "error": "Not connected"}
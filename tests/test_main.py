@@ -0,0 +1,49 @@
+from unittest.mock import patch
+
+import main
+from data.models.credit_model import use_credit_store
+from data.storage.memory_store import MemoryCreditStore
+from routers import health
+
+
+def test_development_server_reloads_single_process():
+    with patch.object(main, "PRODUCTION", False):
+        options = main.server_options()
+    assert options["reload"] is True
+    assert "workers" not in options
+
+
+@patch.dict("os.environ", {"APP_WORKERS": "4", "APP_GRACEFUL_SHUTDOWN_SECONDS": "15"})
+def test_production_server_runs_tuned_workers():
+    with patch.object(main, "PRODUCTION", True), patch.object(main, "_installed", return_value=True):
+        options = main.server_options()
+    assert "reload" not in options
+    assert options["workers"] == 4
+    assert options["loop"] == "uvloop"
+    assert options["http"] == "httptools"
+    assert options["timeout_graceful_shutdown"] == 15
+
+
+def test_production_server_falls_back_without_fast_implementations():
+    with patch.object(main, "PRODUCTION", True), patch.object(main, "_installed", return_value=False):
+        options = main.server_options()
+    assert options["loop"] == "asyncio"
+    assert options["http"] == "h11"
+
+
+def test_worker_is_ready_once_prepared():
+    previous = use_credit_store(MemoryCreditStore())
+    try:
+        with patch("routers.health.prepared", False):
+            with patch.object(main.CreditModel, "ensure_indexes", side_effect=RuntimeError("no index")):
+                assert main.prepare_credit_collection() is False
+            assert health.prepared is False
+            assert main.prepare_credit_collection() is True
+            assert health.prepared is True
+        with patch("routers.health.prepared", False):
+            # A failed warm-up is left to the first requests, it doesn't hold the worker back.
+            with patch.object(main.CreditModel, "warm_caches", side_effect=RuntimeError("slow summary")):
+                assert main.prepare_credit_collection() is True
+            assert health.prepared is True
+    finally:
+        use_credit_store(previous)
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import time
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from pymongo import _csot
+
+from clients.cache_client import credit_cache
+from data.models.credit_changes import ChangeFeed
+from data.models.credit_model import CreditModel, CreditVersionConflict, use_credit_store
+from data.risk_scoring import risk_engine
+from data.storage.credit_store import ReadOnlyStoreError, build_credit_store
+from data.storage.memory_store import MemoryCreditStore
+from data.validators.credit_data import CreditData, PutCreditBatchItem, PutCreditData
+from data.validators.credit_query import CreditFilters
+from main import app
+from routers.admission import Admission
+
+client = TestClient(app)
+
+STATUSES = ("Active", "Inactive", "Pending")
+NAMES = ("Acme Steel", "Acme Foods", "Globex Power", "Initech Textiles")
+
+
+def company(i, **overrides):
+    return {
+        "CIN": f"M{i:03d}",
+        "company_name": f"{NAMES[i % 4]} {i}",
+        "address": f"{i} Marine Drive, Mumbai",
+        "registration_date": f"{2000 + i % 20}-0{1 + i % 9}-1{i % 10}",
+        "number_of_employees": 10 + i,
+        "raised_capital": 1000000.0 + i,
+        "turnover": 5000000.0 + 1000 * i,
+        "net_profit": 100000.0 * (i % 7),
+        "contact_number": "526.729.1296",
+        "contact_email": "jodi93@hill.com",
+        "company_website": "http://www.thomas.com/",
+        # Repeated values so the CIN tiebreaker matters.
+        "loan_amount": 100000.0 * (i % 5),
+        "loan_interest_percentage": 4 + i % 3,
+        "account_status": STATUSES[i % 3],
+        **overrides,
+    }
+
+
+def documents(count):
+    return [CreditModel.to_document(CreditData(**company(i))) for i in range(count)]
+
+
+@pytest.fixture
+def store():
+    store = MemoryCreditStore(documents(23))
+    previous = use_credit_store(store)
+    credit_cache.clear()
+    risk_engine.clear()
+    yield store
+    use_credit_store(previous)
+    credit_cache.clear()
+    risk_engine.clear()
+
+
+def _token():
+    return client.post(
+        "/authentication/token",
+        data={"username": os.environ.get("JWT_USERNAME"), "password": os.environ.get("JWT_PASSWORD")},
+    ).json()["access_token"]
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        CreditFilters(),
+        CreditFilters(sort="-CIN"),
+        CreditFilters(sort="-loan_amount"),
+        CreditFilters(account_status="Active", sort="loan_interest_percentage"),
+        CreditFilters(loan_amount_min=100000, loan_amount_max=300000, sort="-loan_amount"),
+        CreditFilters(registered_from=date(2005, 1, 1), registered_to=date(2015, 12, 31), sort="registration_date"),
+    ],
+)
+def test_keyset_pages_follow_the_sorted_indexes(store, filters):
+    field = filters.sort.lstrip("-")
+    expected = [
+        credit
+        for credit in store.find_all()
+        if (filters.account_status is None or credit["account_status"] == filters.account_status)
+        and (filters.loan_amount_min is None or credit["loan_amount"] >= filters.loan_amount_min)
+        and (filters.loan_amount_max is None or credit["loan_amount"] <= filters.loan_amount_max)
+        and (filters.registered_from is None or credit["registration_date"].date() >= filters.registered_from)
+        and (filters.registered_to is None or credit["registration_date"].date() <= filters.registered_to)
+    ]
+    expected.sort(key=lambda credit: (credit[field], credit["CIN"]), reverse=filters.sort.startswith("-"))
+
+    served, after = [], None
+    while True:
+        page, after = CreditModel.get_credits_page(4, after=after, fields=("company_name",), filters=filters)
+        assert all(set(credit) == {"CIN", "company_name"} for credit in page)
+        served += [credit["CIN"] for credit in page]
+        if after is None:
+            break
+    assert served == [credit["CIN"] for credit in expected]
+    assert [credit["CIN"] for credit in CreditModel.iter_credits(5, filters=filters)] == served
+
+
+def test_writes_keep_the_feed_version_and_summary_in_step(store):
+    version = CreditModel.get_collection_version()[0]
+    assert CreditModel.save_credit(CreditData(**company(100))) == (True, "Credit saved successfully")
+    assert CreditModel.save_credit(CreditData(**company(100)))[0] is False
+    results = CreditModel.update_credits(
+        [PutCreditBatchItem(CIN="M001", loan_amount=5), PutCreditBatchItem(CIN="NOPE", loan_amount=5)]
+    )
+    assert [result["status"] for result in results] == ["updated", "not_found"]
+    assert CreditModel.update_credit_data("M002", PutCreditData(company_name="Zeta Corp"), expected_versions=[1]) == 2
+    with pytest.raises(CreditVersionConflict):
+        CreditModel.delete_credit_by_id("M002", expected_versions=[1])
+    assert CreditModel.delete_credit_by_id("M003") is True
+    assert CreditModel.delete_credit_by_id("M003") is False
+
+    assert CreditModel.get_collection_version()[0] == version + 4
+    assert CreditModel.get_id_credit("M001")["loan_amount"] == 5
+    assert CreditModel.autocomplete_credits("zeta", 5) == [{"CIN": "M002", "company_name": "Zeta Corp"}]
+    changes, has_more = CreditModel.get_changes(23, 10)
+    assert [(change["op"], change["CIN"]) for change in changes] == [
+        ("insert", "M100"),
+        ("update", "M001"),
+        ("update", "M002"),
+        ("delete", "M003"),
+    ]
+    assert not has_more
+    summary = CreditModel.get_portfolio_stats()
+    assert summary["by_status"] == CreditModel.get_portfolio_stats(live=True)["by_status"]
+
+
+def test_batch_updates_take_their_pre_images_from_the_write(store):
+    CreditModel.delete_credit_by_id("M005")
+    results = CreditModel.update_credits(
+        [
+            PutCreditBatchItem(CIN="M004", loan_amount=7, account_status="Pending"),
+            PutCreditBatchItem(CIN="M005", loan_amount=7),
+            PutCreditBatchItem(CIN="M006"),
+            PutCreditBatchItem(CIN="M099"),
+        ]
+    )
+    assert [result["status"] for result in results] == ["updated", "not_found", "updated", "not_found"]
+    summary, live = CreditModel.get_portfolio_stats(), CreditModel.get_portfolio_stats(live=True)
+    assert {**summary, "updated_at": None} == {**live, "updated_at": None}
+
+
+def test_feed_waits_for_pending_writes(store):
+    since = store.last_change_seq()
+    with CreditModel._change_seqs() as (change_seq, updated_at):
+        # A later write commits while the one holding `change_seq` is still in flight.
+        CreditModel.update_credit_data("M001", PutCreditData(loan_amount=3))
+        assert CreditModel.get_changes(since, 10) == ([], False)
+        store.update_one("M002", {"loan_amount": 4, **ChangeFeed.stamp(change_seq, updated_at)})
+    changes, _ = CreditModel.get_changes(since, 10)
+    assert [change["CIN"] for change in changes] == ["M002", "M001"]
+
+
+def test_iteration_reads_a_snapshot(store):
+    credits = CreditModel.iter_credits(5, fields=("loan_amount",))
+    first = next(credits)
+    CreditModel.delete_credit_by_id("M010")
+    CreditModel.update_credit_data("M011", PutCreditData(loan_amount=1))
+    rest = list(credits)
+    assert [first["CIN"], *(credit["CIN"] for credit in rest)] == [f"M{i:03d}" for i in range(23)]
+    assert next(credit for credit in rest if credit["CIN"] == "M011")["loan_amount"] != 1
+    assert CreditModel.get_id_credit("M010") is None
+
+
+def test_search_weighs_company_names(store):
+    CreditModel.save_credit(CreditData(**company(200, company_name="Harbour Logistics", address="1 Acme Road")))
+    results = CreditModel.search_credits("acme steel", 3, fields=("company_name",))
+    # Both words in the name first, then the best CIN ties.
+    assert [result["CIN"] for result in results] == ["M000", "M004", "M008"]
+    assert results[0]["score"] == 20
+    assert CreditModel.search_credits("harbour", 5)[0]["CIN"] == "M200"
+    assert CreditModel.search_credits("road", 5)[0]["score"] == 2
+
+
+def test_endpoints_run_on_the_memory_store(store):
+    headers = {"Authorization": f"Bearer {_token()}"}
+    response = client.get("/credits/M004?fields=company_name", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"] == {"CIN": "M004", "company_name": "Acme Steel 4"}
+    response = client.get("/credits/?limit=2&sort=-loan_amount", headers=headers)
+    # Ties on the loan amount go by descending CIN too.
+    assert [credit["CIN"] for credit in response.json()["data"]] == ["M019", "M014"]
+    assert client.get("/credits/risk?top=3", headers=headers).json()["data"][0]["grade"]
+
+
+class DeadlineRecordingStore(MemoryCreditStore):
+    """
+    Records the pymongo deadline each store call ran under.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.remaining = {}
+        super().__init__(*args, **kwargs)
+        self.remaining.clear()
+
+    def _record(self, name):
+        self.remaining[name] = _csot.remaining()
+
+    def delete_one(self, *args, **kwargs):
+        self._record("delete_one")
+        return super().delete_one(*args, **kwargs)
+
+    def reserve_change_seq(self, count=1):
+        self._record("reserve_change_seq")
+        return super().reserve_change_seq(count)
+
+    def record_delete(self, *args):
+        self._record("record_delete")
+        return super().record_delete(*args)
+
+    def bump_version(self):
+        self._record("bump_version")
+        return super().bump_version()
+
+    def apply_summary_changes(self, changes):
+        self._record("apply_summary_changes")
+        return super().apply_summary_changes(changes)
+
+
+def test_only_the_primary_write_is_bounded_by_the_deadline():
+    store = DeadlineRecordingStore(documents(3))
+    previous = use_credit_store(store)
+    try:
+        assert asyncio.run(Admission(time.monotonic() + 5).run(CreditModel.delete_credit_by_id, "M001"))
+    finally:
+        use_credit_store(previous)
+        credit_cache.clear()
+    assert 0 < store.remaining.pop("delete_one") <= 5
+    # Past the committed delete nothing may time out, the tombstone, version and summary must follow it.
+    assert store.remaining == dict.fromkeys(
+        ("reserve_change_seq", "record_delete", "bump_version", "apply_summary_changes")
+    )
+
+
+def test_read_only_snapshot(tmp_path):
+    snapshot = tmp_path / "credits.ndjson"
+    snapshot.write_text("\n".join(json.dumps(company(i)) for i in range(5)))
+    store = MemoryCreditStore.from_snapshot(str(snapshot))
+    assert store.read_only and store.status()["credits"] == 5
+    with pytest.raises(ReadOnlyStoreError):
+        store.insert_many(documents(1))
+
+    previous = use_credit_store(store)
+    credit_cache.clear()
+    try:
+        headers = {"Authorization": f"Bearer {_token()}"}
+        assert len(client.get("/credits/", headers=headers).json()["data"]) == 5
+        response = client.delete("/credits/M001", headers=headers)
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        with patch("routers.health.prepared", True):
+            assert client.get("/health/ready").json() == {"status": "ready", "storage": store.status()}
+    finally:
+        use_credit_store(previous)
+        credit_cache.clear()
+
+    snapshot.write_text(json.dumps([company(1), company(2, CIN="M-2")]))
+    with pytest.raises(ValueError, match="row 2"):
+        MemoryCreditStore.from_snapshot(str(snapshot))
+
+
+def test_build_credit_store(tmp_path):
+    snapshot = tmp_path / "credits.json"
+    snapshot.write_text(json.dumps([company(1)]))
+    with patch.dict("os.environ", {"CREDIT_STORE": "memory", "CREDIT_STORE_SNAPSHOT": str(snapshot)}):
+        store = build_credit_store()
+    assert store.name == "memory" and store.read_only and store.exists("M001")
+    with patch.dict("os.environ", {"CREDIT_STORE": "memory", "CREDIT_STORE_SNAPSHOT": ""}):
+        assert not build_credit_store().read_only
+    with patch.dict("os.environ", {"CREDIT_STORE": "cassandra"}), pytest.raises(ValueError):
+        build_credit_store()
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import os
+import queue
+import time
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from starlette import status
+from starlette.requests import Request
+
+from clients.log_client import DroppingQueueHandler, logger
+from main import app, global_exception_handler
+from routers.admission import Admission
+
+client = TestClient(app)
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def _token():
+    return client.post(
+        "/authentication/token",
+        data={"username": os.environ.get("JWT_USERNAME"), "password": os.environ.get("JWT_PASSWORD")},
+    ).json()["access_token"]
+
+
+@patch("data.models.credit_model.CreditModel.get_id_credit", return_value={"CIN": "375", "version": 1})
+def test_request_latency_per_route_template(mock_get_id_credit):
+    labels = {"method": "GET", "route": "/credits/{id}", "status": "200"}
+    before = _sample("http_request_duration_seconds_count", **labels)
+    cached_before = _sample("jwt_verify_duration_seconds_count", outcome="cached")
+    token = _token()
+    for id in ("375", "376"):
+        client.get(f"/credits/{id}", headers={"Authorization": f"Bearer {token}"})
+    assert _sample("http_request_duration_seconds_count", **labels) == before + 2
+    assert _sample("jwt_verify_duration_seconds_count", outcome="cached") >= cached_before + 1
+
+    response = client.get("/metrics")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_bucket{le="0.0005",method="GET",route="/credits/{id}",status="200"}' in (
+        response.text
+    )
+
+
+@patch("data.models.credit_model.CreditModel.get_id_credit", return_value={"CIN": "375", "version": 1})
+def test_rate_limit_checks_and_rejections(mock_get_id_credit):
+    before = _sample("rate_limit_rejections_total", route="/credits/{id}")
+    checks_before = _sample("rate_limit_check_duration_seconds_count")
+    token = _token()
+    statuses = [client.get("/credits/375", headers={"Authorization": f"Bearer {token}"}).status_code for _ in range(6)]
+    assert statuses[-1] == status.HTTP_429_TOO_MANY_REQUESTS
+    assert _sample("rate_limit_rejections_total", route="/credits/{id}") == before + 1
+    assert _sample("rate_limit_check_duration_seconds_count") >= checks_before + 6
+
+
+def test_credit_model_calls_are_timed():
+    def get_id_credit(id):
+        return {"CIN": id}
+
+    before = _sample("credit_model_call_duration_seconds_count", operation="get_id_credit")
+    asyncio.run(Admission(time.monotonic() + 5).run(get_id_credit, "375"))
+    assert _sample("credit_model_call_duration_seconds_count", operation="get_id_credit") == before + 1
+
+
+def test_unhandled_errors_are_logged_off_the_request_path():
+    # In development the debug traceback page answers instead of the handler, call it directly.
+    request = Request({"type": "http", "method": "GET", "path": "/credits/375", "headers": [], "query_string": b""})
+    with patch.object(logger, "error") as mock_error:
+        response = asyncio.run(global_exception_handler(request, RuntimeError("boom")))
+    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert mock_error.call_args.kwargs["exc_info"].args == ("boom",)
+
+
+def test_full_log_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(1))
+    before = _sample("log_records_dropped_total")
+    for message in ("first", "second"):
+        handler.emit(logging.LogRecord("credhive", logging.ERROR, __file__, 1, message, None, None))
+    assert handler.queue.qsize() == 1
+    assert _sample("log_records_dropped_total") == before + 1
@@ -0,0 +1,73 @@
+from unittest.mock import patch
+
+import pytest
+from pymongo.errors import ExecutionTimeout
+
+from data.storage.mongo_store import MongoCreditStore
+
+mongomock = pytest.importorskip("mongomock")
+
+
+@pytest.fixture
+def collection():
+    collection = mongomock.MongoClient().credhive_test.credit
+    collection.create_index("CIN", unique=True)
+    collection.insert_many(
+        [{"CIN": cin, "loan_amount": 100.0, "account_status": "Active", "version": 1} for cin in ("A", "B", "C")]
+    )
+    with patch.object(MongoCreditStore, "_collection", return_value=collection):
+        yield collection
+
+
+def _update(loan_amount, change_seq):
+    return {"loan_amount": loan_amount, "change_seq": change_seq}
+
+
+def test_batch_update_is_one_bulk_write(collection):
+    with patch.object(MongoCreditStore, "update_one") as update_one:
+        images, errors = MongoCreditStore().update_many(
+            [("A", _update(1.0, 10)), ("NOPE", _update(1.0, 11)), ("B", _update(2.0, 12))],
+            image_fields=("loan_amount",),
+        )
+    update_one.assert_not_called()
+    assert errors == {}
+    assert images == [{"CIN": "A", "loan_amount": 100.0}, None, {"CIN": "B", "loan_amount": 100.0}]
+    assert collection.find_one({"CIN": "B"}, {"_id": 0}) == {
+        "CIN": "B",
+        "loan_amount": 2.0,
+        "account_status": "Active",
+        "version": 2,
+        "change_seq": 12,
+    }
+
+
+def test_batch_update_losing_a_race_is_replayed_on_the_new_pre_image(collection):
+    bulk_write = collection.bulk_write
+
+    def racing_bulk_write(operations, **kwargs):
+        # Another request updates B between the pre-image read and the bulk write.
+        collection.update_one({"CIN": "B"}, {"$set": {"loan_amount": 50.0}, "$inc": {"version": 1}})
+        return bulk_write(operations, **kwargs)
+
+    with patch.object(collection, "bulk_write", racing_bulk_write):
+        images, errors = MongoCreditStore().update_many(
+            [("A", _update(1.0, 10)), ("B", _update(2.0, 11))], image_fields=("loan_amount",)
+        )
+    assert errors == {}
+    assert images == [{"CIN": "A", "loan_amount": 100.0}, {"CIN": "B", "loan_amount": 50.0}]
+    assert collection.find_one({"CIN": "B"})["version"] == 3
+
+
+def test_batch_update_out_of_time_reports_what_landed(collection):
+    bulk_write = collection.bulk_write
+
+    def timed_out_bulk_write(operations, **kwargs):
+        bulk_write(operations[:1], **kwargs)
+        raise ExecutionTimeout("operation exceeded time limit")
+
+    with patch.object(collection, "bulk_write", timed_out_bulk_write):
+        images, errors = MongoCreditStore().update_many(
+            [("A", _update(1.0, 10)), ("B", _update(2.0, 11))], image_fields=("loan_amount",)
+        )
+    assert images == [{"CIN": "A", "loan_amount": 100.0}, None]
+    assert errors == {1: "Request deadline exceeded"}
@@ -0,0 +1,302 @@
+import fnmatch
+import hashlib
+import multiprocessing
+import os
+import socketserver
+import sqlite3
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.storage.redis import RedisStorage
+from limits.strategies import MovingWindowRateLimiter
+
+from clients.rate_limit_storage import SQLiteStorage
+from clients.rate_limiting_client import get_user_or_remote_address
+
+FIVE_PER_MINUTE = parse("5/minute")
+
+
+def _sqlite_uri(tmp_path):
+    return f"sqlite://{tmp_path / 'ratelimit.db'}"
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """
+    Local Redis-protocol server with the commands the `limits` Redis storage sends, so the real redis client and
+    storage code run without a Redis. Its Lua scripts are recognized by their SHA1 and run as Python ports.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        self.lock = threading.Lock()
+        self.values = {}
+        self.expires = {}
+        self.scripts = {
+            hashlib.sha1(script).hexdigest(): run
+            for script, run in (
+                (RedisStorage.SCRIPT_MOVING_WINDOW, self._moving_window),
+                (RedisStorage.SCRIPT_ACQUIRE_MOVING_WINDOW, self._acquire_moving_window),
+                (RedisStorage.SCRIPT_CLEAR_KEYS, self._clear_keys),
+                (RedisStorage.SCRIPT_INCR_EXPIRE, self._incr_expire),
+            )
+        }
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}"
+
+    def _get(self, key):
+        if key in self.expires and self.expires[key] <= time.monotonic():
+            self._delete(key)
+        return self.values.get(key)
+
+    def _delete(self, key):
+        self.expires.pop(key, None)
+        return self.values.pop(key, None) is not None
+
+    def _expire(self, key, seconds):
+        if self._get(key) is None:
+            return 0
+        self.expires[key] = time.monotonic() + float(seconds)
+        return 1
+
+    def _incrby(self, key, amount):
+        value = int(self._get(key) or 0) + int(amount)
+        self.values[key] = str(value).encode()
+        return value
+
+    def _keys(self, pattern):
+        return [key for key in list(self.values) if self._get(key) is not None and fnmatch.fnmatchcase(key, pattern)]
+
+    def _moving_window(self, keys, args):
+        expiry = float(args[0])
+        oldest, count = None, 0
+        for item in (self._get(keys[0]) or [])[: int(args[1]) + 1]:
+            if float(item) < expiry:
+                break
+            count += 1
+            oldest = float(item) if oldest is None else oldest
+        # A Lua table stops at its first nil.
+        return [] if oldest is None else [int(oldest), count]
+
+    def _acquire_moving_window(self, keys, args):
+        timestamp, limit, expiry, amount = float(args[0]), int(args[1]), int(args[2]), int(args[3])
+        if amount > limit:
+            return None
+        entries = self._get(keys[0]) or []
+        if len(entries) > limit - amount and float(entries[limit - amount]) >= timestamp - expiry:
+            return None
+        self.values[keys[0]] = ([args[0]] * amount + entries)[:limit]
+        self._expire(keys[0], expiry)
+        return 1
+
+    def _clear_keys(self, keys, args):
+        return sum(self._delete(key) for key in self._keys(keys[0]))
+
+    def _incr_expire(self, keys, args):
+        current = self._incrby(keys[0], args[1])
+        if current == int(args[1]):
+            self._expire(keys[0], args[0])
+        return current
+
+    def execute(self, name, args):
+        with self.lock:
+            if name in ("CLIENT", "SELECT"):
+                return "+OK"
+            if name == "PING":
+                return "+PONG"
+            if name == "GET":
+                return self._get(args[0])
+            if name == "DEL":
+                return sum(self._delete(key) for key in args if self._get(key) is not None)
+            if name == "TTL":
+                if self._get(args[0]) is None:
+                    return -2
+                return int(self.expires[args[0]] - time.monotonic() + 1) if args[0] in self.expires else -1
+            if name == "EXPIRE":
+                return self._expire(args[0], args[1])
+            if name == "INCRBY":
+                return self._incrby(args[0], args[1])
+            if name == "KEYS":
+                return [key.encode() for key in self._keys(args[0])]
+            if name == "SCRIPT" and args[0].upper() == "LOAD":
+                sha = hashlib.sha1(args[1].encode()).hexdigest()
+                return sha.encode() if sha in self.scripts else "-ERR unknown script"
+            if name in ("EVALSHA", "EVAL"):
+                sha = args[0] if name == "EVALSHA" else hashlib.sha1(args[0].encode()).hexdigest()
+                if sha not in self.scripts:
+                    return "-NOSCRIPT No matching script."
+                count = int(args[1])
+                return self.scripts[sha](args[2 : 2 + count], [arg.encode() for arg in args[2 + count :]])
+            return f"-ERR unknown command '{name}'"
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2].decode())
+            self.wfile.write(self._encode(self.server.execute(args[0].upper(), args[1:])))
+
+    def _encode(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, str):
+            return value.encode() + b"\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, bytes):
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        return b"*%d\r\n" % len(value) + b"".join(self._encode(item) for item in value)
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    # A real server when one is configured, the local stand-in otherwise.
+    if os.environ.get("RATE_LIMIT_TEST_REDIS_URL"):
+        yield os.environ["RATE_LIMIT_TEST_REDIS_URL"]
+        return
+    server = RedisStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def redis_storage(redis_url):
+    storage = storage_from_string(redis_url, socket_connect_timeout=0.5)
+    if not storage.check():
+        pytest.skip(f"No Redis-protocol server at {redis_url}")
+    return storage
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def storage(request, tmp_path):
+    if request.param == "redis":
+        return request.getfixturevalue("redis_storage")
+    return storage_from_string(_sqlite_uri(tmp_path))
+
+
+def test_sqlite_scheme_is_registered(tmp_path):
+    assert isinstance(storage_from_string(_sqlite_uri(tmp_path)), SQLiteStorage)
+
+
+def test_moving_window_allows_limit_then_rejects(storage):
+    limiter = MovingWindowRateLimiter(storage)
+    key = f"test:{uuid.uuid4()}"
+    assert all(limiter.hit(FIVE_PER_MINUTE, key) for _ in range(5))
+    assert not limiter.hit(FIVE_PER_MINUTE, key)
+    assert limiter.get_window_stats(FIVE_PER_MINUTE, key)[1] == 0
+    # Other keys have their own window.
+    assert limiter.hit(FIVE_PER_MINUTE, f"test:{uuid.uuid4()}")
+
+
+def test_fixed_window_counter(storage):
+    key = f"test:{uuid.uuid4()}"
+    assert storage.incr(key, 60) == 1
+    assert storage.incr(key, 60, amount=2) == 3
+    assert storage.get(key) == 3
+    assert time.time() < storage.get_expiry(key) <= time.time() + 61
+    storage.clear(key)
+    assert storage.get(key) == 0
+
+
+def test_moving_window_stats_and_reset(storage):
+    limiter = MovingWindowRateLimiter(storage)
+    key = f"test:{uuid.uuid4()}"
+    assert limiter.hit(FIVE_PER_MINUTE, key) and limiter.hit(FIVE_PER_MINUTE, key)
+    reset_at, remaining = limiter.get_window_stats(FIVE_PER_MINUTE, key)
+    assert remaining == 3 and reset_at >= int(time.time())
+    assert storage.reset() >= 1
+    assert limiter.get_window_stats(FIVE_PER_MINUTE, key)[1] == 5
+
+
+def test_sqlite_purge_keeps_longer_windows_of_other_keys(tmp_path):
+    limiter = MovingWindowRateLimiter(storage_from_string(_sqlite_uri(tmp_path)))
+    one_per_hour = parse("1/hour")
+    with patch("clients.rate_limit_storage.PURGE_EVERY", 2):
+        with patch("clients.rate_limit_storage.time.time", return_value=1000.0):
+            assert limiter.hit(one_per_hour, "user:slow")
+        # Purged by a minute limit, a sweep by its expiry would drop the hour window's hit as well.
+        with patch("clients.rate_limit_storage.time.time", return_value=1100.0):
+            assert limiter.hit(FIVE_PER_MINUTE, "user:fast")
+        with patch("clients.rate_limit_storage.time.time", return_value=1200.0):
+            assert not limiter.hit(one_per_hour, "user:slow")
+        with patch("clients.rate_limit_storage.time.time", return_value=4601.0):
+            assert limiter.hit(one_per_hour, "user:slow")
+
+
+def test_sqlite_file_without_hit_expiry_is_migrated(tmp_path):
+    connection = sqlite3.connect(tmp_path / "ratelimit.db")
+    connection.execute("CREATE TABLE hits (key TEXT NOT NULL, ts REAL NOT NULL)")
+    connection.execute("INSERT INTO hits (key, ts) VALUES (?, ?)", (FIVE_PER_MINUTE.key_for("user:a"), time.time()))
+    connection.commit()
+    connection.close()
+    limiter = MovingWindowRateLimiter(storage_from_string(_sqlite_uri(tmp_path)))
+    assert limiter.get_window_stats(FIVE_PER_MINUTE, "user:a")[1] == 4
+    assert limiter.hit(FIVE_PER_MINUTE, "user:a")
+
+
+def test_sqlite_moving_window_slides(tmp_path):
+    limiter = MovingWindowRateLimiter(storage_from_string(_sqlite_uri(tmp_path)))
+    with patch("clients.rate_limit_storage.time.time", return_value=1000.0):
+        assert all(limiter.hit(FIVE_PER_MINUTE, "user:a") for _ in range(5))
+        assert not limiter.hit(FIVE_PER_MINUTE, "user:a")
+    with patch("clients.rate_limit_storage.time.time", return_value=1059.0):
+        assert not limiter.hit(FIVE_PER_MINUTE, "user:a")
+    with patch("clients.rate_limit_storage.time.time", return_value=1060.5):
+        assert limiter.hit(FIVE_PER_MINUTE, "user:a")
+
+
+def test_sqlite_fixed_window_counter(tmp_path):
+    storage = storage_from_string(_sqlite_uri(tmp_path))
+    with patch("clients.rate_limit_storage.time.time", return_value=1000.0):
+        assert storage.incr("k", 60) == 1
+        assert storage.incr("k", 60, amount=2) == 3
+        assert storage.get("k") == 3
+        assert storage.get_expiry("k") == 1060
+    with patch("clients.rate_limit_storage.time.time", return_value=1061.0):
+        assert storage.get("k") == 0
+        assert storage.incr("k", 60) == 1
+    storage.clear("k")
+    assert storage.get("k") == 0
+
+
+def _hit_from_worker(uri, attempts, results):
+    limiter = MovingWindowRateLimiter(storage_from_string(uri))
+    results.put(sum(limiter.hit(FIVE_PER_MINUTE, "user:shared") for _ in range(attempts)))
+
+
+def test_sqlite_limit_is_shared_between_processes(tmp_path):
+    uri = _sqlite_uri(tmp_path)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=_hit_from_worker, args=(uri, 5, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+    assert sum(results.get(timeout=5) for _ in workers) == 5
+
+
+def test_limit_key_prefers_authenticated_user():
+    request = SimpleNamespace(state=SimpleNamespace(user="Credhive"), client=SimpleNamespace(host="10.0.0.1"))
+    assert get_user_or_remote_address(request) == "user:Credhive"
+    request.state = SimpleNamespace()
+    assert get_user_or_remote_address(request) == "ip:10.0.0.1"
@@ -0,0 +1,43 @@
+import json
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+from data.validators.credit_data import CreditData
+from routers.responses import FastJSONResponse
+
+CREDIT = {
+    "CIN": "375",
+    "company_name": "Bench Corp",
+    "registration_date": datetime(2015, 5, 10),
+    "number_of_employees": 120,
+    "loan_amount": 2620355.0,
+    "loan_interest_percentage": 7.35,
+    "version": 3,
+}
+
+
+def test_renders_same_document_as_jsonable_encoder():
+    body = FastJSONResponse({"data": [CREDIT]}).body
+    assert json.loads(body) == jsonable_encoder({"data": [CREDIT]})
+
+
+def test_renders_pydantic_models():
+    credit_data = CreditData(
+        CIN="375",
+        company_name="Bench Corp",
+        address="1 Bench Street",
+        registration_date="2015-05-10",
+        number_of_employees=120,
+        raised_capital=1000000,
+        turnover=5000000,
+        net_profit=500000,
+        contact_number="1234567890",
+        contact_email="bench@example.com",
+        company_website="https://example.com",
+        loan_amount=2620355,
+        loan_interest_percentage=7.35,
+        account_status="Active",
+    )
+    body = FastJSONResponse({"saved": credit_data}).body
+    assert json.loads(body) == jsonable_encoder({"saved": credit_data})
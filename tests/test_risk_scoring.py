@@ -0,0 +1,126 @@
+import math
+import os
+import threading
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from data.risk_scoring import RISK_FIELDS, RiskEngine, RiskScoresLoading, grade, score_batch
+from main import app
+
+client = TestClient(app)
+
+HEALTHY = {
+    "CIN": "H1",
+    "turnover": 10000000.0,
+    "net_profit": 3000000.0,
+    "raised_capital": 2000000.0,
+    "loan_amount": 1000000.0,
+    "loan_interest_percentage": 10.0,
+    "number_of_employees": 50,
+}
+
+
+def _columns(*credits):
+    return {name: np.array([float(credit.get(name, 0)) for credit in credits]) for name in RISK_FIELDS}
+
+
+def _engine(*credits):
+    engine = RiskEngine()
+    engine.loaded = True
+    engine.apply_changes([(None, credit) for credit in credits])
+    return engine
+
+
+def test_score_batch_ratios():
+    scored = score_batch(_columns(HEALTHY))
+    assert scored["debt_to_turnover"][0] == 0.1
+    assert scored["net_margin"][0] == 0.3
+    assert math.isclose(scored["interest_burden"][0], 100000 / 3000000)
+    assert scored["capital_cover"][0] == 2.0
+    # 35 * 0.05 + 0 (margin above 20%) + 30 * 1/30 + 0 (capital covers the loan)
+    assert math.isclose(scored["score"][0], 2.75)
+
+
+def test_score_batch_without_turnover_or_profit():
+    scored = score_batch(_columns({**HEALTHY, "turnover": 0.0, "net_profit": -5.0, "raised_capital": 0.0}))
+    assert np.isinf(scored["debt_to_turnover"][0])
+    assert np.isinf(scored["interest_burden"][0])
+    assert scored["score"][0] == 100.0
+    assert grade(100.0) == "E"
+
+
+def test_engine_rescores_updates_and_deletes():
+    risky = {**HEALTHY, "CIN": "R1", "net_profit": -1.0}
+    middle = {**HEALTHY, "CIN": "M1", "loan_amount": 6000000.0}
+    engine = _engine(HEALTHY, risky, middle)
+    assert [result["CIN"] for result in engine.top(3)] == ["R1", "M1", "H1"]
+
+    engine.apply_changes([(HEALTHY, {**HEALTHY, "turnover": 1.0}), (risky, None)])
+    assert engine.size() == 2
+    assert engine.score("R1") is None
+    assert [result["CIN"] for result in engine.top(1)] == ["H1"]
+    assert engine.score("M1")["CIN"] == "M1"
+
+
+def test_engine_ignores_writes_until_loaded():
+    engine = RiskEngine()
+    engine.apply_changes([(None, HEALTHY)])
+    assert engine.size() == 0
+
+
+class SlowStore:
+    def __init__(self):
+        self.release = threading.Event()
+        self.loads = 0
+
+    def last_change_seq(self):
+        return 0
+
+    def iter_credits(self, batch_size, fields=None):
+        self.loads += 1
+        self.release.wait(5)
+        yield HEALTHY
+
+
+def test_first_load_runs_in_the_background():
+    engine, store = RiskEngine(), SlowStore()
+    for _ in range(2):
+        with pytest.raises(RiskScoresLoading):
+            engine.sync(store, wait=0.01)
+    # Requests past their deadline leave the one load running instead of starting over.
+    assert store.loads == 1
+    store.release.set()
+    engine.sync(store, wait=5)
+    assert engine.score("H1")["CIN"] == "H1" and store.loads == 1
+
+
+@patch("data.models.credit_model.CreditModel.get_top_risks", side_effect=RiskScoresLoading())
+def test_risk_endpoint_while_loading(mock_top):
+    response = client.get("/credits/risk?top=1", headers={"Authorization": f"Bearer {_token()}"})
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "1"
+
+
+def _token():
+    return client.post(
+        "/authentication/token",
+        data={"username": os.environ.get("JWT_USERNAME"), "password": os.environ.get("JWT_PASSWORD")},
+    ).json()["access_token"]
+
+
+@patch("data.models.credit_model.CreditModel.get_top_risks", return_value=[{"CIN": "R1", "score": 92.5, "grade": "E"}])
+def test_risk_endpoint(mock_top):
+    response = client.get("/credits/risk?top=1", headers={"Authorization": f"Bearer {_token()}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["data"][0]["CIN"] == "R1"
+    mock_top.assert_called_once_with(1)
+
+
+@patch("data.models.credit_model.CreditModel.get_risk_score", return_value=None)
+def test_score_endpoint_unknown_credit(mock_score):
+    response = client.get("/credits/NOPE/score", headers={"Authorization": f"Bearer {_token()}"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
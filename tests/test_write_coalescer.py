@@ -0,0 +1,140 @@
+import asyncio
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette import status
+
+from clients.mongo_client import remaining_time
+from data.write_coalescer import WriteCoalescer, credit_inserts
+from main import app
+
+client = TestClient(app)
+
+NEW_CREDIT = {
+    "CIN": "616XOXO",
+    "company_name": "Chaney LLC",
+    "address": "35520 Mays Greens Apt. 951\nSouth Russellbury, WI 60387",
+    "registration_date": "2021-04-11",
+    "number_of_employees": 31,
+    "raised_capital": 7756909,
+    "turnover": 24783401,
+    "net_profit": 9692941,
+    "contact_number": "482.408.7561x453",
+    "contact_email": "njohnson@stephens-smith.com",
+    "company_website": "https://montoya.com/",
+    "loan_amount": 314237,
+    "loan_interest_percentage": 9.81,
+    "account_status": "Pending",
+}
+
+
+def _recording_flush(batches):
+    def flush(items):
+        batches.append(list(items))
+        return [
+            {"item": item, "status": "failed" if item in items[:index] else "created"}
+            for index, item in enumerate(items)
+        ]
+
+    return flush
+
+
+def test_concurrent_submits_share_one_flush():
+    batches = []
+    coalescer = WriteCoalescer(_recording_flush(batches), max_delay=0.01, max_batch=100)
+
+    async def burst():
+        return await asyncio.gather(*(coalescer.submit(item) for item in ["a", "b", "a"]))
+
+    results = asyncio.run(burst())
+    assert batches == [["a", "b", "a"]]
+    # Each caller gets the result for its own item, the repeated key is reported to the second caller only.
+    assert [result["status"] for result in results] == ["created", "created", "failed"]
+    stats = coalescer.stats()
+    assert stats["batch_size"]["count"] == 1 and stats["batch_size"]["max"] == 3
+    assert stats["queue_latency_ms"]["count"] == 3
+
+
+def test_full_batch_flushes_without_waiting():
+    batches = []
+    coalescer = WriteCoalescer(_recording_flush(batches), max_delay=60, max_batch=2)
+
+    async def burst():
+        return await asyncio.wait_for(asyncio.gather(*(coalescer.submit(item) for item in range(4))), timeout=5)
+
+    asyncio.run(burst())
+    # Both batches are flushed concurrently, in no particular order.
+    assert sorted(batches) == [[0, 1], [2, 3]]
+
+
+def test_flush_errors_reach_every_caller():
+    def flush(items):
+        raise RuntimeError("mongo down")
+
+    coalescer = WriteCoalescer(flush, max_delay=0.001, max_batch=10)
+
+    async def burst():
+        return await asyncio.gather(*(coalescer.submit(item) for item in range(3)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert coalescer.stats()["failed_batches"] == 1
+
+
+def test_batch_runs_under_the_latest_deadline():
+    remaining = []
+
+    def flush(items):
+        remaining.append(remaining_time())
+        return items
+
+    coalescer = WriteCoalescer(flush, max_delay=0.001, max_batch=10)
+    now = time.monotonic()
+
+    async def burst(deadlines):
+        return await asyncio.gather(*(coalescer.submit(i, deadline=d) for i, d in enumerate(deadlines)))
+
+    asyncio.run(burst([now + 1, now + 3]))
+    asyncio.run(burst([now + 1, None]))
+    assert 2 < remaining[0] <= 3 and remaining[1] is None
+
+
+def _token():
+    return client.post(
+        "/authentication/token",
+        data={"username": os.environ.get("JWT_USERNAME"), "password": os.environ.get("JWT_PASSWORD")},
+    ).json()["access_token"]
+
+
+@pytest.fixture
+def coalescing():
+    with patch.object(credit_inserts, "enabled", True):
+        yield
+
+
+@patch(
+    "data.models.credit_model.CreditModel.save_credits",
+    return_value=[{"CIN": "616XOXO", "status": "failed", "detail": "Credit with this CIN already exists"}],
+)
+def test_add_new_credit_coalesced_duplicate(mock_save_credits, coalescing):
+    response = client.post("/credits", headers={"Authorization": f"Bearer {_token()}"}, json=NEW_CREDIT)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Credit with this CIN already exists"
+    assert mock_save_credits.call_args.args[0][0].CIN == "616XOXO"
+
+
+@patch(
+    "data.models.credit_model.CreditModel.save_credits",
+    return_value=[{"CIN": "616XOXO", "status": "created", "detail": None}],
+)
+@patch("data.models.credit_model.CreditModel.save_credit")
+def test_add_new_credit_coalesced(mock_save_credit, mock_save_credits, coalescing):
+    response = client.post("/credits", headers={"Authorization": f"Bearer {_token()}"}, json=NEW_CREDIT)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] == '"1"'
+    mock_save_credit.assert_not_called()
+    stats = client.get("/credits/writes/stats", headers={"Authorization": f"Bearer {_token()}"}).json()["data"]
+    assert stats["enabled"] and stats["batch_size"]["count"] >= 1